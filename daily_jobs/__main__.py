@@ -0,0 +1,74 @@
+import argparse
+import importlib
+import sys
+
+from daily_jobs import config
+
+# Logging
+from daily_jobs.log_config import setup_logger
+logger = setup_logger(name=__name__)
+
+# -----------------------------------------------------
+# Package entry point ~ python -m daily_jobs <command> (from the repo root)
+# -----------------------------------------------------
+# One entry point for all jobs (no sys.path set up per file). The module of a command is only
+# imported when it runs, so cheap commands don't load pandas, gspread or the Google credentials:
+#   python -m daily_jobs                       all jobs of all users (run_all.py)
+#   python -m daily_jobs daily-statistics      Daily & Activity statistics only
+#   python -m daily_jobs hasr-tl               HASR-TL only
+#   python -m daily_jobs create-tokens         Garmin token store in .garminconnect/
+#   python -m daily_jobs import-report         import time of the entry points (import_report.py)
+#   python -m daily_jobs <command> --dry-run   users, jobs & storage backends, nothing is run
+
+COMMANDS = {
+    "all": "daily_jobs.run_all",
+    "daily-statistics": "daily_jobs.run_daily_statistics_job",
+    "hasr-tl": "daily_jobs.run_hasr_tl_job",
+    "create-tokens": "daily_jobs.create_garmin_tokens",
+    "import-report": "daily_jobs.import_report",
+}
+
+# Users of a command (in config order)
+def get_command_users(command):
+    if command == "daily-statistics":
+        return list(config.BASIC_DAILY_ACTIVITY_STATISTICS_USERS)
+    if command == "hasr-tl":
+        return list(config.HISTORY_AWARE_RELATIVE_STRATIFIED_ACTIVITY_LOG_USERS)
+    if command == "create-tokens":
+        return ["urh"]
+    return list(dict.fromkeys(config.BASIC_DAILY_ACTIVITY_STATISTICS_USERS + config.HISTORY_AWARE_RELATIVE_STRATIFIED_ACTIVITY_LOG_USERS))
+
+# Dry run ~ What would run, from config only
+def dry_run(command):
+    for user in get_command_users(command):
+        jobs = []
+        if command in ("all", "daily-statistics") and user in config.BASIC_DAILY_ACTIVITY_STATISTICS_USERS:
+            jobs.append("daily_statistics")
+        if command in ("all", "hasr-tl") and user in config.HISTORY_AWARE_RELATIVE_STRATIFIED_ACTIVITY_LOG_USERS:
+            jobs.append("hasr_tl")
+        if command == "create-tokens":
+            jobs.append("create_tokens")
+        logger.info("Dry run ~> {}: {} | storage {}".format(user, jobs, config.USER_CONFIGURATIONS[user]["storage"]))
+    logger.info("Dry run ~> {} ({}), Garmin cache {}, Sheets mirror {}, pipeline {}".format(
+        command, COMMANDS[command], config.GARMIN_CACHE, config.SHEETS_MIRROR, config.DAILY_STATISTICS_PIPELINE
+        ))
+    return 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    # import-report has its own arguments
+    if argv[:1] == ["import-report"]:
+        return importlib.import_module(COMMANDS["import-report"]).main(argv[1:])
+
+    parser = argparse.ArgumentParser(prog="python -m daily_jobs", description="Daily statistics & HASR-TL jobs")
+    parser.add_argument("command", nargs="?", default="all", choices=list(COMMANDS))
+    parser.add_argument("--dry-run", action="store_true", help="Log users, jobs & storage backends without running anything")
+    arguments = parser.parse_args(argv)
+
+    if arguments.dry_run:
+        return dry_run(arguments.command)
+    return importlib.import_module(COMMANDS[arguments.command]).main()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,3 @@
-# Libraries
-from google.oauth2.service_account import Credentials
-import logging
-
 # Project paths
 from pathlib import Path
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -26,6 +22,7 @@ USER_CONFIGURATIONS = {
         "garmin_password": os.getenv("GARMIN_PASSWORD_URH"),
         "gdrive_activity_log_filename": os.getenv("ACTIVITY_LOG_URH"),
         "gdrive_daily_log_filename": os.getenv("DAILY_LOG_URH"),
+        "storage": os.getenv("STORAGE_URH", "google_sheets"),
     },
 
     "maja": {
@@ -33,14 +30,69 @@ USER_CONFIGURATIONS = {
         "garmin_password": os.getenv("GARMIN_PASSWORD_MAJA"),
         "gdrive_activity_log_filename": os.getenv("ACTIVITY_LOG_MAJA"),
         "gdrive_daily_log_filename": os.getenv("DAILY_LOG_MAJA"),
+        "storage": os.getenv("STORAGE_MAJA", "google_sheets"),
     },
 
 }
 
 # Variables
-DRIVE_CREDENTIALS = Credentials.from_service_account_file(REPO_ROOT / "googleDrive_secrets.json", scopes= ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"])
+DRIVE_SECRETS_FILE = REPO_ROOT / "googleDrive_secrets.json"
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
 BASIC_DAILY_STATISTICS_SHEET_NAME = "Raw Daily Data"
 BASIC_ACTIVITY_STATISTICS_SHEET_NAME = "Raw Activity Data"
 
+# Local mirror of Google Sheets logs (opt-in: SHEETS_MIRROR=true in .env)
+SHEETS_MIRROR = os.getenv("SHEETS_MIRROR", "false").lower() == "true"
+SHEETS_MIRROR_DIRECTORY = REPO_ROOT / ".sheets_mirror"
+
+# Tail reads of the logs (help_functions.read_log_tails) ~ Rows of the first read & extra days before each job's horizon
+LOG_TAIL_INITIAL_ROWS = 64
+LOG_TAIL_MARGIN_DAYS = 7
+
+# Local storage backend of the logs (users with "storage": "local", see daily_jobs/storage.py)
+LOCAL_STORAGE_DIRECTORY = REPO_ROOT / ".local_storage"
+
+# Shared request scheduler (daily_jobs/request_scheduler.py) ~ Requests per second, burst & calls in flight per service
+REQUEST_SCHEDULER_LIMITS = {
+    "garmin": {"rate": 2.0, "burst": 5, "max_concurrency": 4},
+    "sheets": {"rate": 1.0, "burst": 10, "max_concurrency": 4},  # Sheets API quota: 60 requests per minute per user
+    "default": {"rate": 1.0, "burst": 5, "max_concurrency": 2},
+}
+REQUEST_MAX_RETRIES = 5
+REQUEST_BACKOFF_BASE_SECONDS = 1.0
+REQUEST_BACKOFF_MAX_SECONDS = 60.0
+CIRCUIT_BREAKER_MAX_AUTH_FAILURES = 2
+
+# Garmin response cache (daily_jobs/garmin_cache.py) ~ Dates are final after some days, more recent ones expire
+GARMIN_CACHE = os.getenv("GARMIN_CACHE", "true").lower() == "true"
+GARMIN_CACHE_DIRECTORY = REPO_ROOT / ".garmin_cache"
+GARMIN_CACHE_FINAL_AFTER_DAYS = 3
+GARMIN_CACHE_RECENT_TTL_SECONDS = 3600
+
+# Concurrent Garmin fetching (daily_statistics_job/garmin_fetch.py) ~ Garmin calls & days in flight (1 & 1: one after another)
+GARMIN_FETCH_MAX_IN_FLIGHT = 4
+GARMIN_FETCH_MAX_DAYS_IN_FLIGHT = 3
+
+# run_all.py ~ Users run in parallel (at most RUN_ALL_MAX_WORKERS), a user still running after the timeout is reported as failed
+RUN_ALL_MAX_WORKERS = int(os.getenv("RUN_ALL_MAX_WORKERS", "4"))
+RUN_ALL_USER_TIMEOUT_SECONDS = float(os.getenv("RUN_ALL_USER_TIMEOUT_SECONDS", "2700"))
+
+# Pipeline mode of the daily statistics job (daily_statistics_job/pipeline.py) ~ Daily & activity days fetched,
+# prepared & written at the same time, at most PIPELINE_QUEUE_SIZE days waiting between two stages
+DAILY_STATISTICS_PIPELINE = os.getenv("DAILY_STATISTICS_PIPELINE", "false").lower() == "true"
+PIPELINE_QUEUE_SIZE = 4
+
+# Import time report (daily_jobs/import_report.py) ~ Entry point modules measured & packages listed per module
+IMPORT_REPORT_MODULES = ["daily_jobs.config", "daily_jobs.__main__", "daily_jobs.create_garmin_tokens", "daily_jobs.run_all", "daily_statistics_job.main", "hasr_tl_job.main"]
+IMPORT_REPORT_TOP_PACKAGES = 5
+
 BASIC_DAILY_ACTIVITY_STATISTICS_USERS = ["urh"]
 HISTORY_AWARE_RELATIVE_STRATIFIED_ACTIVITY_LOG_USERS = ["urh"]
+
+# Lazy configuration ~ DRIVE_CREDENTIALS (google.oauth2 & the secrets file) is loaded on first use
+def __getattr__(name):
+    if name == "DRIVE_CREDENTIALS":
+        from google.oauth2.service_account import Credentials
+        globals()[name] = Credentials.from_service_account_file(DRIVE_SECRETS_FILE, scopes=DRIVE_SCOPES)
+        return globals()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,209 @@
+import datetime
+import gzip
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+import os
+
+from daily_jobs import config
+
+# Logging
+from daily_jobs.log_config import setup_logger
+logger = setup_logger(name=__name__)
+
+# -----------------------------------------------------
+# Cache of Garmin Connect responses
+# -----------------------------------------------------
+# CachedGarminClient wraps the client of help_functions.authenticate_garmin_connect_api:
+# - every get_* call is memoized for the run (identical calls, also concurrent ones, download once),
+# - responses are kept on disk as gzip JSON, one file per (user, endpoint, arguments) in
+#   GARMIN_CACHE_DIRECTORY/<user hash>/<endpoint>/, so a rerun after a failure does not download again.
+# How long a response is valid depends on how final the data is:
+# - activity endpoints (details, splits, HR zones of an activity id) never change ~> never expire,
+# - endpoints of a date are final GARMIN_CACHE_FINAL_AFTER_DAYS days after the date ~> responses saved
+#   from then on never expire, responses saved before (today's readiness, yesterday's sleep, also when
+#   read again much later) expire after GARMIN_CACHE_RECENT_TTL_SECONDS,
+# - other calls are only memoized for the run.
+# Errors are never cached. Prune old or large caches with:
+#   python -m daily_jobs.garmin_cache --max-age-days 180 --max-size-mb 500
+
+ACTIVITY_ID_ENDPOINTS = ["get_activity_details", "get_activity_splits", "get_activity_hr_in_timezones"]
+
+# Date of call arguments (last date of a range, None if no date)
+def get_call_date(args):
+    call_date = None
+    for arg in args:
+        try:
+            call_date = datetime.date.fromisoformat(str(arg))
+        except ValueError:
+            continue
+    return call_date
+
+# Seconds the response stays valid (None: never expires, 0: not stored on disk) ~> Unless final, see get_final_date
+def get_cache_ttl(endpoint, args):
+    if endpoint in ACTIVITY_ID_ENDPOINTS:
+        return None
+
+    if get_call_date(args) is None:
+        return 0
+    return config.GARMIN_CACHE_RECENT_TTL_SECONDS
+
+# First day a saved response of the call is final (None if no date)
+def get_final_date(args):
+    call_date = get_call_date(args)
+    if call_date is None:
+        return None
+    return call_date + datetime.timedelta(days=config.GARMIN_CACHE_FINAL_AFTER_DAYS)
+
+# -------------------------------
+# Disk store
+# -------------------------------
+
+class GarminCache:
+
+    def __init__(self, directory, user):
+        self.directory = Path(directory)
+        self.user_key = hashlib.sha1(str(user).encode("utf-8")).hexdigest()[:16]
+
+    def get_path(self, endpoint, args):
+        args_key = hashlib.sha1(json.dumps(args, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return self.directory / self.user_key / endpoint / "{}.json.gz".format(args_key)
+
+    # (True, response) if stored and still valid, else (False, None)
+    # Saved on or after final_date ~> Never expires, else valid for ttl seconds
+    def load(self, endpoint, args, ttl, final_date=None):
+        path = self.get_path(endpoint, args)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False, None
+
+        if final_date is not None and datetime.date.fromtimestamp(entry["saved_at"]) >= final_date:
+            return True, entry["response"]
+        if ttl is not None and time.time() - entry["saved_at"] > ttl:
+            return False, None
+        return True, entry["response"]
+
+    def save(self, endpoint, args, response):
+        path = self.get_path(endpoint, args)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".{}.tmp".format(threading.get_ident()))
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"endpoint": endpoint, "args": list(args), "saved_at": time.time(), "response": response}, f)
+        os.replace(tmp_path, path)
+
+# -------------------------------
+# Cached client
+# -------------------------------
+
+class CachedGarminClient:
+
+    def __init__(self, garmin_client, cache=None):
+        self.garmin_client = garmin_client
+        self.cache = cache
+        self.memo = {}
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stored": 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def __getattr__(self, name):
+        attribute = getattr(self.garmin_client, name)
+        if callable(attribute) and name.startswith("get_"):
+            def cached_call(*args, **kwargs):
+                # Keyword calls are not used by the jobs ~> passed through
+                if kwargs:
+                    return attribute(*args, **kwargs)
+                return self.call(name, attribute, args)
+            return cached_call
+        return attribute
+
+    # Memo (one download for identical calls, also while the first one runs) ~> disk ~> Garmin
+    def call(self, endpoint, function, args):
+        memo_key = (endpoint, json.dumps(args, default=str))
+        with self.lock:
+            future = self.memo.get(memo_key)
+            is_owner = future is None
+            if is_owner:
+                future = self.memo[memo_key] = Future()
+
+        if not is_owner:
+            self.count("memory_hits")
+            return future.result()
+
+        try:
+            response = self.load_or_download(endpoint, function, args)
+        except BaseException as e:
+            with self.lock:
+                del self.memo[memo_key]
+            future.set_exception(e)
+            raise
+        future.set_result(response)
+        return response
+
+    def load_or_download(self, endpoint, function, args):
+        ttl = get_cache_ttl(endpoint, args)
+        if self.cache is not None and ttl != 0:
+            is_hit, response = self.cache.load(endpoint, args, ttl, get_final_date(args))
+            if is_hit:
+                self.count("disk_hits")
+                return response
+
+        response = function(*args)
+        self.count("misses")
+
+        if self.cache is not None and ttl != 0:
+            try:
+                self.cache.save(endpoint, args, response)
+                self.count("stored")
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning("Garmin cache ~> {} not stored: {}".format(endpoint, e))
+        return response
+
+    def get_report(self):
+        with self.lock:
+            return dict(self.counters)
+
+# -------------------------------
+# Prune
+# -------------------------------
+
+# Remove entries older than max_age_days, then the oldest entries until the cache is below max_size_mb
+def prune_garmin_cache(directory, max_age_days=None, max_size_mb=None):
+    entries = []
+    for path in Path(directory).rglob("*.json.gz"):
+        stat = path.stat()
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    nr_removed, size_removed = 0, 0
+    now = time.time()
+    total_size = sum(size for _, size, _ in entries)
+    for modified, size, path in entries:
+        too_old = max_age_days is not None and now - modified > max_age_days * 86400
+        too_large = max_size_mb is not None and total_size > max_size_mb * 1024 * 1024
+        if not (too_old or too_large):
+            continue
+        path.unlink()
+        total_size -= size
+        nr_removed += 1
+        size_removed += size
+
+    return {"entries": len(entries) - nr_removed, "size_mb": round(total_size / 1024 / 1024, 2), "removed": nr_removed, "removed_mb": round(size_removed / 1024 / 1024, 2)}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prune the Garmin Connect response cache")
+    parser.add_argument("--max-age-days", type=float, default=None, help="Remove entries older than this")
+    parser.add_argument("--max-size-mb", type=float, default=None, help="Then remove the oldest entries until the cache is smaller")
+    parser.add_argument("--directory", default=str(config.GARMIN_CACHE_DIRECTORY))
+    arguments = parser.parse_args()
+
+    logger.info("Garmin cache {} ~> {}".format(arguments.directory, prune_garmin_cache(arguments.directory, arguments.max_age_days, arguments.max_size_mb)))
@@ -1,32 +1,149 @@
-import pandas as pd
-import numpy as np
-from typing import Tuple
-from gspread.worksheet import Worksheet 
+from __future__ import annotations
+from typing import Tuple, TYPE_CHECKING
+import math
 import os
+import threading
 
-# Set up repository root path
-def set_up_repo_root_path():
-    import os
-    import sys
-    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    if repo_root not in sys.path:
-        sys.path.insert(0, repo_root)
+# pandas, numpy & gspread are imported on first use (cheap commands like token creation don't load them)
+if TYPE_CHECKING:
+    import pandas as pd
+    from gspread.worksheet import Worksheet
+
+# Google Sheets session ~ Authorize once per process, cache Spreadsheet & Worksheet handles by name
+class GoogleSheetsSession:
+    # One gspread client (one authorized HTTP session, connections are reused) for all jobs of a process.
+    # Opening a file costs one Drive search & one metadata request, all its worksheets are listed with one
+    # more metadata request, and several worksheets of the same file are read with one values_batch_get request.
+    # Only handles are cached, values are read fresh on every import (jobs write before others read).
+    # With a mirror (daily_jobs/sheets_mirror.py) imports only pull new rows and read the rest locally.
+
+    def __init__(self, client=None, credentials=None, mirror=None, http_client=None):
+        if client is None:
+            import gspread
+            client = gspread.authorize(credentials) if http_client is None else gspread.authorize(credentials, http_client=http_client)
+        self.client = client
+        self.mirror = mirror
+        self.spreadsheets = {}
+        self.worksheets = {}
+        self.lock = threading.RLock()
+
+    # Spreadsheet handle (opened once per filename)
+    def open(self, filename):
+        with self.lock:
+            if filename not in self.spreadsheets:
+                self.spreadsheets[filename] = self.client.open(filename)
+            return self.spreadsheets[filename]
+
+    # Worksheet handle (all worksheets of the file are listed once)
+    def worksheet(self, filename, sheet_name):
+        from gspread.exceptions import WorksheetNotFound
+
+        with self.lock:
+            if filename not in self.worksheets:
+                self.worksheets[filename] = {}
+                for sheet in self.open(filename).worksheets():
+                    self.worksheets[filename].setdefault(sheet.title, sheet)
+            if sheet_name not in self.worksheets[filename]:
+                raise WorksheetNotFound(sheet_name)
+            return self.worksheets[filename][sheet_name]
+
+    # Several worksheets of one file in one request ~> {sheet name: (dataframe, sheet)}
+    def import_sheets(self, filename, sheet_names):
+        import pandas as pd
+        from gspread.utils import absolute_range_name, fill_gaps
+
+        sheets = [self.worksheet(filename, sheet_name) for sheet_name in sheet_names]
+
+        if self.mirror is not None:
+            dataframes = self.mirror.sync(self.open(filename), filename, sheet_names)
+            return {sheet_name: (dataframes[sheet_name], sheet) for sheet_name, sheet in zip(sheet_names, sheets)}
+
+        response = self.open(filename).values_batch_get([absolute_range_name(sheet_name) for sheet_name in sheet_names])
+
+        imported_sheets = {}
+        for sheet_name, sheet, value_range in zip(sheet_names, sheets, response.get("valueRanges", [])):
+            data = fill_gaps(value_range.get("values", [[]]))
+            imported_sheets[sheet_name] = (pd.DataFrame(data[1:], columns=data[0]), sheet)
+
+        return imported_sheets
+
+    def import_sheet(self, filename, sheet_name) -> Tuple[pd.DataFrame, Worksheet]:
+        return self.import_sheets(filename, [sheet_name])[sheet_name]
+
+    # Header & newest rows of several worksheets ({sheet name: number of rows}) in one request
+    # (rows 2 to nr_rows + 1; with a mirror: the newest rows of the synced mirror)
+    def import_sheets_tail(self, filename, nr_rows_by_sheet):
+        import pandas as pd
+        from gspread.utils import absolute_range_name, fill_gaps
+
+        sheet_names = list(nr_rows_by_sheet.keys())
+        sheets = [self.worksheet(filename, sheet_name) for sheet_name in sheet_names]
+
+        if self.mirror is not None:
+            dataframes = self.mirror.sync(self.open(filename), filename, sheet_names)
+            return {sheet_name: (dataframes[sheet_name].head(nr_rows_by_sheet[sheet_name]), sheet) for sheet_name, sheet in zip(sheet_names, sheets)}
+
+        response = self.open(filename).values_batch_get([
+            absolute_range_name(sheet_name, "1:{}".format(nr_rows_by_sheet[sheet_name] + 1)) for sheet_name in sheet_names
+            ])
+
+        imported_sheets = {}
+        for sheet_name, sheet, value_range in zip(sheet_names, sheets, response.get("valueRanges", [])):
+            data = fill_gaps(value_range.get("values", [[]]))
+            imported_sheets[sheet_name] = (pd.DataFrame(data[1:], columns=data[0]), sheet)
+
+        return imported_sheets
+
+    def import_sheet_tail(self, filename, sheet_name, nr_rows) -> Tuple[pd.DataFrame, Worksheet]:
+        return self.import_sheets_tail(filename, {sheet_name: nr_rows})[sheet_name]
+
+    # Rows of a worksheet updated in place ~> Its mirror is refreshed fully on the next import
+    def invalidate_mirror(self, sheet):
+        if self.mirror is None:
+            return
+        with self.lock:
+            filenames = [filename for filename, worksheets in self.worksheets.items() if worksheets.get(sheet.title) is sheet]
+        for filename in filenames:
+            self.mirror.invalidate(filename, sheet.title)
+
+# Process wide sessions ~> Default session authorizes with config.DRIVE_CREDENTIALS on first use, sends every
+# request through the shared request scheduler (and reads through the local mirror if config.SHEETS_MIRROR is on)
+google_sheets_sessions = {}
+google_sheets_sessions_lock = threading.Lock()
+
+def get_google_sheets_session(googleDrive_client=None) -> GoogleSheetsSession:
+    if isinstance(googleDrive_client, GoogleSheetsSession):
+        return googleDrive_client
+
+    with google_sheets_sessions_lock:
+        session_key = None if googleDrive_client is None else id(googleDrive_client)
+        if session_key not in google_sheets_sessions:
+            if googleDrive_client is None:
+                from daily_jobs import config
+                from daily_jobs.sheets_mirror import SheetsMirror
+                from daily_jobs.request_scheduler import ScheduledHTTPClient
+                google_sheets_sessions[session_key] = GoogleSheetsSession(
+                    credentials = config.DRIVE_CREDENTIALS,
+                    http_client = ScheduledHTTPClient,
+                    mirror = SheetsMirror(config.SHEETS_MIRROR_DIRECTORY) if config.SHEETS_MIRROR else None
+                    )
+            else:
+                google_sheets_sessions[session_key] = GoogleSheetsSession(client=googleDrive_client)
+        return google_sheets_sessions[session_key]
 
 # Helps ~ Import Google sheet to DataFrame (return dataframe and sheet object for further use)
 def import_google_sheet(googleDrive_client, filename, sheet_name) -> Tuple[pd.DataFrame, Worksheet]:
-    
-    file = googleDrive_client.open(filename)
-    sheet = file.worksheet(sheet_name)
-    data = sheet.get_all_values()
-    dataframe = pd.DataFrame(data[1:], columns=data[0]) 
+    return get_google_sheets_session(googleDrive_client).import_sheet(filename, sheet_name)
 
-    return dataframe, sheet
-
-# Authenticate Garmin Connect API
+# Authenticate Garmin Connect API (login & every get_* call go through the shared request scheduler,
+# responses are memoized & cached on disk if config.GARMIN_CACHE is on)
 def authenticate_garmin_connect_api(garmin_email, garmin_password):
     from garminconnect import Garmin
+    from daily_jobs import config
+    from daily_jobs.request_scheduler import ScheduledGarminClient
+    from daily_jobs.garmin_cache import CachedGarminClient, GarminCache
 
-    garminClient = Garmin(garmin_email, garmin_password)
+    garminClient = ScheduledGarminClient(Garmin(garmin_email, garmin_password))
     garmin_tokenstore = os.getenv("GARMINTOKENS")
 
     if garmin_tokenstore:
@@ -34,16 +151,102 @@ def authenticate_garmin_connect_api(garmin_email, garmin_password):
     else:
         garminClient.login()
 
-    return garminClient
+    garminCache = GarminCache(config.GARMIN_CACHE_DIRECTORY, user=garmin_email) if config.GARMIN_CACHE else None
+    return CachedGarminClient(garminClient, garminCache)
+
+# Tail reads ~ Only the newest rows of logs (rows are newest first, new rows are inserted at row 2)
+# Every log declares a date horizon: all rows dated on or after the horizon are needed (None: all rows
+# of the newest date). The first read gets initial_nr_rows rows per log; logs whose tail does not reach
+# back past the horizon are read again with more rows (estimated from the dates per row read so far,
+# at least twice as many), all such logs of the file in one request. A tail with fewer rows than asked
+# for is the whole log. Read volume depends on the horizon, not on the years of history in the log.
+
+# Newest rows needed for horizon? (dates of rows in the tail, newest first)
+def is_tail_covered(tail_dates, nr_rows, horizon_date):
+    import pandas as pd
+
+    if len(tail_dates) < nr_rows:
+        return True
+    tail_dates = tail_dates.dropna()
+    if len(tail_dates) == 0:
+        return False
+    if horizon_date is None:
+        return tail_dates.min() < tail_dates.max()
+    return tail_dates.min() < pd.Timestamp(horizon_date)
+
+# Number of rows for next tail read (dates per row of this tail ~> rows up to horizon, 25 % extra)
+def get_next_tail_nr_rows(tail_dates, nr_rows, horizon_date):
+    import pandas as pd
+
+    tail_dates = tail_dates.dropna()
+    if horizon_date is None or len(tail_dates) == 0:
+        return 2 * nr_rows
+    covered_days = max((tail_dates.max() - tail_dates.min()).days, 1)
+    missing_days = max((tail_dates.min() - pd.Timestamp(horizon_date)).days + 1, 1)
+    return max(2 * nr_rows, nr_rows + int(math.ceil(1.25 * missing_days * nr_rows / covered_days)))
+
+# Tails of logs of one file ~> {sheet name: (dataframe, log)} like storage.read_logs
+# (tail_horizons: {sheet name: (horizon date or None, initial number of rows)}, storage: daily_jobs/storage.py)
+def read_log_tails(storage, filename, tail_horizons):
+    from daily_jobs import schema
+
+    nr_rows_by_sheet = {sheet_name: initial_nr_rows for sheet_name, (_, initial_nr_rows) in tail_horizons.items()}
+    log_tails = {}
+    while nr_rows_by_sheet:
+        next_nr_rows_by_sheet = {}
+        for sheet_name, (data, log) in storage.read_tails(filename, nr_rows_by_sheet).items():
+            log_tails[sheet_name] = (data, log)
+
+            nr_rows = nr_rows_by_sheet[sheet_name]
+            horizon_date = tail_horizons[sheet_name][0]
+            if len(data) < nr_rows or not set(schema.INT_COLUMNS).issubset(data.columns):
+                continue
+            tail_dates = schema.get_sheet_datetimes(data, with_start_time=False)
+            if not is_tail_covered(tail_dates, nr_rows, horizon_date):
+                next_nr_rows_by_sheet[sheet_name] = get_next_tail_nr_rows(tail_dates, nr_rows, horizon_date)
+        nr_rows_by_sheet = next_nr_rows_by_sheet
+
+    return log_tails
 
 # Create row key for checking duplicates before writing to Google Sheets
 def get_row_key(row, key_columns):
     return tuple(str(row.get(col, "")).strip() for col in key_columns)
 
+# Row keys of all rows (same keys as get_row_key, built column by column)
+def get_row_keys(df, key_columns):
+    import numpy as np
+
+    key_values = []
+    for col in key_columns:
+        if col in df.columns:
+            key_values.append(np.char.strip(df[col].to_numpy(dtype=object).astype(str)).tolist())
+        else:
+            key_values.append([""] * len(df))
+    return list(zip(*key_values))
+
+# Row id (e.g. Garmin activity id) as text, "123" & "123.0" are the same id (None if empty)
+def get_row_id(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    row_id = str(value).strip()
+    if row_id.endswith(".0") and row_id[:-2].isdigit():
+        row_id = row_id[:-2]
+    return row_id or None
+
+# Cell value for comparisons ("5" & 5.0 are the same value)
+def normalize_cell_value(value):
+    value = str(value).strip()
+    try:
+        return repr(float(value))
+    except ValueError:
+        return value
+
 # Convert columns to numeric if possible (all are object ...)
 def safe_convert_to_numeric(x):
+    import pandas as pd
+
     if x == "":
-        return np.nan  
+        return math.nan  
     try:
         return pd.to_numeric(x)
     except (ValueError, TypeError):
@@ -66,7 +269,7 @@ def replace_nan_with_empty_string(obj):
         return tuple(replace_nan_with_empty_string(v) for v in obj)
     elif isinstance(obj, list):  
         return [replace_nan_with_empty_string(v) for v in obj]
-    elif isinstance(obj, float) and np.isnan(obj):
+    elif isinstance(obj, float) and math.isnan(obj):
         return ""
     else:
         return obj
@@ -79,10 +282,192 @@ def clean_data(obj):
         return " | ".join(map(str, obj)) if any(obj) else ""  
     elif isinstance(obj, list):  
         return [clean_data(v) for v in obj]
-    elif isinstance(obj, float) and np.isnan(obj): 
+    elif isinstance(obj, float) and math.isnan(obj): 
         return ""
     else:
         return obj
-    
 
+# Row dict to sheet row (values in column order, numpy scalars as Python values, missing columns empty)
+def row_dict_to_sheet_values(row_dict, columns=None):
+    import numpy as np
+
+    if columns is None:
+        columns = list(row_dict.keys())
+    values = [row_dict.get(column, "") for column in columns]
+    return [value.item() if isinstance(value, np.generic) else value for value in values]
+
+# Existing sheet rows ~ Sheet row number by id column (O(1) lookups), legacy composite key for rows without id
+class SheetRowIndex:
+    # Row numbers are the ones of the sheet as read (first data row = 2). Rows added while writing
+    # are known by id & key, but have no row number (they are not on the sheet yet).
+
+    def __init__(self, sheet_data, key_columns, id_column=None, first_row=2):
+        self.sheet_data = sheet_data
+        self.key_columns = key_columns
+        self.id_column = id_column
+        self.first_row = first_row
+
+        row_numbers = range(first_row, first_row + len(sheet_data))
+        self.rows_by_key = {}
+        for row_key, row_number in zip(get_row_keys(sheet_data, key_columns), row_numbers):
+            self.rows_by_key.setdefault(row_key, row_number)
+
+        self.rows_by_id = {}
+        if id_column is not None and id_column in sheet_data.columns:
+            for row_id, row_number in zip(sheet_data[id_column].to_numpy(dtype=object), row_numbers):
+                row_id = get_row_id(row_id)
+                if row_id is not None:
+                    self.rows_by_id.setdefault(row_id, row_number)
+
+    def get_id(self, row_dict):
+        return None if self.id_column is None else get_row_id(row_dict.get(self.id_column))
+
+    # Match row ~> ("new" | "existing" | "changed", sheet row number or None)
+    def match(self, row_dict):
+        row_id = self.get_id(row_dict)
+        if row_id is not None and row_id in self.rows_by_id:
+            row_number = self.rows_by_id[row_id]
+            if row_number is None or self.has_same_values(row_number, row_dict):
+                return "existing", row_number
+            return "changed", row_number
+
+        row_key = get_row_key(row_dict, self.key_columns)
+        if row_key in self.rows_by_key:
+            return "existing", self.rows_by_key[row_key]
+
+        return "new", None
+
+    # Same values as sheet row (columns of both, numbers compared as numbers)
+    def has_same_values(self, row_number, row_dict):
+        sheet_row = self.sheet_data.iloc[row_number - self.first_row]
+        for column, value in row_dict.items():
+            if column in sheet_row.index and normalize_cell_value(value) != normalize_cell_value(sheet_row[column]):
+                return False
+        return True
+
+    # Row added while writing (not on the sheet yet)
+    def add(self, row_dict):
+        row_id = self.get_id(row_dict)
+        if row_id is not None:
+            self.rows_by_id[row_id] = None
+        self.rows_by_key.setdefault(get_row_key(row_dict, self.key_columns), None)
+
+# Write to Google Sheets ~ Buffer new rows and write them with one call per worksheet
+class BufferedSheetWriter:
+    # Rows are added in the order the jobs used to insert them at row 2, one by one (oldest first),
+    # and written in one insert_rows call in reversed order, so the sheet stays newest first.
+    # The header is checked once, before the first write: rows are written by position, so the sheet header
+    # has to start like the expected header (missing trailing columns are added, extra trailing columns,
+    # e.g. bands of an earlier bootstrap run, are kept and left empty), any other header is refused.
+    # With a row index, rows of existing ids with changed values are updated in place
+    # (one batch_update call, before the new rows are inserted above them), then on_rows_updated(sheet) is called.
+
+    def __init__(self, sheet, key_columns, existing_keys=None, expected_headers=None, columns=None, start_row=2, max_buffered_rows=500, row_index=None, on_rows_updated=None):
+        self.sheet = sheet
+        self.key_columns = key_columns
+        self.existing_keys = set() if existing_keys is None else existing_keys
+        self.expected_headers = expected_headers
+        self.columns = columns
+        self.start_row = start_row
+        self.max_buffered_rows = max_buffered_rows
+        self.row_index = row_index
+        self.on_rows_updated = on_rows_updated
+
+        self.buffered_rows = []
+        self.buffered_updates = []
+        self.header_checked = expected_headers is None
+        self.nr_rows_written = 0
+        self.nr_rows_updated = 0
+        self.nr_rows_skipped = 0
+        self.nr_calls = 0
+
+    def __enter__(self):
+        return self
+
+    # Flush also on errors ~> Rows prepared before the error are kept (like row by row writing)
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+    # Add row (cleaned with clean_data) ~> False if it already exists (unchanged)
+    def add_row(self, row_dict):
+        row_clean = clean_data(row_dict)
+
+        if self.row_index is not None:
+            row_status, row_number = self.row_index.match(row_clean)
+            if row_status == "existing":
+                self.nr_rows_skipped += 1
+                return False
+            if row_status == "changed":
+                self.buffered_updates.append((row_number, row_dict_to_sheet_values(row_clean, self.columns)))
+            else:
+                self.buffered_rows.append(row_dict_to_sheet_values(row_clean, self.columns))
+                self.row_index.add(row_clean)
+        else:
+            row_key = get_row_key(row_clean, self.key_columns)
+            if row_key in self.existing_keys:
+                self.nr_rows_skipped += 1
+                return False
+            self.buffered_rows.append(row_dict_to_sheet_values(row_clean, self.columns))
+            self.existing_keys.add(row_key)
+
+        if self.max_buffered_rows is not None and len(self.buffered_rows) + len(self.buffered_updates) >= self.max_buffered_rows:
+            self.flush()
+        return True
+
+    def check_header(self):
+        if self.header_checked:
+            return
+        self.nr_calls += 1
+        header = self.sheet.row_values(1)
+        if not header:
+            self.sheet.insert_row(self.expected_headers, index=1)
+            self.nr_calls += 1
+        elif len(header) < len(self.expected_headers) and header == self.expected_headers[:len(header)]:
+            self.add_header_columns(header)
+        elif header[:len(self.expected_headers)] != self.expected_headers:
+            raise ValueError("Header of {} doesn't match the expected columns (rows are written by position): {} != {}".format(
+                self.sheet.title, header, self.expected_headers
+                ))
+        self.header_checked = True
+
+    # New trailing columns (e.g. an id column added to an existing sheet)
+    def add_header_columns(self, header):
+        from gspread.utils import rowcol_to_a1
+
+        if self.sheet.col_count < len(self.expected_headers):
+            self.sheet.add_cols(len(self.expected_headers) - self.sheet.col_count)
+            self.nr_calls += 1
+        self.sheet.update(values=[self.expected_headers[len(header):]], range_name=rowcol_to_a1(1, len(header) + 1))
+        self.nr_calls += 1
+
+    # Write buffered updates (rows already inserted by this writer moved existing rows down) & new rows (newest first)
+    def flush(self):
+        from gspread.utils import rowcol_to_a1
+
+        if not self.buffered_rows and not self.buffered_updates:
+            return 0
+
+        self.check_header()
+        if self.buffered_updates:
+            self.sheet.batch_update([
+                {"range": rowcol_to_a1(row_number + self.nr_rows_written, 1), "values": [values]}
+                for row_number, values in self.buffered_updates
+                ])
+            self.nr_calls += 1
+            self.nr_rows_updated += len(self.buffered_updates)
+            self.buffered_updates = []
+            if self.on_rows_updated is not None:
+                self.on_rows_updated(self.sheet)
+
+        rows = self.buffered_rows[::-1]
+        if rows:
+            self.sheet.insert_rows(rows, row=self.start_row)
+            self.nr_calls += 1
+            self.nr_rows_written += len(rows)
+        self.buffered_rows = []
+
+        return len(rows)
 
+    def get_report(self):
+        return "{} rows written, {} rows updated, {} existing rows skipped, {} sheet calls".format(self.nr_rows_written, self.nr_rows_updated, self.nr_rows_skipped, self.nr_calls)
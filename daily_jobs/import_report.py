@@ -0,0 +1,100 @@
+import subprocess
+import sys
+import time
+
+from daily_jobs import config
+
+# Logging
+from daily_jobs.log_config import setup_logger
+logger = setup_logger(name=__name__)
+
+# -----------------------------------------------------
+# Import time report (python -X importtime, summarized)
+# -----------------------------------------------------
+# Every module is imported in a fresh interpreter (repo root as working directory) with -X importtime.
+# The report of a module:
+# - import_ms: import time of the module (its package & everything it imports, interpreter startup excluded),
+# - process_ms: wall time of the whole process (interpreter startup, import, exit),
+# - top_packages: top level packages by time spent in their own modules (e.g. pandas, gspread).
+# Benchmark target for startup: cheap commands (config, token creation, dry runs) must not load
+# pandas or gspread. Run with:
+#   python -m daily_jobs import-report daily_jobs.__main__ daily_jobs.create_garmin_tokens --budget-ms 100
+
+# -X importtime lines ~> [(self us, cumulative us, nesting level, module)]
+def parse_import_times(stderr):
+    import_times = []
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0].split(":")[1]), int(parts[1])
+        except ValueError:
+            continue # header line
+        module = parts[2][1:]
+        import_times.append((self_us, cumulative_us, (len(module) - len(module.lstrip())) // 2, module.strip()))
+    return import_times
+
+# Import times of module only (lines are printed after their imports ~> nested lines come before their top level line)
+def get_module_import_times(import_times, module):
+    module_packages = {".".join(module.split(".")[:i]) for i in range(1, len(module.split(".")) + 1)}
+    module_import_times, nested_import_times = [], []
+    for import_time in import_times:
+        nested_import_times.append(import_time)
+        if import_time[2] == 0:
+            if import_time[3] in module_packages:
+                module_import_times += nested_import_times
+            nested_import_times = []
+    return module_import_times
+
+def get_import_report(module, top=None, python=None):
+    top = config.IMPORT_REPORT_TOP_PACKAGES if top is None else top
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+        cwd=config.REPO_ROOT, capture_output=True, text=True
+        )
+    process_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError("import {} failed: {}".format(module, completed.stderr.strip().splitlines()[-1:]))
+
+    module_import_times = get_module_import_times(parse_import_times(completed.stderr), module)
+    package_us = {}
+    for self_us, _, _, imported_module in module_import_times:
+        package = imported_module.split(".")[0]
+        package_us[package] = package_us.get(package, 0) + self_us
+
+    return {
+        "module": module,
+        "import_ms": round(sum(cumulative_us for _, cumulative_us, level, _ in module_import_times if level == 0) / 1000, 1),
+        "process_ms": round(process_ms, 1),
+        "nr_modules": len(module_import_times),
+        "top_packages": {package: round(us / 1000, 1) for package, us in sorted(package_us.items(), key=lambda item: -item[1])[:top]},
+        }
+
+# Modules ~> exit code (1 if the import of a module takes longer than budget_ms)
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m daily_jobs import-report", description="Import time of entry point modules (python -X importtime, summarized)")
+    parser.add_argument("modules", nargs="*", default=config.IMPORT_REPORT_MODULES)
+    parser.add_argument("--top", type=int, default=config.IMPORT_REPORT_TOP_PACKAGES, help="Number of packages listed per module")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if an import takes longer than this")
+    arguments = parser.parse_args(argv)
+
+    over_budget = []
+    for module in arguments.modules:
+        report = get_import_report(module, top=arguments.top)
+        logger.info("Import time ~> {}: {} ms import, {} ms process, {} modules, top {}".format(
+            module, report["import_ms"], report["process_ms"], report["nr_modules"], report["top_packages"]
+            ))
+        if arguments.budget_ms is not None and report["import_ms"] > arguments.budget_ms:
+            over_budget.append(module)
+
+    if over_budget:
+        logger.error("Import time ~> over budget of {} ms: {}".format(arguments.budget_ms, over_budget))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,10 @@
-# Set up repo root path
-import os
-import sys
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-if repo_root not in sys.path:
-    sys.path.insert(0, repo_root)
-
 # Configure logging
-from daily_jobs.config import env
 import logging
 
 def setup_logger(name=None, level=None):
 
     if level is None:
+        from daily_jobs.config import env
         if env == "prod":
             level = logging.INFO
         elif env == "dev":
@@ -0,0 +1,280 @@
+import random
+import threading
+import time
+
+from daily_jobs import config
+
+# Logging
+from daily_jobs.log_config import setup_logger
+logger = setup_logger(name=__name__)
+
+# -----------------------------------------------------
+# Shared request scheduler (Garmin Connect & Google Sheets)
+# -----------------------------------------------------
+# Every Garmin and Sheets API call of a process goes through one scheduler:
+# - token bucket per service (steady rate + burst), waits before sending,
+# - at most max_concurrency calls in flight per service,
+# - rate limited (429), timed out (408), server errors (5xx) & connection errors are retried
+#   after Retry-After (if the response has one) or exponential backoff with jitter,
+# - writes (Sheets requests other than GET, e.g. insert_rows & batch_update) may have been applied
+#   when they time out or fail on the server, so they are only retried if they were surely not:
+#   rate limited (429) or no connection to the server,
+# - authentication errors (401/403, Garmin authentication errors) are not retried; after
+#   CIRCUIT_BREAKER_MAX_AUTH_FAILURES in a row the circuit opens and every further call of
+#   that service fails at once (no more requests with bad credentials, no lockouts),
+# - counters of calls, retries & time spent waiting (get_report).
+
+RETRY_STATUS_CODES = {408, 429}
+AUTH_STATUS_CODES = {401, 403}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "usageLimits", "RATE_LIMIT_EXCEEDED")
+
+# Raised instead of calling a service whose circuit is open
+class CircuitOpenError(RuntimeError):
+    pass
+
+# Token bucket ~ rate tokens per second, at most burst tokens saved up
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Take one token, wait until there is one ~> seconds waited
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+# Circuit breaker ~ opens after max_failures authentication failures in a row
+class CircuitBreaker:
+
+    def __init__(self, max_failures):
+        self.max_failures = max_failures
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.failures >= self.max_failures
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            return self.is_open
+
+# -------------------------------
+# Classify errors
+# -------------------------------
+
+# HTTP response of error (gspread APIError, requests HTTPError, or chained in a Garmin error)
+def get_error_response(error):
+    while error is not None:
+        response = getattr(error, "response", None)
+        if response is not None and hasattr(response, "status_code"):
+            return response
+        error = error.__cause__ or error.__context__
+    return None
+
+# Seconds from Retry-After header (None if missing or an HTTP date)
+def get_retry_after(response):
+    if response is None:
+        return None
+    try:
+        return max(float(response.headers.get("Retry-After")), 0.0)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+# Rate limited response (Drive API answers exceeded quotas with 403 too)
+def is_rate_limited(response):
+    return response.status_code == 429 or (response.status_code == 403 and any(reason in str(getattr(response, "text", "")) for reason in RATE_LIMIT_REASONS))
+
+# Error ~> "retry", "auth" or "fail"
+def classify_error(error):
+    error_name = type(error).__name__
+    if error_name == "GarminConnectAuthenticationError":
+        return "auth"
+    if error_name in ("GarminConnectTooManyRequestsError", "GarminConnectConnectionError"):
+        return "retry"
+
+    response = get_error_response(error)
+    if response is not None:
+        if is_rate_limited(response):
+            return "retry"
+        if response.status_code in AUTH_STATUS_CODES:
+            return "auth"
+        if response.status_code in RETRY_STATUS_CODES or response.status_code >= 500:
+            return "retry"
+        return "fail"
+
+    if isinstance(error, (ConnectionError, TimeoutError)) or error_name in ("ConnectionError", "Timeout", "ConnectTimeout", "ReadTimeout"):
+        return "retry"
+    return "fail"
+
+# Request surely not applied (rate limited or never sent) ~> Also safe to retry for writes
+def is_not_applied_error(error):
+    response = get_error_response(error)
+    if response is not None:
+        return is_rate_limited(response)
+
+    # requests wraps failed connections: ConnectionError(MaxRetryError(reason=NewConnectionError))
+    if type(error).__name__ == "ConnectTimeout":
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return type(reason).__name__ in ("NewConnectionError", "NameResolutionError", "ConnectTimeoutError")
+
+# -------------------------------
+# Scheduler
+# -------------------------------
+
+class RequestScheduler:
+
+    def __init__(self, limits, max_retries, backoff_base, backoff_max, max_auth_failures):
+        self.limits = limits
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_auth_failures = max_auth_failures
+        self.buckets = {}
+        self.semaphores = {}
+        self.breakers = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    # Bucket, semaphore, breaker & counters of service (created on first call)
+    def get_service(self, service):
+        with self.lock:
+            if service not in self.buckets:
+                limits = self.limits.get(service, self.limits["default"])
+                self.buckets[service] = TokenBucket(limits["rate"], limits["burst"])
+                self.semaphores[service] = threading.BoundedSemaphore(limits["max_concurrency"])
+                self.breakers[service] = CircuitBreaker(self.max_auth_failures)
+                self.counters[service] = {"calls": 0, "retries": 0, "failures": 0, "rate_limit_wait": 0.0, "backoff_wait": 0.0}
+            return self.buckets[service], self.semaphores[service], self.breakers[service], self.counters[service]
+
+    def count(self, counters, name, value=1):
+        with self.lock:
+            counters[name] += value
+
+    # Exponential backoff with full jitter
+    def get_backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    # Call function(*args, **kwargs) of service under the service limits
+    # (idempotent=False: write, only retried if it was surely not applied)
+    def call(self, service, function, *args, idempotent=True, **kwargs):
+        bucket, semaphore, breaker, counters = self.get_service(service)
+
+        attempt = 0
+        while True:
+            if breaker.is_open:
+                raise CircuitOpenError("{}: circuit open after {} authentication failures in a row".format(service, breaker.failures))
+
+            self.count(counters, "rate_limit_wait", bucket.acquire())
+            self.count(counters, "calls")
+            try:
+                with semaphore:
+                    result = function(*args, **kwargs)
+            except Exception as e:
+                error_class = classify_error(e)
+
+                if error_class == "auth":
+                    self.count(counters, "failures")
+                    if breaker.record_failure():
+                        logger.error("{}: authentication failed {} times in a row, stopping further requests".format(service, breaker.failures))
+                    raise
+
+                if error_class != "retry" or attempt >= self.max_retries or not (idempotent or is_not_applied_error(e)):
+                    self.count(counters, "failures")
+                    raise
+
+                retry_after = get_retry_after(get_error_response(e))
+                wait = min(retry_after, self.backoff_max) if retry_after is not None else self.get_backoff(attempt)
+                logger.warning("{}: {} ~> retry {}/{} in {:.2f}s".format(service, type(e).__name__, attempt + 1, self.max_retries, wait))
+                self.count(counters, "retries")
+                self.count(counters, "backoff_wait", wait)
+                time.sleep(wait)
+                attempt += 1
+                continue
+
+            breaker.record_success()
+            return result
+
+    # Counters of all services (seconds rounded)
+    def get_report(self):
+        with self.lock:
+            return {
+                service: {name: round(value, 2) if isinstance(value, float) else value for name, value in counters.items()}
+                for service, counters in self.counters.items()
+            }
+
+# Process wide scheduler (limits from config)
+request_scheduler = None
+request_scheduler_lock = threading.Lock()
+
+def get_request_scheduler():
+    global request_scheduler
+    with request_scheduler_lock:
+        if request_scheduler is None:
+            request_scheduler = RequestScheduler(
+                limits = config.REQUEST_SCHEDULER_LIMITS,
+                max_retries = config.REQUEST_MAX_RETRIES,
+                backoff_base = config.REQUEST_BACKOFF_BASE_SECONDS,
+                backoff_max = config.REQUEST_BACKOFF_MAX_SECONDS,
+                max_auth_failures = config.CIRCUIT_BREAKER_MAX_AUTH_FAILURES
+                )
+        return request_scheduler
+
+# -------------------------------
+# Scheduled clients
+# -------------------------------
+
+# gspread HTTP client ~ every Sheets & Drive request goes through the scheduler, only GET requests are idempotent
+# (class built on first use of ScheduledHTTPClient, importing the scheduler doesn't load gspread)
+scheduled_http_client = None
+
+def get_scheduled_http_client():
+    global scheduled_http_client
+    if scheduled_http_client is None:
+        from gspread.http_client import HTTPClient
+
+        class ScheduledHTTPClient(HTTPClient):
+
+            def request(self, *args, **kwargs):
+                method = args[0] if args else kwargs.get("method", "")
+                return get_request_scheduler().call("sheets", super().request, *args, idempotent=str(method).upper() in ("GET", "HEAD"), **kwargs)
+
+        scheduled_http_client = ScheduledHTTPClient
+    return scheduled_http_client
+
+def __getattr__(name):
+    if name == "ScheduledHTTPClient":
+        return get_scheduled_http_client()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+# Garmin client ~ every get_* call (& login) goes through the scheduler, everything else as is
+class ScheduledGarminClient:
+
+    def __init__(self, garmin_client):
+        self.garmin_client = garmin_client
+
+    def __getattr__(self, name):
+        attribute = getattr(self.garmin_client, name)
+        if callable(attribute) and (name.startswith("get_") or name == "login"):
+            def scheduled_call(*args, **kwargs):
+                return get_request_scheduler().call("garmin", attribute, *args, **kwargs)
+            return scheduled_call
+        return attribute
@@ -1,45 +1,135 @@
-# ----------------------------------------------------- 
+# -----------------------------------------------------
 # Libraries
 # -----------------------------------------------------
 
-import datetime
-
-# Set up repo root path
+import logging
+import queue
+import threading
+import time
 import os
 import sys
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-if repo_root not in sys.path:
-    sys.path.insert(0, repo_root)
 
 # Help functions & "Main" functions
 from daily_jobs import config
-from daily_statistics_job.main import get_write_basic_daily_activity_statistics
-from hasr_tl_job.main import prepare_calculate_write_hasr_tl
+from daily_jobs.request_scheduler import get_request_scheduler
 
 # Logging
 from daily_jobs.log_config import setup_logger
 logger = setup_logger(name=__name__)
 
-# GOGO!
-if __name__ == "__main__":
+# -----------------------------------------------------
+# Users in parallel
+# -----------------------------------------------------
+# Every user runs in its own thread (at most RUN_ALL_MAX_WORKERS at a time): Daily & Activity statistics,
+# then HASR-TL (skipped if the statistics failed). Failures are isolated, the other users go on.
+# Garmin & Sheets requests of all users still share the process wide request scheduler.
+# A user still running after RUN_ALL_USER_TIMEOUT_SECONDS is reported as timed out (threads can't be
+# stopped ~> daemon threads, the process exits without waiting for them).
+
+# Steps of user ~> {step: status}
+def run_user(user):
+    # Jobs on first use (pandas & Sheets clients load here, not on import)
+    from daily_statistics_job.main import get_write_basic_daily_activity_statistics
+    from hasr_tl_job.main import prepare_calculate_write_hasr_tl
+
+    user_config = config.USER_CONFIGURATIONS[user]
+    steps = {}
+
+    # Get and write basic Daily & Activity statistics
+    if user in config.BASIC_DAILY_ACTIVITY_STATISTICS_USERS:
+        try:
+            get_write_basic_daily_activity_statistics(
+                garmin_email = user_config["garmin_email"],
+                garmin_password = user_config["garmin_password"] ,
+                activity_log_file_name = user_config["gdrive_activity_log_filename"],
+                daily_log_file_name = user_config["gdrive_daily_log_filename"],
+                storage_backend = user_config["storage"]
+            )
+            steps["daily_statistics"] = "ok"
+        except Exception as e:
+            logger.exception("User {} ~> Daily & Activity statistics failed".format(user))
+            steps["daily_statistics"] = "failed ({}: {})".format(type(e).__name__, e)
+
+    # Get and write History Aware Relative Stratified Training Load
+    if user in config.HISTORY_AWARE_RELATIVE_STRATIFIED_ACTIVITY_LOG_USERS:
+        if steps.get("daily_statistics", "ok") != "ok":
+            steps["hasr_tl"] = "skipped"
+        else:
+            try:
+                prepare_calculate_write_hasr_tl(
+                    garmin_email = user_config["garmin_email"],
+                    activity_log_file_name = user_config["gdrive_activity_log_filename"],
+                    storage_backend = user_config["storage"]
+                )
+                steps["hasr_tl"] = "ok"
+            except Exception as e:
+                logger.exception("User {} ~> HASR-TL failed".format(user))
+                steps["hasr_tl"] = "failed ({}: {})".format(type(e).__name__, e)
+
+    return steps
+
+# Users ~> {user: {"status": "ok" | "failed" | "timeout", "steps": {...}, "seconds": ...}} (in user order)
+def run_users(users, max_workers=None, timeout=None):
+    max_workers = config.RUN_ALL_MAX_WORKERS if max_workers is None else max_workers
+    timeout = config.RUN_ALL_USER_TIMEOUT_SECONDS if timeout is None else timeout
+
+    results = {}
+    finished = queue.Queue()
+    pending = list(users)
+    running = {} # user ~> start time
+
+    def run_user_thread(user):
+        try:
+            finished.put((user, run_user(user)))
+        except BaseException as e:
+            finished.put((user, {"run": "failed ({}: {})".format(type(e).__name__, e)}))
+
+    while pending or running:
+        while pending and len(running) < max_workers:
+            user = pending.pop(0)
+            logger.info("User {} ~> started".format(user))
+            running[user] = time.monotonic()
+            threading.Thread(target=run_user_thread, args=(user,), name="user-{}".format(user), daemon=True).start()
+
+        next_deadline = min(started + timeout for started in running.values())
+        try:
+            user, steps = finished.get(timeout=max(next_deadline - time.monotonic(), 0))
+        except queue.Empty:
+            user, steps = None, None
+
+        if user is not None and user in running:
+            status = "ok" if all(step in ("ok", "skipped") for step in steps.values()) else "failed"
+            results[user] = {"status": status, "steps": steps, "seconds": round(time.monotonic() - running.pop(user), 1)}
+            logger.info("User {} ~> {}".format(user, status))
+
+        for user, started in list(running.items()):
+            if time.monotonic() - started >= timeout:
+                results[user] = {"status": "timeout", "steps": {}, "seconds": round(time.monotonic() - running.pop(user), 1)}
+                logger.error("User {} ~> timed out after {}s".format(user, timeout))
+
+    return {user: results[user] for user in users}
+
+# Users of any job, in config order
+def get_users():
+    return list(dict.fromkeys(config.BASIC_DAILY_ACTIVITY_STATISTICS_USERS + config.HISTORY_AWARE_RELATIVE_STRATIFIED_ACTIVITY_LOG_USERS))
+
+# All users ~> exit code
+def main():
     logger.info("Go Main!")
-    
-    # Get and write basic Daily & Activity statistics for all selected users
-    for user in config.BASIC_DAILY_ACTIVITY_STATISTICS_USERS:
-        user_config = config.USER_CONFIGURATIONS[user]
-        get_write_basic_daily_activity_statistics(
-            garmin_email = user_config["garmin_email"], 
-            garmin_password = user_config["garmin_password"] , 
-            activity_log_file_name = user_config["gdrive_activity_log_filename"], 
-            daily_log_file_name = user_config["gdrive_daily_log_filename"]
-        )
-
-    # Get and write History Aware Relative Stratified Training Load for all selected users
-    for user in config.HISTORY_AWARE_RELATIVE_STRATIFIED_ACTIVITY_LOG_USERS:
-        user_config = config.USER_CONFIGURATIONS[user]
-        prepare_calculate_write_hasr_tl(
-            garmin_email = user_config["garmin_email"], 
-            activity_log_file_name = user_config["gdrive_activity_log_filename"]
-        )
 
+    results = run_users(get_users())
+
+    logger.info("Requests ~> {}".format(get_request_scheduler().get_report()))
+    for user, result in results.items():
+        logger.info("Summary ~> {}: {} in {}s {}".format(user, result["status"], result["seconds"], result["steps"]))
     logger.info("Done: Main")
+
+    # Failed users fail the run, timed out users' threads are not waited for
+    if any(result["status"] == "timeout" for result in results.values()):
+        logging.shutdown()
+        os._exit(1)
+    return 1 if any(result["status"] != "ok" for result in results.values()) else 0
+
+# GOGO!
+if __name__ == "__main__":
+    sys.exit(main())
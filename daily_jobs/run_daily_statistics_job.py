@@ -2,16 +2,9 @@
 # Libraries
 # -----------------------------------------------------
 
-import os
-import sys
-
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-if repo_root not in sys.path:
-    sys.path.insert(0, repo_root)
-
 from daily_jobs import config
+from daily_jobs.request_scheduler import get_request_scheduler
 from daily_jobs.log_config import setup_logger
-from daily_statistics_job.main import get_write_basic_daily_activity_statistics
 
 logger = setup_logger(name=__name__)
 
@@ -20,7 +13,10 @@ logger = setup_logger(name=__name__)
 # Main: Run basic daily and activity statistics job
 # -----------------------------------------------------
 
-if __name__ == "__main__":
+def main():
+    # Job on first use (pandas & Sheets clients load here, not on import)
+    from daily_statistics_job.main import get_write_basic_daily_activity_statistics
+
     logger.info("Go Daily Statistics Job")
 
     for user in config.BASIC_DAILY_ACTIVITY_STATISTICS_USERS:
@@ -29,7 +25,13 @@ if __name__ == "__main__":
             garmin_email = user_config["garmin_email"],
             garmin_password = user_config["garmin_password"],
             activity_log_file_name = user_config["gdrive_activity_log_filename"],
-            daily_log_file_name = user_config["gdrive_daily_log_filename"]
+            daily_log_file_name = user_config["gdrive_daily_log_filename"],
+            storage_backend = user_config["storage"]
         )
 
+    logger.info("Requests ~> {}".format(get_request_scheduler().get_report()))
     logger.info("Done: Daily Statistics Job")
+    return 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import pandas as pd
+import numpy as np
+
+# Expected sheet columns
+from daily_statistics_job import config as daily_statistics_config
+from hasr_tl_job import config as hasr_tl_config
+
+# -----------------------------------------------------
+# Typed sheet schemas
+# -----------------------------------------------------
+# Sheet values are text. Every column is parsed at once into one dtype:
+# - "int": nullable Int64 (date parts),
+# - "float": float64,
+# - "category": categorical (few distinct labels),
+# - "text": object, empty cells as NaN,
+# - "infer": float64 if every non-empty cell is numeric, otherwise text (columns without schema).
+# Empty cells are missing values (NaN / <NA>) in every dtype. Non-empty cells that do not
+# fit the column dtype become missing too and are returned as parse errors (row = sheet row,
+# header is row 1). No logging here: the engine (and its CLIs) must not need daily_jobs.config.
+
+INT_COLUMNS = ["Year", "Month", "Day"]
+CATEGORY_COLUMNS = ["Weekday", "Activity type", "Aggregate variable", "Session Baseline Class"]
+TEXT_COLUMNS = [
+    "Description", "Start time", "Location",
+    "Aerobic training effect message", "Anaerobic training effect message", "Training effect label",
+    "Activity ID",
+    ]
+
+# Column dtypes of sheet with given headers (everything else is float)
+def get_sheet_schema(expected_headers):
+    sheet_schema = {}
+    for column in expected_headers:
+        if column in INT_COLUMNS:
+            sheet_schema[column] = "int"
+        elif column in CATEGORY_COLUMNS:
+            sheet_schema[column] = "category"
+        elif column in TEXT_COLUMNS:
+            sheet_schema[column] = "text"
+        else:
+            sheet_schema[column] = "float"
+    return sheet_schema
+
+DAILY_LOG_SCHEMA = get_sheet_schema(daily_statistics_config.DAILY_LOG_EXPECTED_HEADERS)
+ACTIVITY_LOG_SCHEMA = get_sheet_schema(daily_statistics_config.ACTIVITY_LOG_EXPECTED_HEADERS)
+
+def get_hasr_tl_schema(agg_variable=hasr_tl_config.AGG_VARIABLE):
+    return get_sheet_schema(hasr_tl_config.get_required_columns_order(agg_variable, bootstrap=True))
+
+HASR_TL_SCHEMA = get_hasr_tl_schema()
+
+# -----------------------------------------------------
+# Parse whole columns
+# -----------------------------------------------------
+
+# Text column ~> Object array, empty cells as NaN (& mask of empty cells)
+def get_text_values(values):
+    text_values = np.array(values, dtype=object)
+    empty_mask = pd.isna(text_values) | (text_values == "")
+    text_values[empty_mask] = np.nan
+    return text_values, empty_mask
+
+# Parse one column ~> (parsed values, mask of cells that failed)
+def parse_column(values, column_type):
+
+    text_values, empty_mask = get_text_values(values)
+    no_errors_mask = np.zeros(len(text_values), dtype=bool)
+
+    if column_type == "text":
+        return pd.Series(text_values, index=values.index, dtype=object), no_errors_mask
+    if column_type == "category":
+        return pd.Categorical(text_values), no_errors_mask
+
+    # Same number parsing as pd.to_numeric per cell, for the whole column at once
+    numeric_values = np.full(len(text_values), np.nan)
+    numeric_values[~empty_mask] = pd.to_numeric(text_values[~empty_mask], errors="coerce")
+    failed_mask = ~empty_mask & np.isnan(numeric_values)
+
+    if column_type == "infer":
+        if failed_mask.any():
+            return pd.Series(text_values, index=values.index, dtype=object), no_errors_mask
+        return numeric_values, failed_mask
+
+    if column_type == "int":
+        non_integer_mask = ~np.isnan(numeric_values) & (numeric_values != np.round(numeric_values))
+        numeric_values[non_integer_mask] = np.nan
+        return pd.array(numeric_values, dtype="Int64"), failed_mask | non_integer_mask
+
+    return numeric_values, failed_mask
+
+# Parse sheet data ~> (typed DataFrame, cells that failed to parse)
+def parse_sheet_data(sheet_data, sheet_schema):
+
+    parsed_data = {}
+    parse_errors = []
+    for column in sheet_data.columns:
+        parsed_data[column], failed_mask = parse_column(sheet_data[column], sheet_schema.get(column, "infer"))
+        for i in np.flatnonzero(failed_mask):
+            parse_errors.append({"Row": int(i) + 2, "Column": column, "Value": sheet_data[column].iloc[i]})
+
+    parsed_data = pd.DataFrame(parsed_data, index=sheet_data.index)
+    parse_errors = pd.DataFrame(parse_errors, columns=["Row", "Column", "Value"])
+
+    return parsed_data, parse_errors
+
+# Short parse error summary for logs
+def get_parse_errors_message(parse_errors, sheet_name):
+    return "{}: {} cells could not be parsed (set to missing), first: {}".format(
+        sheet_name,
+        len(parse_errors),
+        parse_errors.head(5).to_dict(orient="records")
+        )
+
+# Datetime from Year, Month, Day (& Start time "HH:MM", missing ~> 00:00); incomplete dates ~> NaT
+def get_sheet_datetimes(sheet_data, with_start_time=True):
+
+    date_parts = {}
+    for column in INT_COLUMNS:
+        date_parts[column.lower()] = pd.to_numeric(sheet_data[column], errors="coerce")
+
+    if with_start_time and "Start time" in sheet_data.columns:
+        start_times = pd.Series(get_text_values(sheet_data["Start time"])[0], index=sheet_data.index).fillna("00:00")
+        start_time_parts = start_times.astype(str).str.extract(r"^(\d{1,2}):(\d{1,2})$")
+        date_parts["hour"] = pd.to_numeric(start_time_parts[0], errors="coerce")
+        date_parts["minute"] = pd.to_numeric(start_time_parts[1], errors="coerce")
+
+    date_parts = pd.DataFrame(date_parts, index=sheet_data.index).astype(float)
+    complete_mask = date_parts.notna().all(axis=1)
+
+    datetimes = pd.Series(pd.NaT, index=sheet_data.index, dtype="datetime64[ns]")
+    if complete_mask.any():
+        datetimes.loc[complete_mask] = pd.to_datetime(date_parts.loc[complete_mask].astype(np.int64), errors="coerce")
+
+    return datetimes
@@ -0,0 +1,234 @@
+import pandas as pd
+import json
+import re
+import sqlite3
+from pathlib import Path
+from gspread.utils import absolute_range_name, fill_gaps
+
+# Logging
+from daily_jobs.log_config import setup_logger
+logger = setup_logger(name=__name__)
+
+# -----------------------------------------------------
+# Local mirror of Google Sheets logs
+# -----------------------------------------------------
+# One SQLite file per spreadsheet, one table per worksheet. Rows are stored with their
+# position counted from the bottom of the sheet (oldest row = 0): the jobs insert new rows
+# at row 2, so new rows only ever get new, higher positions.
+#
+# Sync of a mirrored worksheet (watermark = number of rows & newest row):
+# 1. Fingerprint ~> header & column A of every worksheet (one values_batch_get request)
+#    gives the current number of rows.
+# 2. Delta ~> the new rows at the top plus one overlap row (must be the mirrored newest
+#    row) and the last row (must be the mirrored oldest row), one request for all sheets.
+# 3. Anything else (changed header, fewer rows, edited edge rows, no mirror yet) ~> full
+#    refresh of these worksheets with one values_batch_get request.
+#
+# Values are stored as the sheet's text (like get_all_values), so readers get exactly the
+# DataFrame of an API read; columns are typed by the readers (daily_jobs/schema.py), not here.
+# Edits of rows between the newest and the oldest row are not detected by the fingerprint:
+# rows the jobs update in place (BufferedSheetWriter) drop the worksheet's mirror state, so
+# the next sync refreshes it fully; use full_refresh=True after manual edits.
+
+SHEETS_MIRROR_STATE_TABLE = "sheets_mirror_state"
+
+# Quote SQLite identifier (worksheet names are used as table names)
+def quote_identifier(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+# Rows padded to header width (cells right of the header are ignored)
+def pad_rows(rows, width):
+    return [list(row[:width]) + [""] * (width - len(row)) for row in rows]
+
+class SheetsMirror:
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    # Mirror file of spreadsheet
+    def get_path(self, filename):
+        file_key = re.sub(r"[^A-Za-z0-9]+", "_", str(filename)).strip("_")
+        return self.directory / "{}.sqlite".format(file_key)
+
+    def connect(self, filename):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.get_path(filename))
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS {} (sheet_name TEXT PRIMARY KEY, header TEXT, nr_rows INTEGER, newest_row TEXT, oldest_row TEXT)".format(SHEETS_MIRROR_STATE_TABLE)
+            )
+        return connection
+
+    # -------------------------------
+    # Read & write mirrored worksheets
+    # -------------------------------
+
+    # Mirror state of worksheet (None if not mirrored)
+    def load_state(self, connection, sheet_name):
+        state_row = connection.execute(
+            "SELECT header, nr_rows, newest_row, oldest_row FROM {} WHERE sheet_name = ?".format(SHEETS_MIRROR_STATE_TABLE),
+            (sheet_name,)
+            ).fetchone()
+        if state_row is None:
+            return None
+
+        return {
+            "header": json.loads(state_row[0]),
+            "nr_rows": state_row[1],
+            "newest_row": json.loads(state_row[2]),
+            "oldest_row": json.loads(state_row[3]),
+        }
+
+    def save_state(self, connection, sheet_name, header, nr_rows, newest_row, oldest_row):
+        connection.execute(
+            "INSERT OR REPLACE INTO {} VALUES (?, ?, ?, ?, ?)".format(SHEETS_MIRROR_STATE_TABLE),
+            (sheet_name, json.dumps(header), nr_rows, json.dumps(newest_row), json.dumps(oldest_row))
+            )
+
+    # Worksheet as DataFrame (sheet order, newest first)
+    def read_table(self, connection, sheet_name, header):
+        value_columns = ", ".join("c{}".format(i) for i in range(len(header)))
+        if not value_columns:
+            return pd.DataFrame(columns=header)
+
+        rows = connection.execute(
+            "SELECT {} FROM {} ORDER BY position DESC".format(value_columns, quote_identifier(sheet_name))
+            ).fetchall()
+
+        return pd.DataFrame([list(row) for row in rows], columns=header)
+
+    # Insert rows (sheet order, newest first) above position first_position
+    def insert_rows(self, connection, sheet_name, rows, first_position):
+        if not rows or not rows[0]:
+            return
+        placeholders = ", ".join(["?"] * (len(rows[0]) + 1))
+        nr_rows = len(rows)
+        connection.executemany(
+            "INSERT INTO {} VALUES ({})".format(quote_identifier(sheet_name), placeholders),
+            [[first_position + nr_rows - 1 - i] + row for i, row in enumerate(rows)]
+            )
+
+    # Replace mirrored worksheet with sheet values (header + rows)
+    def write_table(self, connection, sheet_name, values):
+        header = list(values[0]) if values else []
+        rows = pad_rows(values[1:], len(header))
+
+        value_columns = "".join(", c{} TEXT".format(i) for i in range(len(header)))
+        connection.execute("DROP TABLE IF EXISTS {}".format(quote_identifier(sheet_name)))
+        connection.execute("CREATE TABLE {} (position INTEGER PRIMARY KEY{})".format(quote_identifier(sheet_name), value_columns))
+        self.insert_rows(connection, sheet_name, rows, 0)
+        self.save_state(connection, sheet_name, header, len(rows), rows[0] if rows else [], rows[-1] if rows else [])
+
+        return header
+
+    # Worksheet changed in place ~> Next sync is a full refresh
+    def invalidate(self, filename, sheet_name):
+        if not self.get_path(filename).exists():
+            return
+
+        connection = self.connect(filename)
+        try:
+            connection.execute("DELETE FROM {} WHERE sheet_name = ?".format(SHEETS_MIRROR_STATE_TABLE), (sheet_name,))
+            connection.commit()
+        finally:
+            connection.close()
+
+    # Read mirrored worksheet without any API request (None if not mirrored)
+    def read_sheet(self, filename, sheet_name):
+        if not self.get_path(filename).exists():
+            return None
+
+        connection = self.connect(filename)
+        try:
+            state = self.load_state(connection, sheet_name)
+            return None if state is None else self.read_table(connection, sheet_name, state["header"])
+        finally:
+            connection.close()
+
+    # -------------------------------
+    # Sync
+    # -------------------------------
+
+    # New rows of mirrored worksheets (None ~> full refresh needed)
+    def get_delta_rows(self, spreadsheet, states):
+
+        # Fingerprint ~> Header & number of rows
+        sheet_names = list(states.keys())
+        fingerprint_ranges = []
+        for sheet_name in sheet_names:
+            fingerprint_ranges += [absolute_range_name(sheet_name, "1:1"), absolute_range_name(sheet_name, "A:A")]
+        value_ranges = spreadsheet.values_batch_get(fingerprint_ranges).get("valueRanges", [])
+
+        delta_sheet_names, delta_ranges, nr_new_rows = [], [], {}
+        delta_rows = {sheet_name: None for sheet_name in sheet_names}
+        for i, sheet_name in enumerate(sheet_names):
+            state = states[sheet_name]
+            header = (value_ranges[2*i].get("values") or [[]])[0]
+            nr_rows = max(len(value_ranges[2*i + 1].get("values", [])) - 1, 0)
+            if header == state["header"] and nr_rows == state["nr_rows"] == 0:
+                delta_rows[sheet_name] = []
+                continue
+            if header != state["header"] or state["nr_rows"] == 0 or nr_rows < state["nr_rows"]:
+                continue
+
+            nr_new_rows[sheet_name] = nr_rows - state["nr_rows"]
+            delta_sheet_names.append(sheet_name)
+            delta_ranges += [
+                absolute_range_name(sheet_name, "2:{}".format(nr_new_rows[sheet_name] + 2)),
+                absolute_range_name(sheet_name, "{0}:{0}".format(nr_rows + 1)),
+                ]
+
+        if not delta_sheet_names:
+            return delta_rows
+
+        # Delta ~> New rows + overlap row & last row (edge rows must be unchanged)
+        value_ranges = spreadsheet.values_batch_get(delta_ranges).get("valueRanges", [])
+        for i, sheet_name in enumerate(delta_sheet_names):
+            state = states[sheet_name]
+            width = len(state["header"])
+            top_rows = pad_rows(value_ranges[2*i].get("values", []), width)
+            last_row = pad_rows(value_ranges[2*i + 1].get("values", [[]]), width)
+
+            if len(top_rows) != nr_new_rows[sheet_name] + 1 or top_rows[-1] != state["newest_row"] or last_row[-1:] != [state["oldest_row"]]:
+                continue
+            delta_rows[sheet_name] = top_rows[:-1]
+
+        return delta_rows
+
+    # Sync worksheets of spreadsheet ~> {sheet name: DataFrame}
+    def sync(self, spreadsheet, filename, sheet_names, full_refresh=False):
+
+        connection = self.connect(filename)
+        try:
+            states = {}
+            if not full_refresh:
+                for sheet_name in sheet_names:
+                    state = self.load_state(connection, sheet_name)
+                    if state is not None:
+                        states[sheet_name] = state
+
+            delta_rows = self.get_delta_rows(spreadsheet, states) if states else {}
+
+            # Append new rows to mirror
+            headers = {}
+            for sheet_name, rows in delta_rows.items():
+                if rows is None:
+                    continue
+                state = states[sheet_name]
+                self.insert_rows(connection, sheet_name, rows, state["nr_rows"])
+                if rows:
+                    self.save_state(connection, sheet_name, state["header"], state["nr_rows"] + len(rows), rows[0], state["oldest_row"])
+                headers[sheet_name] = state["header"]
+                logger.info("Mirror {} ~> {} new rows".format(sheet_name, len(rows)))
+
+            # Full refresh of all other worksheets (one request)
+            refresh_sheet_names = [sheet_name for sheet_name in sheet_names if sheet_name not in headers]
+            if refresh_sheet_names:
+                value_ranges = spreadsheet.values_batch_get([absolute_range_name(sheet_name) for sheet_name in refresh_sheet_names]).get("valueRanges", [])
+                for sheet_name, value_range in zip(refresh_sheet_names, value_ranges):
+                    headers[sheet_name] = self.write_table(connection, sheet_name, fill_gaps(value_range.get("values", [[]])))
+                    logger.info("Mirror {} ~> Full refresh".format(sheet_name))
+
+            connection.commit()
+            return {sheet_name: self.read_table(connection, sheet_name, headers[sheet_name]) for sheet_name in sheet_names}
+        finally:
+            connection.close()
@@ -0,0 +1,328 @@
+import pandas as pd
+import numpy as np
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from gspread.utils import a1_to_rowcol
+
+from daily_jobs import help_functions as hf
+from daily_jobs.sheets_mirror import quote_identifier, pad_rows
+
+# Logging
+from daily_jobs.log_config import setup_logger
+logger = setup_logger(name=__name__)
+
+# -----------------------------------------------------
+# Storage backends of the logs (Daily, Activity & HASR-TL sheets)
+# -----------------------------------------------------
+# Both backends have the same interface, so the jobs do not know where the logs are:
+# - read_logs(filename, sheet_names) ~> {sheet name: (DataFrame, log)}, one read for all,
+# - read_log(filename, sheet_name) ~> (DataFrame, log),
+# - read_tails(filename, {sheet name: nr_rows}) ~> {sheet name: (DataFrame, log)} of the header & newest
+#   nr_rows rows (see help_functions.read_log_tails for reads back to a date horizon),
+# - read_tail(filename, sheet_name, nr_rows) ~> (DataFrame, log) of one log,
+# - get_writer(log, key_columns, ...) ~> BufferedSheetWriter: append rows (skip existing keys) and
+#   upsert by key (with row_index=SheetRowIndex, rows of known ids are updated in place).
+# Logs are newest first (new rows at row 2) and values are text, like in Google Sheets.
+#
+# "google_sheets": the Google Sheets logs (shared session, optional local mirror).
+# "local": one SQLite file per log file in LOCAL_STORAGE_DIRECTORY, one table per sheet, no network.
+# The backend is chosen per user ("storage" in USER_CONFIGURATIONS of daily_jobs/config.py).
+# Copy a user's Google Sheets logs to the local backend with:
+#   python -m daily_jobs.storage --user urh
+
+STORAGE_BACKENDS = ["google_sheets", "local"]
+LOCAL_STORAGE_HEADERS_TABLE = "local_storage_headers"
+
+# Cell value as text (as shown by Google Sheets for values written as is)
+def to_sheet_text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return ""
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+    if isinstance(value, np.integer):
+        return str(int(value))
+    return str(value)
+
+# -------------------------------
+# Google Sheets
+# -------------------------------
+
+class GoogleSheetsStorage:
+    name = "google_sheets"
+
+    def __init__(self, session=None):
+        self.session = hf.get_google_sheets_session(session)
+
+    def read_logs(self, filename, sheet_names):
+        return self.session.import_sheets(filename, sheet_names)
+
+    def read_log(self, filename, sheet_name):
+        return self.session.import_sheet(filename, sheet_name)
+
+    def read_tails(self, filename, nr_rows_by_sheet):
+        return self.session.import_sheets_tail(filename, nr_rows_by_sheet)
+
+    def read_tail(self, filename, sheet_name, nr_rows):
+        return self.read_tails(filename, {sheet_name: nr_rows})[sheet_name]
+
+    # Rows updated in place ~> Mirror of the worksheet is dropped (the fingerprint only sees new rows & edge rows)
+    def get_writer(self, log, key_columns, **writer_kwargs):
+        return hf.BufferedSheetWriter(sheet=log, key_columns=key_columns, on_rows_updated=self.session.invalidate_mirror, **writer_kwargs)
+
+# -------------------------------
+# Local SQLite
+# -------------------------------
+
+# Sheet of a local log ~ The part of the gspread Worksheet API used by BufferedSheetWriter
+class LocalSheet:
+    # Rows are stored with their position counted from the bottom (oldest row = 0), like the
+    # Sheets mirror: rows inserted at row 2 get new positions, nothing else moves.
+    # Row numbers are sheet row numbers (header = 1, newest row = 2). Every call is one transaction.
+
+    def __init__(self, storage, filename, sheet_name):
+        self.storage = storage
+        self.filename = filename
+        self.title = sheet_name
+
+    @property
+    def col_count(self):
+        with self.storage.transaction(self.filename) as connection:
+            return len(self.storage.get_columns(connection, self.title))
+
+    def row_values(self, row):
+        with self.storage.transaction(self.filename) as connection:
+            if row == 1:
+                return list(self.storage.load_header(connection, self.title))
+            nr_rows = self.storage.get_nr_rows(connection, self.title)
+            values = self.storage.read_rows(connection, self.title, nr_rows - (row - 1), nr_rows - (row - 1))
+        values = values[0] if values else []
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def insert_row(self, values, index=1):
+        if index == 1:
+            self.update(values=[values], range_name="A1")
+        else:
+            self.insert_rows([values], row=index)
+
+    # New rows at the top of the data (rows are newest first)
+    def insert_rows(self, values, row=2):
+        if row != 2:
+            raise ValueError("Local logs only insert rows at row 2 (newest first), got row {}".format(row))
+        if not values:
+            return
+
+        rows = [[to_sheet_text(value) for value in row_values] for row_values in values]
+        with self.storage.transaction(self.filename) as connection:
+            width = self.storage.ensure_columns(connection, self.title, max(len(row_values) for row_values in rows))
+            nr_rows = self.storage.get_nr_rows(connection, self.title)
+            placeholders = ", ".join(["?"] * (width + 1))
+            connection.executemany(
+                "INSERT INTO {} VALUES ({})".format(quote_identifier(self.title), placeholders),
+                [[nr_rows + len(rows) - 1 - i] + row_values for i, row_values in enumerate(pad_rows(rows, width))]
+                )
+
+    def add_cols(self, cols):
+        with self.storage.transaction(self.filename) as connection:
+            self.storage.ensure_columns(connection, self.title, len(self.storage.get_columns(connection, self.title)) + cols)
+
+    # Overwrite cells from the top left cell of range_name (header cells in row 1)
+    def update(self, values, range_name):
+        start_row, start_col = a1_to_rowcol(range_name.split(":")[0])
+        with self.storage.transaction(self.filename) as connection:
+            nr_rows = self.storage.get_nr_rows(connection, self.title)
+            for row_number, row_values in enumerate(values, start_row):
+                row_values = [to_sheet_text(value) for value in row_values]
+                self.storage.ensure_columns(connection, self.title, start_col - 1 + len(row_values))
+
+                if row_number == 1:
+                    header = self.storage.load_header(connection, self.title)
+                    header = header + [""] * max(start_col - 1 - len(header), 0)
+                    header[start_col - 1:start_col - 1 + len(row_values)] = row_values
+                    self.storage.save_header(connection, self.title, header)
+                    continue
+
+                position = nr_rows - (row_number - 1)
+                if position < 0:
+                    raise ValueError("Row {} is not in local log {}".format(row_number, self.title))
+                assignments = ", ".join("c{} = ?".format(start_col - 1 + i) for i in range(len(row_values)))
+                connection.execute(
+                    "UPDATE {} SET {} WHERE position = ?".format(quote_identifier(self.title), assignments),
+                    row_values + [position]
+                    )
+
+    def batch_update(self, data):
+        for value_range in data:
+            self.update(values=value_range["values"], range_name=value_range["range"])
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.lock = threading.RLock()
+
+    # Log file path
+    def get_path(self, filename):
+        file_key = re.sub(r"[^A-Za-z0-9]+", "_", str(filename)).strip("_")
+        return self.directory / "{}.sqlite".format(file_key)
+
+    def connect(self, filename):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.get_path(filename))
+        connection.execute("CREATE TABLE IF NOT EXISTS {} (sheet_name TEXT PRIMARY KEY, header TEXT)".format(LOCAL_STORAGE_HEADERS_TABLE))
+        return connection
+
+    # One transaction (committed on success, rolled back on errors), one writer at a time
+    @contextmanager
+    def transaction(self, filename):
+        with self.lock:
+            connection = self.connect(filename)
+            try:
+                with connection:
+                    yield connection
+            finally:
+                connection.close()
+
+    # -------------------------------
+    # Tables
+    # -------------------------------
+
+    def load_header(self, connection, sheet_name):
+        header_row = connection.execute(
+            "SELECT header FROM {} WHERE sheet_name = ?".format(LOCAL_STORAGE_HEADERS_TABLE), (sheet_name,)
+            ).fetchone()
+        return [] if header_row is None else json.loads(header_row[0])
+
+    def save_header(self, connection, sheet_name, header):
+        connection.execute("INSERT OR REPLACE INTO {} VALUES (?, ?)".format(LOCAL_STORAGE_HEADERS_TABLE), (sheet_name, json.dumps(header)))
+
+    # Value columns c0..cN of sheet table (table created if missing)
+    def get_columns(self, connection, sheet_name):
+        connection.execute("CREATE TABLE IF NOT EXISTS {} (position INTEGER PRIMARY KEY)".format(quote_identifier(sheet_name)))
+        columns = [column[1] for column in connection.execute("PRAGMA table_info({})".format(quote_identifier(sheet_name)))]
+        return [column for column in columns if column != "position"]
+
+    # At least width value columns ~> number of value columns
+    def ensure_columns(self, connection, sheet_name, width):
+        nr_columns = len(self.get_columns(connection, sheet_name))
+        for i in range(nr_columns, width):
+            connection.execute("ALTER TABLE {} ADD COLUMN c{} TEXT DEFAULT ''".format(quote_identifier(sheet_name), i))
+        return max(nr_columns, width)
+
+    def get_nr_rows(self, connection, sheet_name):
+        self.get_columns(connection, sheet_name)
+        return connection.execute("SELECT COUNT(*) FROM {}".format(quote_identifier(sheet_name))).fetchone()[0]
+
+    # Rows with positions first_position..last_position (newest first)
+    def read_rows(self, connection, sheet_name, first_position=0, last_position=None, limit=None):
+        value_columns = ", ".join(self.get_columns(connection, sheet_name))
+        if not value_columns:
+            return []
+        query = "SELECT {} FROM {} WHERE position >= ?".format(value_columns, quote_identifier(sheet_name))
+        parameters = [first_position]
+        if last_position is not None:
+            query += " AND position <= ?"
+            parameters.append(last_position)
+        query += " ORDER BY position DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [list(row) for row in connection.execute(query, parameters).fetchall()]
+
+    # Log as DataFrame (header width, like get_all_values of a sheet)
+    def read_table(self, connection, sheet_name, limit=None):
+        header = self.load_header(connection, sheet_name)
+        rows = pad_rows(self.read_rows(connection, sheet_name, limit=limit), len(header))
+        return pd.DataFrame(rows, columns=header)
+
+    # -------------------------------
+    # Storage interface
+    # -------------------------------
+
+    def read_logs(self, filename, sheet_names):
+        with self.transaction(filename) as connection:
+            return {sheet_name: (self.read_table(connection, sheet_name), LocalSheet(self, filename, sheet_name)) for sheet_name in sheet_names}
+
+    def read_log(self, filename, sheet_name):
+        return self.read_logs(filename, [sheet_name])[sheet_name]
+
+    def read_tails(self, filename, nr_rows_by_sheet):
+        with self.transaction(filename) as connection:
+            return {
+                sheet_name: (self.read_table(connection, sheet_name, limit=nr_rows), LocalSheet(self, filename, sheet_name))
+                for sheet_name, nr_rows in nr_rows_by_sheet.items()
+            }
+
+    def read_tail(self, filename, sheet_name, nr_rows):
+        return self.read_tails(filename, {sheet_name: nr_rows})[sheet_name]
+
+    def get_writer(self, log, key_columns, **writer_kwargs):
+        return hf.BufferedSheetWriter(sheet=log, key_columns=key_columns, **writer_kwargs)
+
+    # Replace local log with DataFrame (sheet order, newest first)
+    def write_log(self, filename, sheet_name, data):
+        with self.transaction(filename) as connection:
+            connection.execute("DROP TABLE IF EXISTS {}".format(quote_identifier(sheet_name)))
+            self.save_header(connection, sheet_name, [str(column) for column in data.columns])
+        LocalSheet(self, filename, sheet_name).insert_rows(data.to_numpy(dtype=object).tolist(), row=2)
+
+# -------------------------------
+# Storage of user
+# -------------------------------
+
+# Process wide storages ~ One per backend
+storages = {}
+storages_lock = threading.Lock()
+
+def get_storage(backend=None):
+    backend = "google_sheets" if backend is None else backend
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError("Unknown storage backend {} (one of {})".format(backend, STORAGE_BACKENDS))
+
+    with storages_lock:
+        if backend not in storages:
+            if backend == "local":
+                from daily_jobs import config
+                storages[backend] = LocalStorage(config.LOCAL_STORAGE_DIRECTORY)
+            else:
+                storages[backend] = GoogleSheetsStorage()
+        return storages[backend]
+
+def get_user_storage(user_config):
+    return get_storage(user_config.get("storage"))
+
+# -------------------------------
+# Copy Google Sheets logs of user to local storage
+# -------------------------------
+if __name__ == "__main__":
+    import argparse
+    from daily_jobs import config
+    from hasr_tl_job import config as hasr_tl_config
+
+    parser = argparse.ArgumentParser(description="Copy the Google Sheets logs of a user to the local storage backend")
+    parser.add_argument("--user", required=True, choices=sorted(config.USER_CONFIGURATIONS.keys()))
+    arguments = parser.parse_args()
+
+    user_config = config.USER_CONFIGURATIONS[arguments.user]
+    google_sheets_storage, local_storage = get_storage("google_sheets"), get_storage("local")
+
+    log_sheet_names = {
+        user_config["gdrive_daily_log_filename"]: [config.BASIC_DAILY_STATISTICS_SHEET_NAME],
+        user_config["gdrive_activity_log_filename"]: [config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME] + [
+            hasr_tl_config.get_hasr_tl_sheet_name(agg_variable) for agg_variable in hasr_tl_config.AGG_VARIABLES
+            ],
+    }
+    for filename, sheet_names in log_sheet_names.items():
+        for sheet_name, (data, _) in google_sheets_storage.read_logs(filename, sheet_names).items():
+            local_storage.write_log(filename, sheet_name, data)
+            logger.info("{} ~> {} rows copied to {}".format(sheet_name, len(data), local_storage.get_path(filename)))
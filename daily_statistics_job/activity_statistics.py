@@ -1,23 +1,191 @@
 import pandas as pd
 import numpy as np
-
-# Set up repo root path
-import os
-import sys
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-if repo_root not in sys.path:
-    sys.path.insert(0, repo_root)
+import datetime
 
 # Import help functions
 from daily_jobs import help_functions as hf
+from daily_statistics_job import config as sub_config
+from daily_statistics_job.fetch_plan import get_fetch_plan
+from daily_statistics_job.garmin_fetch import GarminFetcher
+
+# -----------------------------------------------------
+# Download single day activity statistics
+# -----------------------------------------------------
+# Activities of the day first (or from fetch_activities_by_date), then the endpoints of all activities
+# concurrently (GarminFetcher)
+ACTIVITY_STATISTICS_ENDPOINTS = {
+    "hrZones_stats": "get_activity_hr_in_timezones",
+    "splits_stats": "get_activity_splits",
+    "activityMetrics_stats": "get_activity_details",
+}
+
+# Endpoints column groups can declare ("activity_stats" = activity list, always needed for the rows)
+ACTIVITY_PLAN_ENDPOINTS = {"activity_stats": "get_activities_by_date", **ACTIVITY_STATISTICS_ENDPOINTS}
+
+# Endpoints, streams & columns of the configured column groups
+def get_activity_fetch_plan():
+    return get_fetch_plan(
+        column_groups = sub_config.ACTIVITY_LOG_COLUMN_GROUPS,
+        disabled_groups = sub_config.ACTIVITY_LOG_DISABLED_COLUMN_GROUPS,
+        expected_headers = sub_config.ACTIVITY_LOG_EXPECTED_HEADERS,
+        key_columns = sub_config.ACTIVITY_LOG_KEY_COLUMNS,
+        endpoints = ACTIVITY_PLAN_ENDPOINTS
+        )
+
+# Activities of all dates with one range call (garminconnect pages through the list) ~> {date: activities},
+# grouped by local start date in list order (newest first, as the single day call), [] for rest days
+def fetch_activities_by_date(garminFetcher, dates):
+    activitiesByDate = {selectedDate: [] for selectedDate in dates}
+    if not activitiesByDate:
+        return activitiesByDate
+
+    activity_stats = garminFetcher.call("get_activities_by_date", min(dates).isoformat(), max(dates).isoformat())
+    for activity in activity_stats or []:
+        activityDate = datetime.date.fromisoformat(activity["startTimeLocal"][:10])
+        if activityDate in activitiesByDate:
+            activitiesByDate[activityDate].append(activity)
+
+    return activitiesByDate
+
+# Only the activity endpoints of the plan are downloaded, the others are missing from the result
+def fetch_single_day_activity_statistics(garminFetcher, selectedDate, activity_stats=None, fetchPlan=None):
+    fetchPlan = get_activity_fetch_plan() if fetchPlan is None else fetchPlan
+    if activity_stats is None:
+        activity_stats = garminFetcher.call("get_activities_by_date", selectedDate.isoformat(), selectedDate.isoformat())
+
+    endpoint_names = [name for name in ACTIVITY_STATISTICS_ENDPOINTS if name in fetchPlan["endpoints"]]
+    activity_endpoints = garminFetcher.fetch({
+        (i, name): (ACTIVITY_STATISTICS_ENDPOINTS[name], activity_stats[i]["activityId"])
+        for i in range(len(activity_stats or [])) for name in endpoint_names
+        })
+
+    return {
+        "activity_stats": activity_stats,
+        "activity_endpoints": [
+            {name: activity_endpoints[(i, name)] for name in endpoint_names}
+            for i in range(len(activity_stats or []))
+            ],
+        }
+
+# -----------------------------------------------------
+# Decode second by second metrics (activityDetailMetrics)
+# -----------------------------------------------------
+# Every sample is {"metrics": [value per descriptor]}, metricDescriptors give the position of each key.
+# All samples are decoded at once into a 2-D array (missing or None ~> NaN), positions are looked up once,
+# unit conversions are column-wise. Running & cycling share the decoder, only their streams differ.
+
+# Speed [m/s] ~> pace [min/km] (0 if not moving)
+def speed_to_pace(speed_ms):
+    with np.errstate(divide="ignore"):
+        return np.where(speed_ms > 0, (1000 / speed_ms) / 60, np.where(np.isnan(speed_ms), np.nan, 0.0))
+
+# Parent type ~> {column: (descriptor key, conversion)}
+ACTIVITY_METRIC_STREAMS = {
+    1: { # Running
+        "speed_value": ("directSpeed", speed_to_pace), # min/km
+        "verticalSpeed_value": ("directVerticalSpeed", lambda speed_ms: speed_ms * 3600), # m/h
+        "gradeAdjustedSpeed_value": ("directGradeAdjustedSpeed", speed_to_pace), # min/km
+        "heartrate_value": ("directHeartRate", None), # bpm
+    },
+    2: { # Cycling
+        "power_value": ("directPower", None), # watts
+        "speed_value": ("directSpeed", lambda speed_ms: speed_ms * 3.6), # km/h
+        "heartrate_value": ("directHeartRate", None), # bpm
+    },
+}
+
+# Parent type ~> columns aggregated to minute means & deciles
+ACTIVITY_METRIC_AGG_COLUMNS = {
+    1: ["heartrate_value", "speed_value", "gradeAdjustedSpeed_value", "verticalSpeed_value"],
+    2: ["heartrate_value", "speed_value", "power_value"],
+}
+
+# Samples ~> 2-D float array (one column per key)
+def get_metric_streams(activityMetrics, keys):
+    metricValues = activityMetrics.get("activityDetailMetrics") or []
+    metricDescriptors = activityMetrics.get("metricDescriptors") or []
+
+    descriptorIndices = {}
+    for descriptor in metricDescriptors:
+        descriptorIndices.setdefault(descriptor["key"], descriptor["metricsIndex"])
+
+    rows = [entry.get("metrics") or [] for entry in metricValues]
+    width = max(map(len, rows), default=0)
+    if any(len(row) != width for row in rows):
+        rows = [row + [None] * (width - len(row)) for row in rows]
+    values = np.array(rows, dtype=float).reshape(len(rows), width)
+
+    streams = np.full((len(rows), len(keys)), np.nan)
+    for j, key in enumerate(keys):
+        index = descriptorIndices.get(key)
+        if index is not None and 0 <= index < width:
+            streams[:, j] = values[:, index]
+    return streams
+
+# Seconds since the previous sample with a time (NaN if the sample has none)
+def get_elapsed_times(sumMovingDuration):
+    times = np.concatenate([[0.0], sumMovingDuration])
+    lastValid = np.maximum.accumulate(np.where(np.isnan(times), 0, np.arange(len(times))))
+    return sumMovingDuration - times[lastValid][:-1]
+
+# Samples ~> DataFrame of elapsed time [s] & the parent type's streams (converted, only columns if given)
+def decode_activity_metrics(activityMetrics, activity_parenttypeId, columns=None):
+    streams = {column: stream for column, stream in ACTIVITY_METRIC_STREAMS[activity_parenttypeId].items() if columns is None or column in columns}
+    keys = ["sumMovingDuration"] + [key for key, _ in streams.values()]
+    values = get_metric_streams(activityMetrics or {}, keys)
+
+    activity_metrics = {"elapsed_time": get_elapsed_times(values[:, 0])}
+    for j, (column, (_, conversion)) in enumerate(streams.items(), start=1):
+        activity_metrics[column] = values[:, j] if conversion is None else conversion(values[:, j])
+    return pd.DataFrame(activity_metrics)
+
+# -----------------------------------------------------
+# Minute means (duration weighted)
+# -----------------------------------------------------
+# Every sample lasts its elapsed time in whole seconds (truncated, samples without a time or going back
+# last 0 s) and the seconds are counted from 1, second k is in minute k // 60 (minute 0 has 59 seconds).
+# Instead of one row per second, the timeline is cut at sample ends & minute ends: every piece lies in one
+# sample & one minute, so minute means are length weighted sums per minute (np.bincount), NaN values skipped.
+# Memory grows with samples + minutes, not with seconds.
+
+# Elapsed times [s] (n) & values (n x columns) ~> minute means (minutes x columns, NaN if no value)
+def get_minute_means(elapsed_times, values):
+    durations = np.trunc(np.nan_to_num(elapsed_times, nan=0.0)).clip(min=0).astype(np.int64)
+    sampleEnds = np.cumsum(durations)
+    total_seconds = int(sampleEnds[-1]) if len(sampleEnds) > 0 else 0
+    nr_minutes = (total_seconds // 60) + 1 if total_seconds > 0 else 0
+
+    minuteEnds = np.arange(59, total_seconds, 60)
+    cuts = np.unique(np.concatenate([[0], sampleEnds, minuteEnds]))
+    pieceEnds = cuts[1:]
+    pieceLengths = np.diff(cuts).astype(float)
+    pieceSamples = np.searchsorted(sampleEnds, pieceEnds, side="left")
+    pieceMinutes = pieceEnds // 60
+
+    minuteMeans = np.full((nr_minutes, values.shape[1]), np.nan)
+    for j in range(values.shape[1]):
+        pieceValues = values[pieceSamples, j]
+        hasValue = ~np.isnan(pieceValues)
+        sums = np.bincount(pieceMinutes, weights=np.where(hasValue, pieceValues * pieceLengths, 0.0), minlength=nr_minutes)
+        seconds = np.bincount(pieceMinutes, weights=np.where(hasValue, pieceLengths, 0.0), minlength=nr_minutes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            minuteMeans[:, j] = np.where(seconds > 0, sums / seconds, np.nan)
+    return minuteMeans
 
 # -----------------------------------------------------
 # GO: Get & Prepare single day activity statistics
 # -----------------------------------------------------
-def get_prepare_single_day_activity_statistics(garminClient, selectedDate):
+def get_prepare_single_day_activity_statistics(garminClient, selectedDate, fetchPlan=None):
+    fetchPlan = get_activity_fetch_plan() if fetchPlan is None else fetchPlan
+    with GarminFetcher(garminClient) as garminFetcher:
+        singleDay_activityData = fetch_single_day_activity_statistics(garminFetcher, selectedDate, fetchPlan=fetchPlan)
+    return prepare_single_day_activity_statistics(selectedDate, singleDay_activityData, fetchPlan)
 
-    # Download data
-    activity_stats = garminClient.get_activities_by_date(selectedDate.isoformat(), selectedDate.isoformat())
+def prepare_single_day_activity_statistics(selectedDate, singleDay_activityData, fetchPlan=None):
+    fetchPlan = get_activity_fetch_plan() if fetchPlan is None else fetchPlan
+
+    # Downloaded data
+    activity_stats = singleDay_activityData["activity_stats"]
     nr_activities = len(activity_stats)
     activityScores = {}
 
@@ -70,6 +238,8 @@ def get_prepare_single_day_activity_statistics(garminClient, selectedDate):
             "10% heart rate [9]": np.nan,
             "10% heart rate [10]": np.nan,
 
+            "Activity ID": np.nan,
+
             }
         
         singleActivity_activityScores = hf.replace_nan_with_empty_string(singleActivity_activityScores)
@@ -109,7 +279,7 @@ def get_prepare_single_day_activity_statistics(garminClient, selectedDate):
             activity_vO2MaxValue = activity_stats[i].get("vO2MaxValue", np.nan) 
 
             # HR Zones
-            activity_stats_hrZones = garminClient.get_activity_hr_in_timezones(activity_stats[i]["activityId"]) 
+            activity_stats_hrZones = singleDay_activityData["activity_endpoints"][i].get("hrZones_stats", [])
             if activity_stats_hrZones != []:
                 activity_zones_df = pd.DataFrame()
                 for singleZone in activity_stats_hrZones:
@@ -128,151 +298,21 @@ def get_prepare_single_day_activity_statistics(garminClient, selectedDate):
                     "highBoundary": [np.nan,np.nan,np.nan,np.nan,np.nan],
                 })
 
-            # Splits
-            activity_stats_splits = garminClient.get_activity_splits(activity_stats[i]["activityId"])
-            if activity_stats_splits != []:
-                activity_stats_splits_df = pd.DataFrame() 
-                for singleSplit in activity_stats_splits["lapDTOs"]:
-                    singleSplit_df = pd.DataFrame({
-                        "type": [singleSplit.get("intensityType", np.nan)],
-                        "distance": [singleSplit.get("distance", np.nan)], 
-                        "duration": [singleSplit.get("movingDuration", np.nan)], 
-                        "elevationGain": [singleSplit.get("elevationGain", np.nan)], 
-                        "elevationLoss": [singleSplit.get("elevationLoss", np.nan)], 
-                        "averageHR": [singleSplit.get("averageHR", np.nan)], 
-                        "maxHR": [singleSplit.get("maxHR", np.nan)], 
-                        "avgSpeed": [singleSplit.get("averageMovingSpeed", np.nan)], 
-                        "avgGradeAdjustedSpeed": [singleSplit.get("avgGradeAdjustedSpeed", np.nan)], 
-                        "averageRunCadence": [singleSplit.get("averageRunCadence", np.nan)], 
-                        "normalizedPower": [singleSplit.get("normalizedPower", np.nan)], 
-                        "totalWork": [singleSplit.get("totalWork", np.nan)]
-                        })
-                    activity_stats_splits_df = pd.concat([activity_stats_splits_df, singleSplit_df], ignore_index=True)
-            else:
-                activity_stats_splits_df = pd.DataFrame()
-
             # Second by second ~ Aggregation
-            activity_stats_activityMetrics = garminClient.get_activity_details(activity_stats[i]["activityId"])
-            metricValues = activity_stats_activityMetrics["activityDetailMetrics"]
-            metricDescriptors = activity_stats_activityMetrics["metricDescriptors"]
-
-            if activity_parenttypeId == 1: # Running
-
-                sumMovingDuration_index = next((d["metricsIndex"] for d in metricDescriptors if d["key"] == "sumMovingDuration"), np.nan) # factor = 1000.0 [ms] ~> x / 1000 -> s
-                directSpeed_index = next((d["metricsIndex"] for d in metricDescriptors if d["key"] == "directSpeed"), np.nan) # factor = 0.1 [dm/s] ~> x / 0.1 -> m/s
-                directVerticalSpeed_index = next((d["metricsIndex"] for d in metricDescriptors if d["key"] == "directVerticalSpeed"), np.nan)  # factor = 0.1 [dm/s] ~> x / 0.1 -> m/s
-                directGradeAdjustedSpeed_index = next((d["metricsIndex"] for d in metricDescriptors if d["key"] == "directGradeAdjustedSpeed"), np.nan) # factor = 0.1 [dm/s] ~> x / 0.1 -> m/s
-                directHeartRate_index = next((d["metricsIndex"] for d in metricDescriptors if d["key"] == "directHeartRate"), np.nan) # factor = 1.0 [bpm]  ~> x / 1 -> bpm
-
-                elapsed_times = [] # seconds
-                speed_values = [] # min/km
-                verticalSpeed_values = [] # m/h
-                gradeAdjustedSpeed_values = [] # min/km
-                heartrate_values = [] # bpm
-
-                previous_time_s = 0
-                for entry in metricValues:
-
-                    try:
-                        current_time_s = entry["metrics"][sumMovingDuration_index]
-                        elapsed_time_s = (current_time_s - previous_time_s) 
-                        elapsed_times += [elapsed_time_s]
-                        previous_time_s = current_time_s
-                    except:
-                        elapsed_times += [np.nan]
-
-                    try:
-                        speed_ms = entry["metrics"][directSpeed_index]
-                        speed_minkm = (1000 / speed_ms) / 60 if speed_ms > 0 else 0
-                        speed_values += [speed_minkm] 
-                    except:
-                        speed_values += [np.nan]
-
-                    try:
-                        verticalSpeed_ms = entry["metrics"][directVerticalSpeed_index]
-                        speed_mh = verticalSpeed_ms * 3600
-                        verticalSpeed_values += [speed_mh] 
-                    except:
-                        verticalSpeed_values += [np.nan]
-
-                    try:
-                        gradespeed_ms = entry["metrics"][directGradeAdjustedSpeed_index]
-                        gradespeed_minkm = (1000 / gradespeed_ms) / 60 if gradespeed_ms > 0 else 0
-                        gradeAdjustedSpeed_values += [gradespeed_minkm] 
-                    except:
-                        gradeAdjustedSpeed_values += [np.nan]
-
-                    try:
-                        heartrate_values += [entry["metrics"][directHeartRate_index]]
-                    except:
-                        heartrate_values += [np.nan]
-
-                activity_metrics = pd.DataFrame({
-                    "elapsed_time": elapsed_times,
-                    "speed_value": speed_values,
-                    "verticalSpeed_value": verticalSpeed_values,
-                    "gradeAdjustedSpeed_value": gradeAdjustedSpeed_values,
-                    "heartrate_value": heartrate_values,
-                    })
-                
-                activity_metrics_secondGap = activity_metrics.loc[activity_metrics.index.repeat(activity_metrics["elapsed_time"].astype(int))].reset_index(drop=True)
-                activity_metrics_secondGap["elapsed_time"] = 1
-                activity_metrics_secondGap["cumsum_time_min"] = ((activity_metrics_secondGap["elapsed_time"].cumsum() / 60) // 1).astype(int)
-                activity_metrics_agg = activity_metrics_secondGap.groupby("cumsum_time_min")[["heartrate_value", "speed_value", "gradeAdjustedSpeed_value", "verticalSpeed_value"]].mean().reset_index(drop=True).quantile([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
-
-            elif activity_parenttypeId == 2: # Cycling
-
-                sumMovingDuration_index = next((d["metricsIndex"] for d in (metricDescriptors or []) if d["key"] == "sumMovingDuration"), np.nan) # factor = 1000.0 [ms] ~> x / 1000 -> s
-                directSpeed_index = next((d["metricsIndex"] for d in (metricDescriptors or []) if d["key"] == "directSpeed"), np.nan) # factor = 0.1 [dm/s] ~> x / 0.1 -> m/s
-                directPower_index = next((d["metricsIndex"] for d in (metricDescriptors or []) if d["key"] == "directPower"), np.nan) # factor = 1.0 [w] ~> x / 1 -> w 
-                directHeartRate_index = next((d["metricsIndex"] for d in (metricDescriptors or []) if d["key"] == "directHeartRate"), np.nan) # factor = 1.0 [bpm]  ~> x / 1 -> bpm
-
-                elapsed_times = [] # seconds
-                power_values = [] # watts
-                speed_values = [] # min/km
-                heartrate_values = [] # bpm
-
-                previous_time_s = 0
-                for entry in (metricValues or []):
-
-                    try:
-                        current_time_s = entry["metrics"][sumMovingDuration_index]
-                        elapsed_time_s = (current_time_s - previous_time_s) 
-                        elapsed_times += [elapsed_time_s]
-                        previous_time_s = current_time_s
-                    except:
-                        elapsed_times += [np.nan]
-
-                    try:
-                        speed_ms = entry["metrics"][directSpeed_index] 
-                        speed_kmh = speed_ms * 3.6
-                        speed_values += [speed_kmh] 
-                    except:
-                        speed_values += [np.nan]
-
-                    try:
-                        power_values += [entry["metrics"][directPower_index]]
-                    except:
-                        power_values += [np.nan]
-
-                    try:
-                        heartrate_values += [entry["metrics"][directHeartRate_index]]
-                    except:
-                        heartrate_values += [np.nan]
-
-                activity_metrics = pd.DataFrame({
-                    "elapsed_time": elapsed_times,
-                    "power_value": power_values,
-                    "speed_value": speed_values,
-                    "heartrate_value": heartrate_values,
-                    })
-                
-                activity_metrics_secondGap = activity_metrics.loc[activity_metrics.index.repeat(activity_metrics["elapsed_time"].astype(int))].reset_index(drop=True)
-                activity_metrics_secondGap["elapsed_time"] = 1
-                activity_metrics_secondGap["cumsum_time_min"] = ((activity_metrics_secondGap["elapsed_time"].cumsum() / 60) // 1).astype(int)
-                activity_metrics_agg = activity_metrics_secondGap.groupby("cumsum_time_min")[["heartrate_value", "speed_value", "power_value"]].mean().reset_index(drop=True).quantile([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
-
-            else: # Other, not known
+            # Only the streams of the fetch plan (none if activity details aren't downloaded)
+            activity_stats_activityMetrics = singleDay_activityData["activity_endpoints"][i].get("activityMetrics_stats")
+            activity_metrics_aggColumns = [column for column in ACTIVITY_METRIC_AGG_COLUMNS.get(activity_parenttypeId, []) if column in fetchPlan["streams"]]
+            if "activityMetrics_stats" in singleDay_activityData["activity_endpoints"][i] and activity_metrics_aggColumns: # Running or cycling
+
+                activity_metrics = decode_activity_metrics(activity_stats_activityMetrics, activity_parenttypeId, activity_metrics_aggColumns)
+
+                activity_metrics_minutes = pd.DataFrame(
+                    get_minute_means(activity_metrics["elapsed_time"].to_numpy(), activity_metrics[activity_metrics_aggColumns].to_numpy()),
+                    columns = activity_metrics_aggColumns
+                    )
+                activity_metrics_agg = activity_metrics_minutes.quantile([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
+
+            else: # Other, not known (or not needed)
                 activity_metrics_agg = pd.DataFrame({
                     "heartrate_value": np.repeat(np.nan, 10),
                     "speed_value": np.repeat(np.nan, 10),
@@ -327,8 +367,14 @@ def get_prepare_single_day_activity_statistics(garminClient, selectedDate):
                 "10% heart rate [9]": float(round(activity_metrics_agg.iloc[8]["heartrate_value"],0)) if len(activity_metrics_agg) > 0 and not np.isnan(activity_metrics_agg.iloc[8]["heartrate_value"]) else float(np.nan),
                 "10% heart rate [10]": float(round(activity_metrics_agg.iloc[9]["heartrate_value"],0)) if len(activity_metrics_agg) > 0 and not np.isnan(activity_metrics_agg.iloc[8]["heartrate_value"]) else float(np.nan),
 
+                "Activity ID": activity_stats[i]["activityId"],
+
             }
 
+            # Disabled column groups ~> empty
+            for column in fetchPlan["disabled_columns"]:
+                singleActivity_activityScores[column] = np.nan
+
             # Multiple activies
             singleActivity_activityScores = hf.replace_nan_with_empty_string(singleActivity_activityScores)
             activityScores["activity_{}".format(i)] = singleActivity_activityScores
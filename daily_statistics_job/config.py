@@ -14,4 +14,52 @@ ACTIVITY_LOG_EXPECTED_HEADERS = [
     "Anaerobic training effect message", "Training effect label", "Training load", "Vo2Max value",
     "Time in Z1 [h]", "Time in Z2 [h]", "Time in Z3 [h]", "Time in Z4 [h]", "Time in Z5 [h]",
     "10% heart rate [1]", "10% heart rate [2]", "10% heart rate [3]", "10% heart rate [4]", "10% heart rate [5]", "10% heart rate [6]", "10% heart rate [7]", "10% heart rate [8]", "10% heart rate [9]", "10% heart rate [10]",
-]
\ No newline at end of file
+    "Activity ID",
+]
+
+# Garmin activity id (trailing column, empty for Rest rows & rows written before it existed)
+ACTIVITY_LOG_ID_COLUMN = "Activity ID"
+ACTIVITY_LOG_KEY_COLUMNS = ["Year", "Month", "Day", "Start time", "Description", "Activity type"]
+
+DAILY_LOG_KEY_COLUMNS = ["Year", "Month", "Day"]
+
+# -----------------------------------------------------
+# Fetch plan (daily_statistics_job/fetch_plan.py)
+# -----------------------------------------------------
+# Every column is in one group, a group declares what its columns need:
+# - endpoints: downloads (names of DAILY_STATISTICS_ENDPOINTS / ACTIVITY_STATISTICS_ENDPOINTS, "activity_stats" = activity list),
+# - streams: activityDetailMetrics streams aggregated to minute deciles (ACTIVITY_METRIC_STREAMS).
+# Groups in *_DISABLED_COLUMN_GROUPS are written empty and cost no Garmin calls or computation
+# (groups with key columns can't be disabled).
+DAILY_LOG_COLUMN_GROUPS = {
+    "date": {"columns": ["Year", "Month", "Day", "Weekday"]},
+    "sleep": {"columns": ["Resting HR", "Sleep score", "Sleep time [h]"], "endpoints": ["overall_stats", "trainingReadiness_stats"]},
+    "hrv": {"columns": ["HRV", "HRV baseline lower", "HRV baseline upper"], "endpoints": ["hrv_stats"]},
+    "active_time": {"columns": ["Meters ascended [m]", "Highly active time [h]", "Active time [h]", "Sedentary time [h]"], "endpoints": ["overall_stats"]},
+    "vo2max": {"columns": ["vo2Max"], "endpoints": ["trainingStatus_stats"]},
+    "hill_score": {"columns": ["Hill score"], "endpoints": ["hillScore_stats"]},
+    "endurance_score": {"columns": ["Endurance score"], "endpoints": ["enduranceScore_stats"]},
+    "training_load": {"columns": ["Low aerobic load", "High aerobic load", "Anaerobic load"], "endpoints": ["trainingStatus_stats"]},
+    }
+DAILY_LOG_DISABLED_COLUMN_GROUPS = []
+
+ACTIVITY_LOG_COLUMN_GROUPS = {
+    "summary": {
+        "columns": [
+            "Year", "Month", "Day", "Weekday", "Description", "Activity type", "Start time", "Location", "Distance [km]", "Duration [h]",
+            "Elevation gain [m]", "Average pace [min/km] or speed [km/h]", "Gradient adjusted pace [min/km]",
+            "Average heart rate", "Maximum heart rate", "Normalized power [w]", "Calories [kcal]",
+            "Aerobic training effect", "Aerobic training effect message", "Anerobic training effect",
+            "Anaerobic training effect message", "Training effect label", "Training load", "Vo2Max value",
+            "Activity ID",
+            ],
+        "endpoints": ["activity_stats"],
+        },
+    "hr_zones": {"columns": ["Time in Z1 [h]", "Time in Z2 [h]", "Time in Z3 [h]", "Time in Z4 [h]", "Time in Z5 [h]"], "endpoints": ["hrZones_stats"]},
+    "heart_rate_deciles": {
+        "columns": ["10% heart rate [{}]".format(k) for k in range(1, 11)],
+        "endpoints": ["activityMetrics_stats"],
+        "streams": ["heartrate_value"],
+        },
+    }
+ACTIVITY_LOG_DISABLED_COLUMN_GROUPS = []
@@ -1,26 +1,62 @@
 import pandas as pd
 import numpy as np
 
-# Set up repo root path
-import os
-import sys
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-if repo_root not in sys.path:
-    sys.path.insert(0, repo_root)
-
 # Import help functions
 from daily_jobs import help_functions as hf
+from daily_statistics_job import config as sub_config
+from daily_statistics_job.fetch_plan import get_fetch_plan
+from daily_statistics_job.garmin_fetch import GarminFetcher
+
+# -----------------------------------------------------
+# Download single day daily statistics
+# -----------------------------------------------------
+# Endpoints of a day are independent ~> fetched concurrently with a GarminFetcher (daily_statistics_job/garmin_fetch.py)
+DAILY_STATISTICS_ENDPOINTS = {
+    "overall_stats": "get_stats",
+    "trainingReadiness_stats": "get_training_readiness",
+    "trainingStatus_stats": "get_training_status",
+    "hrv_stats": "get_hrv_data",
+    "hillScore_stats": "get_hill_score",
+    "enduranceScore_stats": "get_endurance_score",
+}
+
+# Endpoints & columns of the configured column groups
+def get_daily_fetch_plan():
+    return get_fetch_plan(
+        column_groups = sub_config.DAILY_LOG_COLUMN_GROUPS,
+        disabled_groups = sub_config.DAILY_LOG_DISABLED_COLUMN_GROUPS,
+        expected_headers = sub_config.DAILY_LOG_EXPECTED_HEADERS,
+        key_columns = sub_config.DAILY_LOG_KEY_COLUMNS,
+        endpoints = DAILY_STATISTICS_ENDPOINTS
+        )
+
+# Only the endpoints of the plan are downloaded, the others are missing from the result
+def fetch_single_day_daily_statistics(garminFetcher, selectedDate, fetchPlan=None):
+    fetchPlan = get_daily_fetch_plan() if fetchPlan is None else fetchPlan
+    return garminFetcher.fetch({
+        name: (DAILY_STATISTICS_ENDPOINTS[name], selectedDate.isoformat()) for name in fetchPlan["endpoints"]
+        })
 
 # -----------------------------------------------------
 # GO: Get & Prepare single day daily statistics
 # -----------------------------------------------------
 
-def get_prepare_single_day_daily_statistics(garminClient, selectedDate):
+def get_prepare_single_day_daily_statistics(garminClient, selectedDate, fetchPlan=None):
+    fetchPlan = get_daily_fetch_plan() if fetchPlan is None else fetchPlan
+    with GarminFetcher(garminClient) as garminFetcher:
+        singleDay_dailyData = fetch_single_day_daily_statistics(garminFetcher, selectedDate, fetchPlan)
+    return prepare_single_day_daily_statistics(selectedDate, singleDay_dailyData, fetchPlan)
+
+def prepare_single_day_daily_statistics(selectedDate, singleDay_dailyData, fetchPlan=None):
+    fetchPlan = get_daily_fetch_plan() if fetchPlan is None else fetchPlan
 
-    # Download data
-    overall_stats = garminClient.get_stats(selectedDate.isoformat()) 
-    trainingReadiness_stats = garminClient.get_training_readiness(selectedDate.isoformat()) 
-    trainingStatus_stats = garminClient.get_training_status(selectedDate.isoformat()) 
+    # Downloaded data (None if not in the fetch plan)
+    overall_stats = singleDay_dailyData.get("overall_stats")
+    trainingReadiness_stats = singleDay_dailyData.get("trainingReadiness_stats")
+    trainingStatus_stats = singleDay_dailyData.get("trainingStatus_stats")
+    hrv_stats = singleDay_dailyData.get("hrv_stats")
+    hillScore_stats = singleDay_dailyData.get("hillScore_stats")
+    enduranceScore_stats = singleDay_dailyData.get("enduranceScore_stats")
 
     # Sleep scores
     restingHeartRate = overall_stats.get("restingHeartRate", np.nan) if overall_stats else np.nan
@@ -28,7 +64,6 @@ def get_prepare_single_day_daily_statistics(garminClient, selectedDate):
     sleepingSeconds = overall_stats.get("sleepingSeconds", np.nan) if overall_stats else np.nan
 
     # HRV data
-    hrv_stats = garminClient.get_hrv_data(selectedDate.isoformat())
     hrv_lastNightAvg = hrv_stats["hrvSummary"].get("lastNightAvg", np.nan) if hrv_stats else np.nan
     hrv_baselineInterval = [
         hrv_stats["hrvSummary"]["baseline"].get("balancedLow", np.nan),
@@ -43,8 +78,8 @@ def get_prepare_single_day_daily_statistics(garminClient, selectedDate):
 
     # VO2Max and similar
     latest_vo2Max = (((trainingStatus_stats or {}).get("mostRecentVO2Max") or {}).get("generic") or {}  ).get("vo2MaxPreciseValue", np.nan)
-    latest_hillScore = garminClient.get_hill_score(selectedDate.isoformat()) and garminClient.get_hill_score(selectedDate.isoformat()).get("overallScore", np.nan) or np.nan
-    lastest_enduranceScore = garminClient.get_endurance_score(selectedDate.isoformat()) and garminClient.get_endurance_score(selectedDate.isoformat()).get("overallScore", np.nan) or np.nan
+    latest_hillScore = hillScore_stats and hillScore_stats.get("overallScore", np.nan) or np.nan
+    lastest_enduranceScore = enduranceScore_stats and enduranceScore_stats.get("overallScore", np.nan) or np.nan
 
     # Monthly Training Load
     device_data = next(iter((trainingStatus_stats.get("mostRecentTrainingLoadBalance", {}) or {}).get("metricsTrainingLoadBalanceDTOMap", {}).values()), {}) if trainingStatus_stats else np.nan
@@ -67,7 +102,7 @@ def get_prepare_single_day_daily_statistics(garminClient, selectedDate):
         "HRV baseline lower": hrv_baselineInterval[0],
         "HRV baseline upper": hrv_baselineInterval[1],
 
-        "Meters ascended [m]": round(floorsAscendedInMeters),
+        "Meters ascended [m]": round(floorsAscendedInMeters) if not pd.isna(floorsAscendedInMeters) else np.nan,
         "Highly active time [h]": round(highlyActiveSeconds / 3600, 2), 
         "Active time [h]": round(activeSeconds / 3600, 2),
         "Sedentary time [h]": round(sedentarySeconds / 3600, 2),
@@ -81,6 +116,10 @@ def get_prepare_single_day_daily_statistics(garminClient, selectedDate):
 
         }
     
+    # Disabled column groups ~> empty
+    for column in fetchPlan["disabled_columns"]:
+        dailyScores[column] = np.nan
+
     # Return
     dailyScores = hf.replace_nan_with_empty_string(dailyScores)
     return dailyScores
@@ -0,0 +1,48 @@
+# -----------------------------------------------------
+# Fetch plan ~ Which Garmin endpoints & streams the configured columns need
+# -----------------------------------------------------
+# Column groups (daily_statistics_job/config.py) declare the endpoints & streams of their columns.
+# The plan of a log keeps what the enabled groups need, fetch_* only downloads plan["endpoints"],
+# prepare_* only computes plan["streams"] and writes plan["disabled_columns"] empty.
+
+# Column groups ~> plan (endpoints in the order of the endpoints dict)
+def get_fetch_plan(column_groups, disabled_groups, expected_headers, key_columns, endpoints):
+    unknown_groups = [group for group in disabled_groups if group not in column_groups]
+    if unknown_groups:
+        raise ValueError("Unknown column groups: {}".format(unknown_groups))
+
+    grouped_columns = [column for group in column_groups.values() for column in group["columns"]]
+    if sorted(grouped_columns) != sorted(expected_headers):
+        raise ValueError("Column groups don't cover every column once: missing {}, extra {}".format(
+            [column for column in expected_headers if column not in grouped_columns],
+            [column for column in grouped_columns if grouped_columns.count(column) > 1 or column not in expected_headers]
+            ))
+
+    unknown_endpoints = [endpoint for group in column_groups.values() for endpoint in group.get("endpoints", []) if endpoint not in endpoints]
+    if unknown_endpoints:
+        raise ValueError("Unknown endpoints: {}".format(unknown_endpoints))
+
+    enabled_groups = [group for group in column_groups if group not in disabled_groups]
+    disabled_columns = [column for group in disabled_groups for column in column_groups[group]["columns"]]
+    disabled_keys = [column for column in disabled_columns if column in key_columns]
+    if disabled_keys:
+        raise ValueError("Key columns can't be disabled: {}".format(disabled_keys))
+
+    needed_endpoints = {endpoint for group in enabled_groups for endpoint in column_groups[group].get("endpoints", [])}
+    needed_streams = {stream for group in enabled_groups for stream in column_groups[group].get("streams", [])}
+
+    return {
+        "groups": enabled_groups,
+        "disabled_columns": disabled_columns,
+        "endpoints": [name for name in endpoints if name in needed_endpoints],
+        "streams": sorted(needed_streams),
+        }
+
+# Plan ~> log line (Garmin endpoint methods, skipped endpoints, streams, disabled groups)
+def describe_fetch_plan(fetchPlan, endpoints):
+    return "calls {} | skipped {} | streams {} | groups {}".format(
+        [endpoints[name] for name in fetchPlan["endpoints"]],
+        [endpoints[name] for name in endpoints if name not in fetchPlan["endpoints"]],
+        fetchPlan["streams"],
+        fetchPlan["groups"],
+        )
@@ -0,0 +1,76 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from daily_jobs import config
+
+# -----------------------------------------------------
+# Concurrent Garmin Connect fetching
+# -----------------------------------------------------
+# Garmin calls are blocking network calls, so independent calls run in threads:
+# - fetch({name: (endpoint, *args)}) ~> all endpoint calls of a day (or of all activities of a day)
+#   at once, at most max_in_flight calls in flight (GARMIN_FETCH_MAX_IN_FLIGHT),
+# - fetch_days(fetch_day, dates) ~> several days at once (GARMIN_FETCH_MAX_DAYS_IN_FLIGHT), results
+#   in date order, so rows are still prepared and written day by day in the same order.
+# Days and endpoint calls have their own thread pools (a day waits for its calls without blocking
+# a call slot). The shared request scheduler still applies the Garmin rate limit & retries on top.
+# max_in_flight=1 and max_days_in_flight=1 is the old one call after another behaviour.
+
+class GarminFetcher:
+
+    def __init__(self, garminClient, max_in_flight=None, max_days_in_flight=None):
+        self.garminClient = garminClient
+        self.max_in_flight = config.GARMIN_FETCH_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.max_days_in_flight = config.GARMIN_FETCH_MAX_DAYS_IN_FLIGHT if max_days_in_flight is None else max_days_in_flight
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="garmin-call")
+        self.day_executor = ThreadPoolExecutor(max_workers=self.max_days_in_flight, thread_name_prefix="garmin-day")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    # Days not yet started are dropped (e.g. after an error)
+    def close(self):
+        self.day_executor.shutdown(wait=True, cancel_futures=True)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    # One endpoint call
+    def submit(self, endpoint, *args):
+        return self.executor.submit(getattr(self.garminClient, endpoint), *args)
+
+    def call(self, endpoint, *args):
+        return self.submit(endpoint, *args).result()
+
+    # Independent endpoint calls ~> {name: response} (first error is raised after all calls ended)
+    def fetch(self, calls):
+        futures = {name: self.submit(endpoint, *args) for name, (endpoint, *args) in calls.items()}
+        wait(futures.values())
+        return {name: future.result() for name, future in futures.items()}
+
+    # One day ~> future of fetch_day(self, date)
+    def submit_day(self, fetch_day, selectedDate):
+        return self.day_executor.submit(fetch_day, self, selectedDate)
+
+    # Days ~> (date, fetch_day(self, date)) in date order, next days are fetched while earlier ones are used
+    def fetch_days(self, fetch_day, dates):
+        dates = iter(list(dates))
+        pending_days = collections.deque()
+
+        def submit_next_day():
+            selectedDate = next(dates, None)
+            if selectedDate is not None:
+                pending_days.append((selectedDate, self.submit_day(fetch_day, selectedDate)))
+
+        for _ in range(self.max_days_in_flight):
+            submit_next_day()
+
+        def fetched_days():
+            while pending_days:
+                selectedDate, future = pending_days.popleft()
+                singleDay_data = future.result()
+                submit_next_day()
+                yield selectedDate, singleDay_data
+
+        return fetched_days()
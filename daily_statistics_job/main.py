@@ -2,26 +2,21 @@
 # Libraries
 # -----------------------------------------------------
 
-import pandas as pd
 import numpy as np
 import datetime
-import gspread
 import contextlib
-from io import StringIO
-
-# Set up repo root path
-import os
-import sys
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-if repo_root not in sys.path:
-    sys.path.insert(0, repo_root)
 
 # Import help functions
 from daily_jobs import config
 from daily_jobs import help_functions as hf
+from daily_jobs import schema
+from daily_jobs import storage as log_storage
 from daily_statistics_job import config as sub_config
-from daily_statistics_job.daily_statistics import get_prepare_single_day_daily_statistics
-from daily_statistics_job.activity_statistics import get_prepare_single_day_activity_statistics
+from daily_statistics_job.daily_statistics import DAILY_STATISTICS_ENDPOINTS, get_daily_fetch_plan, fetch_single_day_daily_statistics, prepare_single_day_daily_statistics
+from daily_statistics_job.activity_statistics import ACTIVITY_PLAN_ENDPOINTS, get_activity_fetch_plan, fetch_activities_by_date, fetch_single_day_activity_statistics, prepare_single_day_activity_statistics
+from daily_statistics_job.fetch_plan import describe_fetch_plan
+from daily_statistics_job.garmin_fetch import GarminFetcher
+from daily_statistics_job.pipeline import run_pipeline
 
 # Logging
 from daily_jobs.log_config import setup_logger
@@ -35,14 +30,15 @@ logging.getLogger("requests").setLevel(logging.WARNING)
 # -----------------------------------------------------
 # Main: Get and write basic Daily & Activity statistics for single user
 # -----------------------------------------------------
-def get_write_basic_daily_activity_statistics(garmin_email, garmin_password, activity_log_file_name, daily_log_file_name):
+def get_write_basic_daily_activity_statistics(garmin_email, garmin_password, activity_log_file_name, daily_log_file_name, storage_backend=None):
     logger.info("Running: Main ~ Basic Daily & Activity Statistics")
 
     # About
-    logger.info("About user ~> email: {} ~> activity file name: {} &  daily file name: {}".format(
+    logger.info("About user ~> email: {} ~> activity file name: {} &  daily file name: {} ~> storage: {}".format(
         garmin_email, 
         activity_log_file_name, 
         daily_log_file_name, 
+        storage_backend or "google_sheets",
         ))
 
     # ----------------------------------------------------- 
@@ -57,12 +53,12 @@ def get_write_basic_daily_activity_statistics(garmin_email, garmin_password, act
         logger.error(f"Error Authenticating Garmin Connect API: {e}")
         raise
 
-    # Google drive API
-    logger.info("Authenticating Google Drive API")
+    # Log storage ~ Google Sheets (Google drive API once per process, shared by all jobs) or local
+    logger.info("Opening log storage")
     try:
-        googleDrive_client = gspread.authorize(config.DRIVE_CREDENTIALS)
+        logStorage = log_storage.get_storage(storage_backend)
     except Exception as e:
-        logger.error(f"Error Authenticating Google Drive API: {e}")
+        logger.error(f"Error opening log storage: {e}")
         raise
 
 
@@ -70,14 +66,17 @@ def get_write_basic_daily_activity_statistics(garmin_email, garmin_password, act
     # Prepare drive file to write into
     # -----------------------------------------------------
 
+    # Only newest rows ~> Last date & duplicate checks only need rows from the first date a run can write (yesterday, with margin)
+    logTail_horizonDate = datetime.date.today() - datetime.timedelta(days=1 + config.LOG_TAIL_MARGIN_DAYS)
+
     # Daily Logs
     logger.info("Opening and preparing Daily Log file")
     try:
-        daily_log_df, daily_log_sheet = hf.import_google_sheet(
-            googleDrive_client = googleDrive_client, 
+        daily_log_df, daily_log_sheet = hf.read_log_tails(
+            storage = logStorage, 
             filename = daily_log_file_name, 
-            sheet_name = config.BASIC_DAILY_STATISTICS_SHEET_NAME
-            )
+            tail_horizons = {config.BASIC_DAILY_STATISTICS_SHEET_NAME: (logTail_horizonDate, config.LOG_TAIL_INITIAL_ROWS)}
+            )[config.BASIC_DAILY_STATISTICS_SHEET_NAME]
     except Exception as e:
         logger.error(f"Error opening Daily Log file: {e}")
         raise
@@ -85,33 +84,25 @@ def get_write_basic_daily_activity_statistics(garmin_email, garmin_password, act
     # Activity Logs
     logger.info("Opening and preparing Activity Log file")
     try:
-        activity_log_df, activity_log_sheet = hf.import_google_sheet(
-            googleDrive_client = googleDrive_client, 
+        activity_log_df, activity_log_sheet = hf.read_log_tails(
+            storage = logStorage, 
             filename = activity_log_file_name, 
-            sheet_name = config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME)
+            tail_horizons = {config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME: (logTail_horizonDate, config.LOG_TAIL_INITIAL_ROWS)}
+            )[config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME]
     except Exception as e:
         logger.error(f"Error opening Activity Log file: {e}")
         raise
 
     # ----------------------------------------------------- 
-    # Calculate and write daily statistics to Drive sheet
+    # Dates to download
     # -----------------------------------------------------
-    logger.info("Prepare and write daily statistics")
-
-    # Identify existing rows to avoid duplicates
-    dailyStats_keyColumns = ["Year", "Month", "Day"]
-    dailyStats_existingKeys = set(
-        hf.get_row_key(row, dailyStats_keyColumns)
-        for _, row in daily_log_df.iterrows()
-    )
-
-    # Dates ~ From last date on sheet (+1) to yesterday (today + 1)
-    dailyStats_sheetDates = pd.to_datetime(
-        daily_log_df["Year"].astype(str) + "-" +
-        daily_log_df["Month"].astype(str) + "-" +
-        daily_log_df["Day"].astype(str),
-        errors="coerce"
-        )
+
+    # Daily ~ Identify existing rows to avoid duplicates
+    dailyStats_keyColumns = sub_config.DAILY_LOG_KEY_COLUMNS
+    dailyStats_existingKeys = set(hf.get_row_keys(daily_log_df, dailyStats_keyColumns))
+
+    # Daily ~ Dates from last date on sheet (+1) to yesterday (today + 1)
+    dailyStats_sheetDates = schema.get_sheet_datetimes(daily_log_df, with_start_time=False)
     dailyStats_lastDate = dailyStats_sheetDates.max().date() + datetime.timedelta(days=1)
     dailyStats_startDate = np.min([dailyStats_lastDate, datetime.date.today() - datetime.timedelta(days=1)])
     dailyStats_endDate = datetime.date.today() - datetime.timedelta(days=1)
@@ -120,47 +111,15 @@ def get_write_basic_daily_activity_statistics(garmin_email, garmin_password, act
     else: 
         dailyStats_dateList = []
 
-    if dailyStats_dateList:
-        for singleDate in dailyStats_dateList:
-            logger.debug("Single day = {}".format(singleDate))
-
-            # Calculate
-            singleDay_dailyStats_dict = get_prepare_single_day_daily_statistics(garminClient, singleDate)
-
-            # Write
-            if not daily_log_sheet.row_values(1):
-                daily_log_sheet.insert_row(sub_config.DAILY_LOG_EXPECTED_HEADERS, index=1)
-            with contextlib.redirect_stdout(StringIO()):
-                daily_log_raw = hf.clean_data(singleDay_dailyStats_dict)
-                daily_log_key = hf.get_row_key(daily_log_raw, dailyStats_keyColumns)
-                if daily_log_key not in dailyStats_existingKeys:
-                    daily_log_df = pd.DataFrame([daily_log_raw])
-                    daily_log_sheetFormat = daily_log_df.values.tolist()
-                    daily_log_sheet.insert_rows(daily_log_sheetFormat, row=2)
-                    dailyStats_existingKeys.add(daily_log_key)
-
-    else:
-        logger.debug("All daily statistics to {} (yesterday) already entered".format(dailyStats_endDate))
-
-    # ----------------------------------------------------- 
-    # Calculate and write activity statistics to Drive sheet
-    # -----------------------------------------------------
-    logger.info("Prepare and write activity statistics")
-    
-    # Identify existing rows to avoid duplicates
-    activityStats_keyColumns = ["Year", "Month", "Day", "Start time", "Description", "Activity type"]
-    activityStats_existingKeys = set(
-        hf.get_row_key(row, activityStats_keyColumns)
-        for _, row in activity_log_df.iterrows()
-    )
-
-    # Dates ~ From last date on sheet (+1) to yesterday (today + 1)
-    activityStats_sheetDates = pd.to_datetime(
-        activity_log_df["Year"].astype(str) + "-" +
-        activity_log_df["Month"].astype(str) + "-" +
-        activity_log_df["Day"].astype(str),
-        errors="coerce"
+    # Activity ~ Identify existing rows to avoid duplicates ~> Garmin activity id, composite key for rows without id
+    activityStats_rowIndex = hf.SheetRowIndex(
+        sheet_data = activity_log_df,
+        key_columns = sub_config.ACTIVITY_LOG_KEY_COLUMNS,
+        id_column = sub_config.ACTIVITY_LOG_ID_COLUMN
         )
+
+    # Activity ~ Dates from last date on sheet (+1) to yesterday (today + 1)
+    activityStats_sheetDates = schema.get_sheet_datetimes(activity_log_df, with_start_time=False)
     activityStats_lastDate = activityStats_sheetDates.max().date() + datetime.timedelta(days=1)
     activityStats_startDate = np.min([activityStats_lastDate, datetime.date.today() - datetime.timedelta(days=1)])
     activityStats_endDate = datetime.date.today() - datetime.timedelta(days=1)
@@ -169,27 +128,118 @@ def get_write_basic_daily_activity_statistics(garmin_email, garmin_password, act
     else: 
         activityStats_dateList = []
 
-    if activityStats_dateList:
-        for singleDate in activityStats_dateList:
-            logger.debug("Single day = {}".format(singleDate))
-
-            # Calculate
-            singleDay_activityStats_dict = get_prepare_single_day_activity_statistics(garminClient, singleDate)
-
-            # Write
-            if not activity_log_sheet.row_values(1):
-                activity_log_sheet.insert_row(sub_config.ACTIVITY_LOG_EXPECTED_HEADERS, index=1)
-            for i in reversed(range(len(singleDay_activityStats_dict))):
-                with contextlib.redirect_stdout(StringIO()):
-                    activity_log_raw = hf.clean_data(singleDay_activityStats_dict["activity_{}".format(i)])
-                    activity_log_key = hf.get_row_key(activity_log_raw, activityStats_keyColumns)
-                    if activity_log_key not in activityStats_existingKeys:
-                        activity_log_df = pd.DataFrame([activity_log_raw])
-                        activity_log_sheetFormat = activity_log_df.values.tolist()
-                        activity_log_sheet.insert_rows(activity_log_sheetFormat, row=2)
-                        activityStats_existingKeys.add(activity_log_key)
-    
-    else:
-        logger.debug("All activity statistics to {} (yesterday) already entered".format(activityStats_endDate))
+    # Fetch plans ~ Only endpoints & streams the configured column groups need
+    dailyStats_fetchPlan = get_daily_fetch_plan()
+    activityStats_fetchPlan = get_activity_fetch_plan()
+    logger.info("Daily fetch plan ~> {}".format(describe_fetch_plan(dailyStats_fetchPlan, DAILY_STATISTICS_ENDPOINTS)))
+    logger.info("Activity fetch plan ~> {}".format(describe_fetch_plan(activityStats_fetchPlan, ACTIVITY_PLAN_ENDPOINTS)))
+
+    # Single day steps & writers of both logs (sequential & pipeline mode)
+    def fetch_daily_day(garminFetcher, singleDate):
+        return fetch_single_day_daily_statistics(garminFetcher, singleDate, dailyStats_fetchPlan)
+
+    def fetch_activity_day(garminFetcher, singleDate):
+        return fetch_single_day_activity_statistics(garminFetcher, singleDate, activityStats_activitiesByDate[singleDate], activityStats_fetchPlan)
+
+    def prepare_daily_day(singleDate, singleDay_dailyData):
+        return prepare_single_day_daily_statistics(singleDate, singleDay_dailyData, dailyStats_fetchPlan)
+
+    def prepare_activity_day(singleDate, singleDay_activityData):
+        return prepare_single_day_activity_statistics(singleDate, singleDay_activityData, activityStats_fetchPlan)
+
+    # Write (buffered)
+    def write_daily_day(daily_log_writer, singleDay_dailyStats_dict):
+        daily_log_writer.add_row(singleDay_dailyStats_dict)
+
+    # Write (buffered, same order as inserting one by one at row 2)
+    def write_activity_day(activity_log_writer, singleDay_activityStats_dict):
+        for i in reversed(range(len(singleDay_activityStats_dict))):
+            activity_log_writer.add_row(singleDay_activityStats_dict["activity_{}".format(i)])
+
+    def open_daily_log_writer():
+        return logStorage.get_writer(
+            log = daily_log_sheet,
+            key_columns = dailyStats_keyColumns,
+            existing_keys = dailyStats_existingKeys,
+            expected_headers = sub_config.DAILY_LOG_EXPECTED_HEADERS
+            )
+
+    def open_activity_log_writer():
+        return logStorage.get_writer(
+            log = activity_log_sheet,
+            key_columns = sub_config.ACTIVITY_LOG_KEY_COLUMNS,
+            row_index = activityStats_rowIndex,
+            expected_headers = sub_config.ACTIVITY_LOG_EXPECTED_HEADERS
+            )
+
+    with GarminFetcher(garminClient) as garminFetcher:
+
+        # ----------------------------------------------------- 
+        # Pipeline mode ~ Fetch, calculate & write both logs at the same time
+        # -----------------------------------------------------
+        if config.DAILY_STATISTICS_PIPELINE:
+            logger.info("Fetch, prepare and write daily & activity statistics (pipeline)")
+
+            # Activities of the whole activity range are listed at once, days only fetch their activities' details
+            activityStats_activitiesByDate = fetch_activities_by_date(garminFetcher, activityStats_dateList)
+
+            with contextlib.ExitStack() as logWriters:
+                daily_log_writer = logWriters.enter_context(open_daily_log_writer()) if dailyStats_dateList else None
+                activity_log_writer = logWriters.enter_context(open_activity_log_writer()) if activityStats_dateList else None
+                run_pipeline([
+                    {"name": "Daily", "dates": dailyStats_dateList, "fetch_day": fetch_daily_day, "prepare_day": prepare_daily_day,
+                     "write_day": lambda singleDay_dailyStats_dict: write_daily_day(daily_log_writer, singleDay_dailyStats_dict)},
+                    {"name": "Activity", "dates": activityStats_dateList, "fetch_day": fetch_activity_day, "prepare_day": prepare_activity_day,
+                     "write_day": lambda singleDay_activityStats_dict: write_activity_day(activity_log_writer, singleDay_activityStats_dict)},
+                    ], garminFetcher)
+
+            for log_name, log_writer, log_endDate in [("Daily", daily_log_writer, dailyStats_endDate), ("Activity", activity_log_writer, activityStats_endDate)]:
+                if log_writer is not None:
+                    logger.info("{} Log ~> {}".format(log_name, log_writer.get_report()))
+                else:
+                    logger.debug("All {} statistics to {} (yesterday) already entered".format(log_name.lower(), log_endDate))
+
+        else:
+
+            # Download both date ranges concurrently (days in date order, daily & activity days at the same time)
+            # Activities of the whole activity range are listed at once, days only fetch their activities' details
+            dailyStats_fetchedDays = garminFetcher.fetch_days(fetch_daily_day, dailyStats_dateList)
+            activityStats_activitiesByDate = fetch_activities_by_date(garminFetcher, activityStats_dateList)
+            activityStats_fetchedDays = garminFetcher.fetch_days(fetch_activity_day, activityStats_dateList)
+
+            # ----------------------------------------------------- 
+            # Calculate and write daily statistics to Drive sheet
+            # -----------------------------------------------------
+            logger.info("Prepare and write daily statistics")
+
+            if dailyStats_dateList:
+                with open_daily_log_writer() as daily_log_writer:
+                    for singleDate, singleDay_dailyData in dailyStats_fetchedDays:
+                        logger.debug("Single day = {}".format(singleDate))
+                        write_daily_day(daily_log_writer, prepare_daily_day(singleDate, singleDay_dailyData))
+
+                logger.info("Daily Log ~> {}".format(daily_log_writer.get_report()))
+
+            else:
+                logger.debug("All daily statistics to {} (yesterday) already entered".format(dailyStats_endDate))
+
+            # ----------------------------------------------------- 
+            # Calculate and write activity statistics to Drive sheet
+            # -----------------------------------------------------
+            logger.info("Prepare and write activity statistics")
+
+            if activityStats_dateList:
+                with open_activity_log_writer() as activity_log_writer:
+                    for singleDate, singleDay_activityData in activityStats_fetchedDays:
+                        logger.debug("Single day = {}".format(singleDate))
+                        write_activity_day(activity_log_writer, prepare_activity_day(singleDate, singleDay_activityData))
+
+                logger.info("Activity Log ~> {}".format(activity_log_writer.get_report()))
+            
+            else:
+                logger.debug("All activity statistics to {} (yesterday) already entered".format(activityStats_endDate))
+
+    if hasattr(garminClient, "get_report"):
+        logger.info("Garmin cache ~> {}".format(garminClient.get_report()))
 
     logger.info("Done: Main ~ Basic Daily & Activity Statistics")
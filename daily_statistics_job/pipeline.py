@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from daily_jobs import config
+
+# Logging
+from daily_jobs.log_config import setup_logger
+logger = setup_logger(name=__name__)
+
+# -----------------------------------------------------
+# Pipelined fetch ~> transform ~> write (asyncio)
+# -----------------------------------------------------
+# Every log is a stream of days going through three stages connected by bounded queues:
+# - fetch: fetch_day(garminFetcher, date) on the day threads of the GarminFetcher (blocking client),
+#   started in date order, at most queue_size days ahead of the transform stage (backpressure),
+# - transform: prepare_day(date, data) in a thread, in date order,
+# - write: write_day(rows) in a thread, in date order (rows go to the log's buffered writer, so a sheet
+#   is still written in the same order with the same calls).
+# The streams of both logs run at the same time, so a run takes about as long as its slowest stage
+# instead of the sum of all stages. The first error stops all stages and is raised.
+
+# Stream ~ {"name", "dates", "fetch_day", "prepare_day", "write_day"}
+async def run_stream(stream, garminFetcher, transform_executor, write_executor, queue_size):
+    loop = asyncio.get_running_loop()
+    fetched_days = asyncio.Queue(maxsize=queue_size)
+    prepared_days = asyncio.Queue(maxsize=queue_size)
+
+    async def fetch_stage():
+        for selectedDate in stream["dates"]:
+            await fetched_days.put((selectedDate, asyncio.wrap_future(garminFetcher.submit_day(stream["fetch_day"], selectedDate))))
+        await fetched_days.put(None)
+
+    async def transform_stage():
+        while (item := await fetched_days.get()) is not None:
+            selectedDate, fetched_day = item
+            singleDay_data = await fetched_day
+            logger.debug("{} ~ Single day = {}".format(stream["name"], selectedDate))
+            await prepared_days.put(await loop.run_in_executor(transform_executor, stream["prepare_day"], selectedDate, singleDay_data))
+        await prepared_days.put(None)
+
+    async def write_stage():
+        while (singleDay_rows := await prepared_days.get()) is not None:
+            await loop.run_in_executor(write_executor, stream["write_day"], singleDay_rows)
+
+    await run_tasks([fetch_stage(), transform_stage(), write_stage()])
+
+# Run coroutines together ~> first error cancels the others and is raised
+async def run_tasks(coroutines):
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def run_streams(streams, garminFetcher, queue_size):
+    with ThreadPoolExecutor(max_workers=max(len(streams), 1), thread_name_prefix="pipeline-transform") as transform_executor, \
+         ThreadPoolExecutor(max_workers=max(len(streams), 1), thread_name_prefix="pipeline-write") as write_executor:
+        await run_tasks([run_stream(stream, garminFetcher, transform_executor, write_executor, queue_size) for stream in streams])
+
+def run_pipeline(streams, garminFetcher, queue_size=None):
+    queue_size = config.PIPELINE_QUEUE_SIZE if queue_size is None else queue_size
+    asyncio.run(run_streams([stream for stream in streams if stream["dates"]], garminFetcher, queue_size))
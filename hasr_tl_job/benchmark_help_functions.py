@@ -0,0 +1,94 @@
+# -----------------------------------------------------
+# Libraries
+# -----------------------------------------------------
+
+import argparse
+import time
+import numpy as np
+
+from hasr_tl_job import config as sub_config
+from hasr_tl_job import help_functions as rtl_hf
+
+# -----------------------------------------------------
+# Micro-benchmark: scalar vs sorted view weighted quantile / rank kernels
+# -----------------------------------------------------
+# Several quantiles and ranks answered from one window (like what_if.py ranking planned
+# sessions against one baseline): the sorted view sorts the window once, the scalar
+# functions sort it per query. Windows are random, so only the timing matters; max
+# differences are reported as a sanity check (both sort with np.argsort, so they agree).
+
+def get_random_windows(nr_dates, max_window_size, seed):
+
+    rng = np.random.default_rng(seed)
+    nr_valid = rng.integers(max_window_size // 2, max_window_size + 1, nr_dates)
+    values = rng.gamma(2.0, 0.8, (nr_dates, max_window_size))
+    weights = rng.uniform(0.1, 1.0, (nr_dates, max_window_size))
+    query_values = rng.gamma(2.0, 0.8, (nr_dates, 2))
+
+    return values, weights, nr_valid, query_values
+
+def run_scalar(values, weights, nr_valid, quantiles, query_values):
+
+    quantile_values = np.empty((len(nr_valid), len(quantiles)))
+    percentile_ranks = np.empty(query_values.shape)
+    for d, n in enumerate(nr_valid):
+        for i, quantile in enumerate(quantiles):
+            quantile_values[d, i] = rtl_hf.get_weighted_quantile_value(quantile, values[d, :n], weights[d, :n])
+        for i, value in enumerate(query_values[d]):
+            percentile_ranks[d, i] = rtl_hf.get_weighted_percentile_rank(value, values[d, :n], weights[d, :n])
+
+    return quantile_values, percentile_ranks
+
+def run_sorted_view(values, weights, nr_valid, quantiles, query_values):
+
+    quantile_values = np.empty((len(nr_valid), len(quantiles)))
+    percentile_ranks = np.empty(query_values.shape)
+    for d, n in enumerate(nr_valid):
+        values_sorted, cumulative_weights = rtl_hf.get_weighted_sorted_view(values[d, :n], weights[d, :n])
+        quantile_values[d] = rtl_hf.get_weighted_quantile_values(quantiles, values_sorted, cumulative_weights)
+        percentile_ranks[d] = rtl_hf.get_weighted_percentile_ranks(query_values[d], values_sorted, cumulative_weights)
+
+    return quantile_values, percentile_ranks
+
+def get_best_time(function, repeats):
+
+    best_time = np.inf
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+
+    return best_time, result
+
+# -----------------------------------------------------
+# Main: Run benchmark
+# -----------------------------------------------------
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark scalar vs sorted view HASR-TL quantile / rank kernels")
+    parser.add_argument("--dates", type=int, default=2000, help="Number of dates (windows)")
+    parser.add_argument("--window", type=int, default=sub_config.BASELINE_WINDOW + 20, help="Maximum sessions per window")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeats per variant (best time is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    quantiles = np.array([sub_config.QUANTILE_TL_MINUTE_HARD, sub_config.QUANTILE_DURATION_LONG])
+    values, weights, nr_valid, query_values = get_random_windows(args.dates, args.window, args.seed)
+
+    scalar_time, (scalar_quantiles, scalar_ranks) = get_best_time(lambda: run_scalar(values, weights, nr_valid, quantiles, query_values), args.repeats)
+    view_time, (view_quantiles, view_ranks) = get_best_time(lambda: run_sorted_view(values, weights, nr_valid, quantiles, query_values), args.repeats)
+
+    print("Dates = {}, max window = {}, quantiles = {}, ranks per date = {}".format(args.dates, args.window, len(quantiles), query_values.shape[1]))
+    print("{:<28}{:>12}{:>12}{:>16}{:>16}".format("Variant", "Time [ms]", "Speed-up", "Max diff q", "Max diff rank"))
+    for name, variant_time, variant_quantiles, variant_ranks in [
+        ("Scalar (current)", scalar_time, scalar_quantiles, scalar_ranks),
+        ("Sorted view", view_time, view_quantiles, view_ranks),
+    ]:
+        print("{:<28}{:>12.1f}{:>12.1f}{:>16.2e}{:>16.2e}".format(
+            name,
+            variant_time * 1000,
+            scalar_time / variant_time,
+            np.max(np.abs(variant_quantiles - scalar_quantiles)),
+            np.max(np.abs(variant_ranks - scalar_ranks)),
+            ))
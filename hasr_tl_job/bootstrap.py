@@ -0,0 +1,115 @@
+import numpy as np
+
+# Import help functions
+from hasr_tl_job import config as sub_config
+from hasr_tl_job import help_functions as rtl_hf
+
+# -----------------------------------------------------
+# Bootstrap confidence bands for HASR-TL
+# -----------------------------------------------------
+# Per date the baseline and recent sessions are resampled with replacement, all replicates
+# at once: multinomial counts give a (replicates x sessions) matrix and every resampled
+# session keeps its exponential weight (replicate weight = count * weight).
+#
+# Every replicate gets its own Hard / Long thresholds from the resampled baseline (values
+# are sorted once per date, see rtl_hf.get_weighted_quantile_values_rows), bucket values
+# are weighted means over the replicate weights (empty bucket = 0, like get_weighted_mean)
+# and HASR-TL = weighted recent / weighted baseline. Baseline bucket bands only need the
+# baseline window, so dates without a recent window get them too.
+#
+# Random numbers are seeded by (seed, date), so a date gets the same bands in a full
+# rebuild and in an incremental run.
+
+# Replicate weights (replicates x sessions) ~> Multinomial counts (uniform draws, counted with one bincount) times session weights
+def get_bootstrap_weights(rng, weights, nr_replicates):
+    nr_sessions = len(weights)
+    draws = rng.integers(0, nr_sessions, size=(nr_replicates, nr_sessions)) + (np.arange(nr_replicates) * nr_sessions)[:, None]
+    counts = np.bincount(draws.ravel(), minlength=nr_replicates * nr_sessions).reshape(nr_replicates, nr_sessions)
+    return counts * weights[None, :]
+
+# Bucket values of every replicate (replicates x 3)
+def get_bootstrap_bucket_values(values, values_minute, durations, replicate_weights, quantiles_hard, quantiles_long):
+
+    hard_mask = rtl_hf.get_above_threshold_mask(values_minute[None, :], quantiles_hard[:, None])
+    long_mask = ~hard_mask & (durations[None, :] > quantiles_long[:, None])
+    easy_mask = ~hard_mask & (durations[None, :] <= quantiles_long[:, None])
+
+    bucket_values = np.zeros((len(replicate_weights), 3))
+    for b, bucket_mask in enumerate([easy_mask, hard_mask, long_mask]):
+        bucket_weights = np.where(bucket_mask, replicate_weights, 0.0)
+        sum_weights = bucket_weights.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bucket_values[:, b] = np.where(sum_weights > 0, (bucket_weights @ values) / sum_weights, 0.0)
+
+    return bucket_values
+
+# -----------------------------------------------------
+# GO: Bands for all target days
+# -----------------------------------------------------
+def calculate_hasr_tl_bootstrap_bands(
+        base_tl_arrays,
+        windows,
+        window_sets,
+        quantile_tl_minute_hard=sub_config.QUANTILE_TL_MINUTE_HARD,
+        quantile_duration_long=sub_config.QUANTILE_DURATION_LONG,
+        hasr_tl_weights=sub_config.HASR_TL_WEIGHTS,
+        nr_replicates=sub_config.HASR_TL_BOOTSTRAP_REPLICATES,
+        percentiles=sub_config.HASR_TL_BOOTSTRAP_PERCENTILES,
+        seed=sub_config.HASR_TL_BOOTSTRAP_SEED
+        ):
+
+    values = base_tl_arrays["values"]
+    values_minute = base_tl_arrays["values_minute"]
+    durations = base_tl_arrays["durations"]
+    hasr_tl_weights = np.asarray(hasr_tl_weights, dtype=float)
+
+    nr_days = len(windows["target_days"])
+    hasr_tl_bands = np.full((nr_days, len(percentiles)), np.nan)
+    recent_bucket_bands = np.full((nr_days, 3, len(percentiles)), np.nan)
+    baseline_bucket_bands = np.full((nr_days, 3, len(percentiles)), np.nan)
+
+    for d, window_set in enumerate(window_sets):
+        if window_set is None:
+            continue
+
+        baseline_index, baseline_set_weights, recent_index, recent_set_weights = window_set
+        rng = np.random.default_rng([seed, int(windows["target_days"][d])])
+
+        # Baseline replicates ~> Thresholds & bucket values
+        baseline_values_minute = values_minute[baseline_index]
+        baseline_durations = durations[baseline_index]
+        baseline_replicate_weights = get_bootstrap_weights(rng, baseline_set_weights, nr_replicates)
+
+        quantiles_hard = rtl_hf.get_weighted_quantile_values_rows(quantile_tl_minute_hard, baseline_values_minute, baseline_replicate_weights)
+        non_hard_mask = ~rtl_hf.get_above_threshold_mask(baseline_values_minute[None, :], quantiles_hard[:, None])
+        quantiles_long = rtl_hf.get_weighted_quantile_values_rows(quantile_duration_long, baseline_durations, np.where(non_hard_mask, baseline_replicate_weights, 0.0))
+
+        baseline_bucket_values = get_bootstrap_bucket_values(
+            values[baseline_index], baseline_values_minute, baseline_durations,
+            baseline_replicate_weights, quantiles_hard, quantiles_long
+            )
+        baseline_bucket_bands[d] = np.percentile(baseline_bucket_values, percentiles, axis=0).T
+
+        if recent_index is None:
+            continue
+
+        # Recent replicates ~> Bucket values with thresholds of the same replicate
+        recent_replicate_weights = get_bootstrap_weights(rng, recent_set_weights, nr_replicates)
+        recent_bucket_values = get_bootstrap_bucket_values(
+            values[recent_index], values_minute[recent_index], durations[recent_index],
+            recent_replicate_weights, quantiles_hard, quantiles_long
+            )
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hasr_tl = (recent_bucket_values @ hasr_tl_weights) / (baseline_bucket_values @ hasr_tl_weights)
+        hasr_tl = np.where(np.isfinite(hasr_tl), hasr_tl, np.nan)
+
+        if np.any(np.isfinite(hasr_tl)):
+            hasr_tl_bands[d] = np.nanpercentile(hasr_tl, percentiles)
+        recent_bucket_bands[d] = np.percentile(recent_bucket_values, percentiles, axis=0).T
+
+    return {
+        "hasr_tl_bands": hasr_tl_bands,
+        "recent_bucket_bands": recent_bucket_bands,
+        "baseline_bucket_bands": baseline_bucket_bands,
+    }
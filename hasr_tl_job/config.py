@@ -1,5 +1,6 @@
 # Libraries
 import numpy as np
+from pathlib import Path
 
 # Basic values
 BASELINE_WINDOW = 90
@@ -10,9 +11,15 @@ QUANTILE_TL_MINUTE_HARD = 0.70
 QUANTILE_DURATION_LONG = 0.75
 AGG_VARIABLE = "Training load"
 AGG_VARIABLE_NAME_DICT = {
-    "Training load": "TL"
+    "Training load": "TL",
+    "Duration [h]": "DUR",
+    "Distance [km]": "DIST",
+    "Calories [kcal]": "KCAL",
     }
 
+# Aggregate variables calculated by the job (one pass, each has its own HASR-* sheet)
+AGG_VARIABLES = [AGG_VARIABLE]
+
 baseline_window_days = range(1, BASELINE_WINDOW+1)
 baseline_window_weights = np.array([LAMBDA_BASE ** (j-1) for j in baseline_window_days])
 BASELINE_WINDOW_NORMALIZED_WEIGHTS = baseline_window_weights / sum(baseline_window_weights)
@@ -21,8 +28,21 @@ recent_window_days = range(1, RECENT_WINDOW+1)
 recent_window_weights = np.array([LAMBDA_BASE ** (j-1) for j in recent_window_days])
 RECENT_WINDOW_NORMALIZED_WEIGHTS = recent_window_weights / sum(recent_window_weights)
 
+# Local state between runs (incremental HASR-TL)
+HASR_TL_STATE_DIRECTORY = Path(__file__).resolve().parents[1] / ".hasr_tl_state"
+HASR_TL_STATE_VERSION = 1
+
+# Bootstrap confidence bands (optional, extra columns after all other columns, so existing sheets only get trailing columns)
+HASR_TL_BOOTSTRAP = False
+HASR_TL_BOOTSTRAP_REPLICATES = 1000
+HASR_TL_BOOTSTRAP_PERCENTILES = [5, 95]
+HASR_TL_BOOTSTRAP_SEED = 1312
+
 # Google sheets
-HASR_TL_SHEET_NAME = f"HASR-{AGG_VARIABLE_NAME_DICT[AGG_VARIABLE]}"
+def get_hasr_tl_sheet_name(agg_variable):
+    return f"HASR-{AGG_VARIABLE_NAME_DICT[agg_variable]}"
+
+HASR_TL_SHEET_NAME = get_hasr_tl_sheet_name(AGG_VARIABLE)
 
 # Excel column names
 BASELINE_SLA_VALUE_COLUMN_NAMES = [
@@ -70,11 +90,21 @@ RECENT_BASELINE_BUCKET_SLA_COMPARISON_COLUMN_NAMES = [
      "Recent/Baseline Long",
 ]
 
-HASR_TL_COLUMN_NAMES = [
-     f"HASR-{AGG_VARIABLE_NAME_DICT[AGG_VARIABLE]}",
-     f"HASR-{AGG_VARIABLE_NAME_DICT[AGG_VARIABLE]} Recent",
-     f"HASR-{AGG_VARIABLE_NAME_DICT[AGG_VARIABLE]} Baseline",
-]
+def get_hasr_tl_column_names(agg_variable):
+    return [
+        f"HASR-{AGG_VARIABLE_NAME_DICT[agg_variable]}",
+        f"HASR-{AGG_VARIABLE_NAME_DICT[agg_variable]} Recent",
+        f"HASR-{AGG_VARIABLE_NAME_DICT[agg_variable]} Baseline",
+    ]
+
+HASR_TL_COLUMN_NAMES = get_hasr_tl_column_names(AGG_VARIABLE)
+
+def get_hasr_tl_band_column_names(agg_variable):
+    return [
+        f"{column_name} P{percentile}"
+        for column_name in [get_hasr_tl_column_names(agg_variable)[0]] + RECENT_SLA_VALUE_COLUMN_NAMES + BASELINE_SLA_VALUE_COLUMN_NAMES
+        for percentile in HASR_TL_BOOTSTRAP_PERCENTILES
+    ]
 
 RECENT_SESSION_CLASS_COLUMN_NAMES = [
      "Session Baseline Overall Rank",
@@ -82,12 +112,18 @@ RECENT_SESSION_CLASS_COLUMN_NAMES = [
      "Session Baseline Class Rank",
 ]
 
-REQUIRED_COLUMNS_ORDER = ["Year", "Month", "Day", "Weekday", "Description", "Activity type", "Start time", "Aggregate variable"]
-REQUIRED_COLUMNS_ORDER += RECENT_SESSION_CLASS_COLUMN_NAMES
-REQUIRED_COLUMNS_ORDER += HASR_TL_COLUMN_NAMES
-for i in [0,1,2]:
-     REQUIRED_COLUMNS_ORDER += [RECENT_SLA_VALUE_COLUMN_NAMES[i]]
-     REQUIRED_COLUMNS_ORDER += [BASELINE_SLA_VALUE_COLUMN_NAMES[i]]
-     REQUIRED_COLUMNS_ORDER += [RECENT_SLA_PROPORTION_COLUMN_NAMES[i]]
-     REQUIRED_COLUMNS_ORDER += [BASELINE_SLA_PROPORTION_COLUMN_NAMES[i]]
+def get_required_columns_order(agg_variable, bootstrap=HASR_TL_BOOTSTRAP):
+     required_columns_order = ["Year", "Month", "Day", "Weekday", "Description", "Activity type", "Start time", "Aggregate variable"]
+     required_columns_order += RECENT_SESSION_CLASS_COLUMN_NAMES
+     required_columns_order += get_hasr_tl_column_names(agg_variable)
+     for i in [0,1,2]:
+          required_columns_order += [RECENT_SLA_VALUE_COLUMN_NAMES[i]]
+          required_columns_order += [BASELINE_SLA_VALUE_COLUMN_NAMES[i]]
+          required_columns_order += [RECENT_SLA_PROPORTION_COLUMN_NAMES[i]]
+          required_columns_order += [BASELINE_SLA_PROPORTION_COLUMN_NAMES[i]]
+     if bootstrap:
+          required_columns_order += get_hasr_tl_band_column_names(agg_variable)
+     return required_columns_order
+
+REQUIRED_COLUMNS_ORDER = get_required_columns_order(AGG_VARIABLE)
 
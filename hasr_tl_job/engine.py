@@ -0,0 +1,508 @@
+import pandas as pd
+import numpy as np
+
+# Import help functions
+from daily_jobs import schema
+from hasr_tl_job import config as sub_config
+from hasr_tl_job import help_functions as rtl_hf
+from hasr_tl_job import bootstrap as hasr_tl_bootstrap
+
+# -----------------------------------------------------
+# Batch HASR-TL engine
+# -----------------------------------------------------
+# All missing dates are calculated in one pass over the sorted activity arrays:
+# - every session gets a day ordinal (days since epoch),
+# - baseline and recent windows are found with searchsorted on these ordinals,
+# - window weights are looked up by day offset from the first window day.
+#
+# The numbers are the same as the original per-date loop, including its pairing of
+# session values and weights: the loop sorted the window newest first, but matched
+# the weights after sorting them by date ascending, so the k-th newest session got
+# the weight of the k-th oldest session's day.
+#
+# Windows are sorted again for every date. A sliding order-statistic structure (entries kept
+# sorted, all weights decayed by one factor per day) doesn't fit: weights are paired by
+# position, so a session entering or leaving the window changes every other session's weight.
+
+# Prepare activity log data ("clean" values, Datetime from date & start time, sorted by Datetime)
+def prepare_activity_data(activity_data_raw):
+
+    activity_data, parse_errors = schema.parse_sheet_data(activity_data_raw, schema.ACTIVITY_LOG_SCHEMA)
+    activity_data["Datetime"] = schema.get_sheet_datetimes(activity_data)
+
+    activity_data = activity_data.sort_values(by="Datetime").reset_index(drop=True)
+    return activity_data, parse_errors
+
+# Normalized window weights (same as hasr_tl_job/config.py for given window length & lambda)
+def get_window_weights(window, lambda_base=sub_config.LAMBDA_BASE):
+    window_weights = np.array([lambda_base ** (j-1) for j in range(1, window+1)])
+    return window_weights / sum(window_weights)
+
+# Prepare base data (Datetime index, duration and per aggregate variable: value & per minute value)
+def prepare_base_tl_data(activity_data, agg_variable=sub_config.AGG_VARIABLE):
+
+    agg_variables = [agg_variable] if isinstance(agg_variable, str) else list(agg_variable)
+
+    base_tl_data = activity_data[["Datetime", "Duration [h]"]].copy()
+    for agg in agg_variables:
+        base_tl_data[agg] = activity_data[agg]
+        base_tl_data[agg+" minute"] = activity_data[agg] / (activity_data["Duration [h]"] * 60)
+
+    for agg in agg_variables:
+        base_tl_data[agg] = base_tl_data[agg].fillna(0)
+        base_tl_data[agg+" minute"] = base_tl_data[agg+" minute"].fillna(0)
+    base_tl_data["Duration [h]"] = base_tl_data["Duration [h]"].fillna(0)
+
+    base_tl_data = base_tl_data.set_index("Datetime").sort_index()
+    return base_tl_data
+
+# Day ordinals (days since 1970-01-01) for datetime values
+def get_day_ordinals(datetimes):
+    return np.asarray(datetimes, dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+
+# Sorted activity arrays used by the engine (rows without Datetime are never part of any window)
+def get_base_tl_arrays(base_tl_data, agg_variable=sub_config.AGG_VARIABLE):
+
+    base_tl_data = base_tl_data.loc[base_tl_data.index.notna()]
+    datetimes = base_tl_data.index.values.astype("datetime64[ns]")
+
+    return {
+        "datetimes": datetimes,
+        "days": get_day_ordinals(datetimes),
+        "values": base_tl_data[agg_variable].to_numpy(dtype=float),
+        "values_minute": base_tl_data[agg_variable+" minute"].to_numpy(dtype=float),
+        "durations": base_tl_data["Duration [h]"].to_numpy(dtype=float),
+    }
+
+# Baseline & Recent window bounds for all target days
+def get_hasr_tl_windows(days, target_days, baseline_window=sub_config.BASELINE_WINDOW, recent_window=sub_config.RECENT_WINDOW):
+
+    target_days = np.asarray(target_days, dtype=np.int64)
+
+    # Baseline window ~> Baseline window immediately after the recent window
+    first_baseline_days = target_days - (recent_window + baseline_window - 1)
+    last_baseline_days = target_days - recent_window
+
+    # Recent window ~> Recent window including target day
+    first_recent_days = target_days - (recent_window - 1)
+    last_recent_days = target_days
+
+    baseline_start = np.searchsorted(days, first_baseline_days, side="left")
+    baseline_end = np.searchsorted(days, last_baseline_days, side="right")
+    recent_start = np.searchsorted(days, first_recent_days, side="left")
+    recent_end = np.searchsorted(days, last_recent_days, side="right")
+
+    # Enough history ~> There is a session exactly on the first window day
+    padded_days = np.append(days, np.iinfo(np.int64).max)
+    baseline_available = padded_days[baseline_start] == first_baseline_days
+    recent_available = (padded_days[recent_start] == first_recent_days) & baseline_available
+
+    return {
+        "target_days": target_days,
+        "first_baseline_days": first_baseline_days,
+        "first_recent_days": first_recent_days,
+        "baseline_start": baseline_start,
+        "baseline_end": baseline_end,
+        "recent_start": recent_start,
+        "recent_end": recent_end,
+        "baseline_available": baseline_available,
+        "recent_available": recent_available,
+    }
+
+# Window positions sorted newest first, ties ordered like pandas sort_index(ascending=False)
+def get_newest_first_index(datetimes, start, end):
+    window_index = np.arange(start, end)[::-1]
+    return window_index[datetimes[start:end][::-1].argsort(kind="quicksort")][::-1]
+
+# Split window into Easy, Hard & Long bucket masks
+def get_bucket_masks(values_minute, durations, quantile_hard, quantile_long):
+
+    hard_mask = rtl_hf.get_above_threshold_mask(values_minute, quantile_hard)
+    long_mask = ~hard_mask & (durations > quantile_long)
+    easy_mask = ~hard_mask & (durations <= quantile_long)
+
+    return easy_mask, hard_mask, long_mask
+
+# Session class (bucket index & name) ~> Hard above TL minute threshold, else Long above duration threshold, else Easy
+SESSION_CLASS_NAMES = ["Easy", "Hard", "Long"]
+
+def classify_session(value_minute, duration, quantile_hard, quantile_long):
+    if rtl_hf.get_above_threshold_mask(value_minute, quantile_hard):
+        return 1
+    elif duration > quantile_long:
+        return 2
+    else:
+        return 0
+
+# Window sets of every target day (positions newest first & weights) ~> Same for all aggregate variables
+def get_hasr_tl_window_sets(
+        base_tl_arrays,
+        windows,
+        baseline_weights=sub_config.BASELINE_WINDOW_NORMALIZED_WEIGHTS,
+        recent_weights=sub_config.RECENT_WINDOW_NORMALIZED_WEIGHTS
+        ):
+
+    datetimes = base_tl_arrays["datetimes"]
+    days = base_tl_arrays["days"]
+
+    window_sets = [None] * len(windows["target_days"])
+    for d in np.flatnonzero(windows["baseline_available"]):
+
+        # Baseline set (newest first) & Weights matched by position to days sorted ascending
+        start, end = windows["baseline_start"][d], windows["baseline_end"][d]
+        baseline_index = get_newest_first_index(datetimes, start, end)
+        baseline_set_weights = baseline_weights[days[start:end] - windows["first_baseline_days"][d]]
+
+        # Recent set (newest first) & Weights matched by position to days sorted ascending
+        recent_index, recent_set_weights = None, None
+        if windows["recent_available"][d]:
+            start, end = windows["recent_start"][d], windows["recent_end"][d]
+            recent_index = get_newest_first_index(datetimes, start, end)
+            recent_set_weights = recent_weights[days[start:end] - windows["first_recent_days"][d]]
+
+        window_sets[d] = (baseline_index, baseline_set_weights, recent_index, recent_set_weights)
+
+    return window_sets
+
+# HASR-TL values for every target day (one row per day, not rounded)
+def calculate_hasr_tl_day_values(
+        base_tl_arrays,
+        windows,
+        baseline_weights=sub_config.BASELINE_WINDOW_NORMALIZED_WEIGHTS,
+        recent_weights=sub_config.RECENT_WINDOW_NORMALIZED_WEIGHTS,
+        quantile_tl_minute_hard=sub_config.QUANTILE_TL_MINUTE_HARD,
+        quantile_duration_long=sub_config.QUANTILE_DURATION_LONG,
+        hasr_tl_weights=sub_config.HASR_TL_WEIGHTS,
+        window_sets=None
+        ):
+
+    if window_sets is None:
+        window_sets = get_hasr_tl_window_sets(base_tl_arrays, windows, baseline_weights, recent_weights)
+
+    values = base_tl_arrays["values"]
+    values_minute = base_tl_arrays["values_minute"]
+    durations = base_tl_arrays["durations"]
+
+    nr_days = len(windows["target_days"])
+    quantiles_hard = np.full(nr_days, np.nan)
+    quantiles_long = np.full(nr_days, np.nan)
+    baseline_bucket_values = np.full((nr_days, 3), np.nan)
+    baseline_bucket_proportions = np.full((nr_days, 3), np.nan)
+    recent_bucket_values = np.full((nr_days, 3), np.nan)
+    recent_bucket_proportions = np.full((nr_days, 3), np.nan)
+    session_overall_rank = np.full(nr_days, np.nan)
+    session_class = np.full(nr_days, np.nan, dtype=object)
+    session_class_rank = np.full(nr_days, np.nan)
+
+    for d in np.flatnonzero(windows["baseline_available"]):
+
+        # -------------------------------
+        # BASELINE VALUES
+        # -------------------------------
+
+        # Baseline set (newest first) & Weights
+        baseline_index, baseline_set_weights, recent_index, recent_set_weights = window_sets[d]
+        baseline_values = values[baseline_index]
+        baseline_values_minute = values_minute[baseline_index]
+        baseline_durations = durations[baseline_index]
+
+        # Buckets sets & Weights
+        quantile_hard = rtl_hf.get_weighted_quantile_values(
+            quantile_tl_minute_hard,
+            *rtl_hf.get_weighted_sorted_view(baseline_values_minute, baseline_set_weights)
+            )
+        hard_baseline_mask = rtl_hf.get_above_threshold_mask(baseline_values_minute, quantile_hard)
+
+        # Only Hard sessions ~> No Long threshold
+        quantile_long = np.nan
+        if not np.all(hard_baseline_mask):
+            quantile_long = rtl_hf.get_weighted_quantile_values(
+                quantile_duration_long,
+                *rtl_hf.get_weighted_sorted_view(baseline_durations[~hard_baseline_mask], baseline_set_weights[~hard_baseline_mask])
+                )
+        baseline_bucket_masks = get_bucket_masks(baseline_values_minute, baseline_durations, quantile_hard, quantile_long)
+        quantiles_hard[d], quantiles_long[d] = quantile_hard, quantile_long
+
+        # Aggregate buckets values & Proportions in each bucket
+        for b, bucket_mask in enumerate(baseline_bucket_masks):
+            baseline_bucket_values[d, b] = rtl_hf.get_weighted_mean(baseline_values[bucket_mask], baseline_set_weights[bucket_mask])
+            baseline_bucket_proportions[d, b] = np.count_nonzero(bucket_mask)/len(baseline_index) * 100
+
+        # -------------------------------
+        # RECENT VALUES
+        # -------------------------------
+
+        if recent_index is None:
+            continue
+
+        # Recent set (newest first) & Weights
+        recent_values = values[recent_index]
+
+        # Recent session classification ~> Newest session in recent window
+        recent_session = recent_index[0]
+        session_overall_rank[d] = rtl_hf.get_weighted_percentile_ranks(
+            values[recent_session],
+            *rtl_hf.get_weighted_sorted_view(baseline_values, baseline_set_weights)
+            )
+
+        session_class_index = classify_session(values_minute[recent_session], durations[recent_session], quantile_hard, quantile_long)
+        session_class[d], class_mask = SESSION_CLASS_NAMES[session_class_index], baseline_bucket_masks[session_class_index]
+
+        # Empty class in baseline ~> No class rank
+        # Class set is sorted on its own: np.argsort isn't stable, the tie order of the full baseline sort could differ
+        if np.any(class_mask):
+            session_class_rank[d] = rtl_hf.get_weighted_percentile_ranks(
+                values[recent_session],
+                *rtl_hf.get_weighted_sorted_view(baseline_values[class_mask], baseline_set_weights[class_mask])
+                )
+
+        # Aggregate buckets values & Proportions in each bucket
+        recent_bucket_masks = get_bucket_masks(values_minute[recent_index], durations[recent_index], quantile_hard, quantile_long)
+        for b, bucket_mask in enumerate(recent_bucket_masks):
+            recent_bucket_values[d, b] = rtl_hf.get_weighted_mean(recent_values[bucket_mask], recent_set_weights[bucket_mask])
+            recent_bucket_proportions[d, b] = np.count_nonzero(bucket_mask)/len(recent_index) * 100
+
+    # -------------------------------
+    # FINAL HASR-TL
+    # -------------------------------
+
+    hasr_tl_baseline = (
+        hasr_tl_weights[0] * baseline_bucket_values[:, 0] +
+        hasr_tl_weights[1] * baseline_bucket_values[:, 1] +
+        hasr_tl_weights[2] * baseline_bucket_values[:, 2]
+        )
+
+    hasr_tl_recent = (
+        hasr_tl_weights[0] * recent_bucket_values[:, 0] +
+        hasr_tl_weights[1] * recent_bucket_values[:, 1] +
+        hasr_tl_weights[2] * recent_bucket_values[:, 2]
+        )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hasr_tl = hasr_tl_recent / hasr_tl_baseline
+
+    return {
+        "days": windows["target_days"],
+        "quantile_hard": quantiles_hard,
+        "quantile_long": quantiles_long,
+        "baseline_bucket_values": baseline_bucket_values,
+        "baseline_bucket_proportions": baseline_bucket_proportions,
+        "recent_bucket_values": recent_bucket_values,
+        "recent_bucket_proportions": recent_bucket_proportions,
+        "session_overall_rank": session_overall_rank,
+        "session_class": session_class,
+        "session_class_rank": session_class_rank,
+        "hasr_tl": hasr_tl,
+        "hasr_tl_recent": hasr_tl_recent,
+        "hasr_tl_baseline": hasr_tl_baseline,
+    }
+
+# Round like the sheet rows (proportions were Python floats, everything else numpy floats)
+def round_proportions(proportions):
+    return np.array([round(float(x), 2) for x in proportions.ravel()]).reshape(proportions.shape)
+
+# Day values to HASR-TL sheet columns (one row per target day)
+def get_hasr_tl_day_frame(day_values, hasr_tl_column_names=sub_config.HASR_TL_COLUMN_NAMES, rounded=True):
+
+    day_frame = pd.DataFrame(index=pd.Index(day_values["days"], name="day"))
+    if not rounded:
+        np_round = lambda x, decimals: x
+        round_proportions_values = lambda x: x
+    else:
+        np_round = np.round
+        round_proportions_values = round_proportions
+
+    for b in [0, 1, 2]:
+        day_frame[sub_config.BASELINE_SLA_VALUE_COLUMN_NAMES[b]] = np_round(day_values["baseline_bucket_values"][:, b], 2)
+        day_frame[sub_config.BASELINE_SLA_PROPORTION_COLUMN_NAMES[b]] = round_proportions_values(day_values["baseline_bucket_proportions"][:, b])
+        day_frame[sub_config.RECENT_SLA_VALUE_COLUMN_NAMES[b]] = np_round(day_values["recent_bucket_values"][:, b], 2)
+        day_frame[sub_config.RECENT_SLA_PROPORTION_COLUMN_NAMES[b]] = round_proportions_values(day_values["recent_bucket_proportions"][:, b])
+
+    day_frame[sub_config.RECENT_SESSION_CLASS_COLUMN_NAMES[0]] = np_round(day_values["session_overall_rank"], 2)
+    day_frame[sub_config.RECENT_SESSION_CLASS_COLUMN_NAMES[1]] = day_values["session_class"]
+    day_frame[sub_config.RECENT_SESSION_CLASS_COLUMN_NAMES[2]] = np_round(day_values["session_class_rank"], 2)
+
+    day_frame[hasr_tl_column_names[0]] = np_round(day_values["hasr_tl"], 2)
+    day_frame[hasr_tl_column_names[1]] = np_round(day_values["hasr_tl_recent"], 2)
+    day_frame[hasr_tl_column_names[2]] = np_round(day_values["hasr_tl_baseline"], 2)
+
+    return day_frame
+
+# Bootstrap band columns (rounded like the sheet) after the day frame columns
+def add_hasr_tl_band_columns(day_frame, bands, agg_variable=sub_config.AGG_VARIABLE):
+
+    band_column_names = iter(sub_config.get_hasr_tl_band_column_names(agg_variable))
+    for p in range(bands["hasr_tl_bands"].shape[1]):
+        day_frame[next(band_column_names)] = np.round(bands["hasr_tl_bands"][:, p], 2)
+    for bucket_bands in [bands["recent_bucket_bands"], bands["baseline_bucket_bands"]]:
+        for b in [0, 1, 2]:
+            for p in range(bucket_bands.shape[2]):
+                day_frame[next(band_column_names)] = np.round(bucket_bands[:, b, p], 2)
+
+    return day_frame
+
+# HASR-TL sheet rows of sessions (session info from activity log, values from day frame)
+def get_hasr_tl_session_rows(activity_data, sessions, day_frame, agg_variable, required_columns_order):
+
+    session_days = get_day_ordinals(sessions)
+
+    # Session info ~> First activity with the same Datetime
+    activity_help = activity_data.drop_duplicates(subset="Datetime").set_index("Datetime")
+    start_times = sessions.strftime("%H:%M")
+
+    hasr_tl_rows = pd.DataFrame({
+        "Year": sessions.year,
+        "Month": sessions.month,
+        "Day": sessions.day,
+        "Start time": start_times.where(start_times != "00:00").to_numpy(),
+        "Weekday": sessions.strftime("%A"),
+        "Description": activity_help.loc[sessions, "Description"].to_numpy(),
+        "Activity type": activity_help.loc[sessions, "Activity type"].to_numpy(),
+        "Aggregate variable": agg_variable,
+        })
+
+    hasr_tl_rows = pd.concat([hasr_tl_rows, day_frame.reindex(session_days).reset_index(drop=True)], axis=1)
+    hasr_tl_rows = hasr_tl_rows.reindex(columns=required_columns_order).set_index(sessions)
+
+    return hasr_tl_rows
+
+# -----------------------------------------------------
+# GO: All missing HASR rows of several aggregate variables in one pass
+# -----------------------------------------------------
+# Windows and window sets (positions & weights) depend only on session datetimes, so they
+# are built once and shared; only quantiles, buckets and ranks are per aggregate variable.
+def calculate_multi_hasr_tl_rows(
+        activity_data,
+        last_hasr_tl_dates,
+        baseline_window=sub_config.BASELINE_WINDOW,
+        recent_window=sub_config.RECENT_WINDOW,
+        baseline_weights=sub_config.BASELINE_WINDOW_NORMALIZED_WEIGHTS,
+        recent_weights=sub_config.RECENT_WINDOW_NORMALIZED_WEIGHTS,
+        quantile_tl_minute_hard=sub_config.QUANTILE_TL_MINUTE_HARD,
+        quantile_duration_long=sub_config.QUANTILE_DURATION_LONG,
+        hasr_tl_weights=sub_config.HASR_TL_WEIGHTS,
+        hasr_tl_column_names=None,
+        required_columns_order=None,
+        base_tl_data=None,
+        bootstrap=sub_config.HASR_TL_BOOTSTRAP
+        ) -> dict:
+
+    # last_hasr_tl_dates: {aggregate variable: last date in its HASR sheet}
+    agg_variables = list(last_hasr_tl_dates.keys())
+    if hasr_tl_column_names is None:
+        hasr_tl_column_names = {agg: sub_config.get_hasr_tl_column_names(agg) for agg in agg_variables}
+    if required_columns_order is None:
+        required_columns_order = {agg: sub_config.get_required_columns_order(agg, bootstrap) for agg in agg_variables}
+
+    # Sorted activity arrays (once) ~> base_tl_data can be given to use a shorter history (see hasr_tl_job.state)
+    if base_tl_data is None:
+        base_tl_data = prepare_base_tl_data(activity_data, agg_variables)
+    base_tl_arrays = {agg: get_base_tl_arrays(base_tl_data, agg) for agg in agg_variables}
+    shared_base_tl_arrays = base_tl_arrays[agg_variables[0]]
+
+    # Sessions after last HASR date of each aggregate variable ~> One row per session, values depend only on session day
+    # (no last date, e.g. empty HASR sheet ~> All sessions)
+    missing_sessions = {
+        agg: base_tl_data.index[base_tl_data.index.notna()] if pd.isna(last_hasr_tl_dates[agg])
+        else base_tl_data.index[base_tl_data.index.normalize() > pd.Timestamp(last_hasr_tl_dates[agg]).normalize()]
+        for agg in agg_variables
+        }
+    hasr_tl_rows = {agg: pd.DataFrame(columns=required_columns_order[agg]) for agg in agg_variables}
+
+    target_days = np.unique(np.concatenate([get_day_ordinals(missing_sessions[agg]) for agg in agg_variables]))
+    if len(target_days) == 0:
+        return hasr_tl_rows
+
+    # Shared windows & window sets
+    windows = get_hasr_tl_windows(shared_base_tl_arrays["days"], target_days, baseline_window, recent_window)
+    window_sets = get_hasr_tl_window_sets(shared_base_tl_arrays, windows, baseline_weights, recent_weights)
+
+    for agg in agg_variables:
+        if len(missing_sessions[agg]) == 0:
+            continue
+
+        day_values = calculate_hasr_tl_day_values(
+            base_tl_arrays[agg],
+            windows,
+            baseline_weights=baseline_weights,
+            recent_weights=recent_weights,
+            quantile_tl_minute_hard=quantile_tl_minute_hard,
+            quantile_duration_long=quantile_duration_long,
+            hasr_tl_weights=hasr_tl_weights,
+            window_sets=window_sets
+            )
+        day_frame = get_hasr_tl_day_frame(day_values, hasr_tl_column_names[agg])
+
+        # Optional uncertainty ~> Bootstrap bands for HASR-TL, recent & baseline buckets
+        if bootstrap:
+            bands = hasr_tl_bootstrap.calculate_hasr_tl_bootstrap_bands(
+                base_tl_arrays[agg],
+                windows,
+                window_sets,
+                quantile_tl_minute_hard=quantile_tl_minute_hard,
+                quantile_duration_long=quantile_duration_long,
+                hasr_tl_weights=hasr_tl_weights
+                )
+            day_frame = add_hasr_tl_band_columns(day_frame, bands, agg)
+
+        hasr_tl_rows[agg] = get_hasr_tl_session_rows(activity_data, missing_sessions[agg], day_frame, agg, required_columns_order[agg])
+
+    return hasr_tl_rows
+
+# -----------------------------------------------------
+# GO: All missing HASR-TL rows in one pass
+# -----------------------------------------------------
+def calculate_hasr_tl_rows(
+        activity_data,
+        last_hasr_tl_date,
+        agg_variable=sub_config.AGG_VARIABLE,
+        baseline_window=sub_config.BASELINE_WINDOW,
+        recent_window=sub_config.RECENT_WINDOW,
+        baseline_weights=sub_config.BASELINE_WINDOW_NORMALIZED_WEIGHTS,
+        recent_weights=sub_config.RECENT_WINDOW_NORMALIZED_WEIGHTS,
+        quantile_tl_minute_hard=sub_config.QUANTILE_TL_MINUTE_HARD,
+        quantile_duration_long=sub_config.QUANTILE_DURATION_LONG,
+        hasr_tl_weights=sub_config.HASR_TL_WEIGHTS,
+        hasr_tl_column_names=None,
+        required_columns_order=None,
+        base_tl_data=None,
+        bootstrap=sub_config.HASR_TL_BOOTSTRAP
+        ) -> pd.DataFrame:
+
+    hasr_tl_rows = calculate_multi_hasr_tl_rows(
+        activity_data,
+        {agg_variable: last_hasr_tl_date},
+        baseline_window=baseline_window,
+        recent_window=recent_window,
+        baseline_weights=baseline_weights,
+        recent_weights=recent_weights,
+        quantile_tl_minute_hard=quantile_tl_minute_hard,
+        quantile_duration_long=quantile_duration_long,
+        hasr_tl_weights=hasr_tl_weights,
+        hasr_tl_column_names={agg_variable: hasr_tl_column_names} if hasr_tl_column_names is not None else None,
+        required_columns_order={agg_variable: required_columns_order} if required_columns_order is not None else None,
+        base_tl_data=base_tl_data,
+        bootstrap=bootstrap
+        )
+
+    return hasr_tl_rows[agg_variable]
+
+# -----------------------------------------------------
+# Activity history for tools (Google sheet of user or local CSV export of "Raw Activity Data")
+# -----------------------------------------------------
+def load_activity_data(user=None, activity_log_csv=None):
+
+    if activity_log_csv is not None:
+        activity_data_raw = pd.read_csv(activity_log_csv, dtype=str, keep_default_na=False)
+        return prepare_activity_data(activity_data_raw)[0]
+
+    # Credentials are only needed (and loaded) when reading from the user's log storage
+    from daily_jobs import config
+    from daily_jobs import storage as log_storage
+
+    activity_data_raw, _ = log_storage.get_storage(config.USER_CONFIGURATIONS[user]["storage"]).read_log(
+        filename = config.USER_CONFIGURATIONS[user]["gdrive_activity_log_filename"],
+        sheet_name = config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME
+        )
+
+    return prepare_activity_data(activity_data_raw)[0]
@@ -35,4 +35,67 @@ def get_weighted_mean(values, weights):
     sum_weights = np.sum(weights)
 
     weighted_mean = 1/sum_weights * sum_weighted_values
-    return weighted_mean
\ No newline at end of file
+    return weighted_mean
+
+# Values above a threshold ~> Values equal to it up to rounding error are not above
+# (e.g. per minute values of Duration [h] are all 1/60 up to rounding, none of them is Hard)
+def get_above_threshold_mask(values, threshold, rtol=1e-9):
+    return (values > threshold) & ~np.isclose(values, threshold, rtol=rtol, atol=0)
+
+# -----------------------------------------------------
+# Batched variants ~ Sort once, answer many quantiles / ranks
+# -----------------------------------------------------
+
+# Sorted view of values with normalized cumulative weights (same sort as the scalar functions above)
+def get_weighted_sorted_view(values, weights):
+
+    sorter = np.argsort(values)
+    values_sorted = values[sorter]
+    weights_sorted = weights[sorter]
+
+    cumulative_weights = np.cumsum(weights_sorted) / np.sum(weights_sorted)
+
+    return values_sorted, cumulative_weights
+
+# Weighted quantile values for many quantiles against a sorted view
+def get_weighted_quantile_values(quantiles, values_sorted, cumulative_weights):
+    return np.interp(quantiles, cumulative_weights, values_sorted)
+
+# Weighted percentile ranks for many values against a sorted view
+def get_weighted_percentile_ranks(query_values, values_sorted, cumulative_weights):
+    percentile_ranks = np.interp(query_values, values_sorted, cumulative_weights)
+    return np.clip(percentile_ranks, 0, 1)
+
+# Weighted quantile for many weight rows over the same values (e.g. bootstrap replicates)
+# Values are sorted once; entries with weight 0 are left out of their row (np.interp semantics on the rest)
+def get_weighted_quantile_values_rows(quantile, values, weights):
+
+    sorter = np.argsort(values, kind="stable")
+    values_sorted = values[sorter]
+    weights_sorted = weights[:, sorter]
+    included = weights_sorted > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cumulative_weights = np.cumsum(weights_sorted, axis=1) / np.sum(weights_sorted, axis=1, keepdims=True)
+
+    nr_rows, width = weights_sorted.shape
+    rows = np.arange(nr_rows)
+    last_included = np.maximum.accumulate(np.where(included, np.arange(width)[None, :], -1), axis=1)
+
+    # First included entry above quantile (right) & last included entry before it (left)
+    above = included & (cumulative_weights > quantile)
+    has_right = above.any(axis=1)
+    right = np.where(has_right, above.argmax(axis=1), last_included[:, -1])
+    left = np.where(has_right & (right > 0), last_included[rows, np.maximum(right - 1, 0)], -1)
+
+    cumulative_weights_left = cumulative_weights[rows, np.maximum(left, 0)]
+    cumulative_weights_right = cumulative_weights[rows, right]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (values_sorted[right] - values_sorted[np.maximum(left, 0)]) / (cumulative_weights_right - cumulative_weights_left)
+        quantile_values = values_sorted[np.maximum(left, 0)] + slope * (quantile - cumulative_weights_left)
+
+    # Below first / above last included entry ~> First / last value, rows without entries ~> NaN
+    quantile_values = np.where((left < 0) | ~has_right, values_sorted[right], quantile_values)
+    quantile_values = np.where(last_included[:, -1] < 0, np.nan, quantile_values)
+
+    return quantile_values
@@ -4,23 +4,15 @@
 
 # Librarires
 import pandas as pd
-import numpy as np
-import gspread
-import contextlib
-from io import StringIO
-
-# Set up repo root path
-import os
-import sys
-repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-if repo_root not in sys.path:
-    sys.path.insert(0, repo_root)
 
 # Help functions & "Main" functions
 from daily_jobs import config
 from daily_jobs import help_functions as hf
+from daily_jobs import schema
+from daily_jobs import storage as log_storage
 from hasr_tl_job import config as sub_config
-from hasr_tl_job import help_functions as rtl_hf
+from hasr_tl_job import engine as hasr_tl_engine
+from hasr_tl_job import state as hasr_tl_state
 
 # Logging
 from daily_jobs.log_config import setup_logger
@@ -31,14 +23,55 @@ import logging
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 logging.getLogger("requests").setLevel(logging.WARNING)
 
+# -------------------------------
+# HASR sheet of aggregate variable: prepared data & last date
+# -------------------------------
+def prepare_hasr_tl_data(hasr_tl_data_raw, agg_variable):
+
+    # Typed columns & Datetime from date and start time
+    hasr_tl_data, parse_errors = schema.parse_sheet_data(hasr_tl_data_raw, schema.get_hasr_tl_schema(agg_variable))
+    if len(parse_errors) > 0:
+        logger.warning(schema.get_parse_errors_message(parse_errors, sub_config.get_hasr_tl_sheet_name(agg_variable)))
+
+    # No dated rows (e.g. new sheet with header only) ~> NaT: whole history is calculated
+    hasr_tl_data["Datetime"] = schema.get_sheet_datetimes(hasr_tl_data)
+    last_hasr_tl_data_datetime = hasr_tl_data["Datetime"].max()
+    if pd.notna(last_hasr_tl_data_datetime):
+        last_hasr_tl_data_datetime = last_hasr_tl_data_datetime.normalize()
+
+    return hasr_tl_data, last_hasr_tl_data_datetime
+
+# -------------------------------
+# Write missing HASR rows of aggregate variable to its sheet
+# -------------------------------
+def write_hasr_tl_rows(logStorage, hasr_tl_data, hasr_tl_data_sheet, hasr_tl_rows, agg_variable):
+
+    # Identify existing rows to avoid duplicates
+    hasr_tl_data_keyColumns = ["Year", "Month", "Day", "Start time", "Description", "Activity type"]
+    hasr_tl_data_existingKeys = set(hf.get_row_keys(hasr_tl_data, hasr_tl_data_keyColumns))
+
+    # Write all new rows in one call (oldest first, shown newest first at row 2) ~> Header checked first
+    # (band columns of bootstrap runs are added as trailing columns)
+    with logStorage.get_writer(
+        log = hasr_tl_data_sheet,
+        key_columns = hasr_tl_data_keyColumns,
+        existing_keys = hasr_tl_data_existingKeys,
+        columns = sub_config.get_required_columns_order(agg_variable),
+        expected_headers = sub_config.get_required_columns_order(agg_variable)
+        ) as hasr_tl_writer:
+        for date_full, hasr_tl_row in hasr_tl_rows.iterrows():
+            logger.info("Date = {}".format(date_full.date()))
+            hasr_tl_writer.add_row(hasr_tl_row.to_dict())
+
+    logger.info("{} ~> {}".format(sub_config.get_hasr_tl_sheet_name(agg_variable), hasr_tl_writer.get_report()))
+
 # -------------------------------
 # Main: Prepare data, Calculate HASR-TL values and write to sheet
 # -------------------------------
-def prepare_calculate_write_hasr_tl(garmin_email, activity_log_file_name):
+def prepare_calculate_write_hasr_tl(garmin_email, activity_log_file_name, agg_variables=sub_config.AGG_VARIABLES, storage_backend=None):
     logger.info("Running: Main ~ Analysis - History Aware Relative Stratified - Training Load")
 
     # Define "input parameters"
-    agg_variable = sub_config.AGG_VARIABLE
     baseline_window = sub_config.BASELINE_WINDOW
     recent_window = sub_config.RECENT_WINDOW
     baseline_weights = sub_config.BASELINE_WINDOW_NORMALIZED_WEIGHTS
@@ -48,12 +81,14 @@ def prepare_calculate_write_hasr_tl(garmin_email, activity_log_file_name):
     hasrl_tl_weights = sub_config.HASR_TL_WEIGHTS
     
     # About
-    logger.info("About user ~> Garmin email: {} ~> activity file name: {}".format(
+    logger.info("About user ~> Garmin email: {} ~> activity file name: {} ~> storage: {}".format(
         garmin_email, 
         activity_log_file_name, 
+        storage_backend or "google_sheets",
         ))
     
     logger.info(
+        f"Aggregate variables = {agg_variables}, "
         f"Baseline window = {baseline_window}, "
         f"Recent window = {recent_window}, "
         f"Quantile TL per minute ~ Hard = {quantile_tl_minute_hard}, "
@@ -65,394 +100,121 @@ def prepare_calculate_write_hasr_tl(garmin_email, activity_log_file_name):
     # Get and prepare data
     # -------------------------------
 
-    # Get data
-    googleDrive_client = gspread.authorize(config.DRIVE_CREDENTIALS)
+    # Get data ~> Only newest rows: HASR sheets down to their last date, then the Activity Log down to
+    # the first day of the HASR-TL windows of the first missing date (whole log only without valid states)
+    logStorage = log_storage.get_storage(storage_backend)
+    hasr_tl_sheet_names = [sub_config.get_hasr_tl_sheet_name(agg_variable) for agg_variable in agg_variables]
 
-    logger.info("Opening and preparing Activity Log file")
+    logger.info("Opening and preparing Activity Log & {} files".format(", ".join(hasr_tl_sheet_names)))
     try:
-        activity_data_raw, _ = hf.import_google_sheet(
-            googleDrive_client = googleDrive_client, 
+        hasr_tl_imported_sheets = hf.read_log_tails(
+            storage = logStorage, 
             filename = activity_log_file_name, 
-            sheet_name = config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME
+            tail_horizons = {hasr_tl_sheet_name: (None, config.LOG_TAIL_INITIAL_ROWS) for hasr_tl_sheet_name in hasr_tl_sheet_names}
             )
     except Exception as e:
         logger.error(f"Error opening Activity Log file: {e}")
         raise
-    
-    logger.info("Opening and preparing HASR-TL Log file")
+
+    hasr_tl_sheets = {}
+    for agg_variable, hasr_tl_sheet_name in zip(agg_variables, hasr_tl_sheet_names):
+        hasr_tl_data_raw, hasr_tl_data_sheet = hasr_tl_imported_sheets[hasr_tl_sheet_name]
+        hasr_tl_data, last_hasr_tl_data_datetime = prepare_hasr_tl_data(hasr_tl_data_raw, agg_variable)
+        hasr_tl_sheets[agg_variable] = (hasr_tl_data, hasr_tl_data_sheet, last_hasr_tl_data_datetime)
+    last_hasr_tl_dates = {agg_variable: hasr_tl_sheets[agg_variable][2] for agg_variable in agg_variables}
+
+    # Activity Log ~> Sessions of the state days (last baseline + recent window days up to the last HASR date) and later
+    activity_log_horizon_datetime = None
+    if not any(pd.isna(last_hasr_tl_date) for last_hasr_tl_date in last_hasr_tl_dates.values()):
+        activity_log_horizon_datetime = min(last_hasr_tl_dates.values()) - pd.Timedelta(days=baseline_window + recent_window - 1 + config.LOG_TAIL_MARGIN_DAYS)
     try:
-        hasr_tl_data_raw, hasr_tl_data_sheet = hf.import_google_sheet(
-            googleDrive_client = googleDrive_client, 
-            filename = activity_log_file_name, 
-            sheet_name = sub_config.HASR_TL_SHEET_NAME
-            )
+        if activity_log_horizon_datetime is None:
+            activity_data_raw, _ = logStorage.read_log(activity_log_file_name, config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME)
+            activity_data_is_complete = True
+        else:
+            activity_data_raw, _ = hf.read_log_tails(
+                storage = logStorage, 
+                filename = activity_log_file_name, 
+                tail_horizons = {config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME: (activity_log_horizon_datetime, config.LOG_TAIL_INITIAL_ROWS)}
+                )[config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME]
+            activity_data_is_complete = False
     except Exception as e:
-        logger.error(f"Error opening HASR-TL Log file: {e}")
+        logger.error(f"Error opening Activity Log file: {e}")
         raise
 
-    # "Clean" data
-    activity_data = hf.data_safe_convert_to_numeric(activity_data_raw.copy(deep=True))
-    hasr_tl_data = hf.data_safe_convert_to_numeric(hasr_tl_data_raw.copy(deep=True))
-
-    # Prepare data for calculations
-    activity_data["Datetime"] = pd.to_datetime(
-        activity_data["Year"].astype(str) + "-" +
-        activity_data["Month"].astype(str) + "-" +
-        activity_data["Day"].astype(str) + " " +
-        activity_data["Start time"].fillna("00:00").astype(str),
-        format="%Y-%m-%d %H:%M",
-        errors="coerce"
-        )
-    
-    activity_data = activity_data.sort_values(by="Datetime").reset_index(drop=True)
-    base_tl_data = activity_data[["Datetime", "Duration [h]", sub_config.AGG_VARIABLE]].copy()
-    base_tl_data[sub_config.AGG_VARIABLE+" minute"] = base_tl_data[sub_config.AGG_VARIABLE] / (base_tl_data["Duration [h]"] * 60)
-
-    base_tl_data[sub_config.AGG_VARIABLE] = base_tl_data[sub_config.AGG_VARIABLE].fillna(0)
-    base_tl_data[sub_config.AGG_VARIABLE+" minute"] = base_tl_data[sub_config.AGG_VARIABLE+" minute"].fillna(0)
-    base_tl_data["Duration [h]"] = base_tl_data["Duration [h]"].fillna(0)
-
-    hasr_tl_data["Datetime"] = pd.to_datetime(
-        hasr_tl_data["Year"].astype(str) + "-" +
-        hasr_tl_data["Month"].astype(str) + "-" +
-        hasr_tl_data["Day"].astype(str) + " " +
-        hasr_tl_data["Start time"].astype(str),
-        format="%Y-%m-%d %H:%M",
-        errors="coerce"
-        )
-        
-    # -------------------------------
-    # We work based on Datetime
-    # -------------------------------
-
-    base_tl_data = base_tl_data.set_index("Datetime").sort_index()
-    hasr_tl_data = hasr_tl_data.set_index("Datetime").sort_index()
-
-    base_tl_data_datetimes = base_tl_data.index.date
-    last_hasr_tl_data_datetime = hasr_tl_data.index.max().normalize()
-    missing_hasr_tl_data_datetimes = base_tl_data.loc[base_tl_data.index.normalize() > last_hasr_tl_data_datetime].index
+    activity_data, activity_parse_errors = hasr_tl_engine.prepare_activity_data(activity_data_raw)
+    if len(activity_parse_errors) > 0:
+        logger.warning(schema.get_parse_errors_message(activity_parse_errors, config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME))
+    logger.info("{} ~> {} newest rows read".format(config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME, len(activity_data_raw)))
 
     # -------------------------------
     # Calculate missing HASR-TL values
     # -------------------------------
     logger.info("Calculate and write missing HASR-TL values")
-    
-    # Identify existing rows to avoid duplicates
-    hasr_tl_data_keyColumns = ["Year", "Month", "Day", "Start time", "Description", "Activity type"]
-    hasr_tl_data_existingKeys = set(
-        hf.get_row_key(row, hasr_tl_data_keyColumns)
-        for _, row in hasr_tl_data.reset_index(drop=True).iterrows()
-    )
-
-    # Fill row by row
-    for date_full in missing_hasr_tl_data_datetimes:
-            date = date_full.date()
-            logger.info("Date = {}".format(date))
-
-            # Baseline window ~> Baseline window immediately after the recent window
-            first_baseline_date = date - pd.Timedelta(days=recent_window + baseline_window - 1)
-            last_baseline_date = date - pd.Timedelta(days=recent_window)
-            logger.debug("Baseline dates: {} - {}".format(first_baseline_date, last_baseline_date))
-
-            # Recent window ~> Recent window including "date"
-            first_recent_date = date - pd.Timedelta(days=recent_window-1)
-            last_recent_date = date
-            logger.debug("Recent dates: {} - {}".format(first_recent_date, last_recent_date))
-
-            # -------------------------------
-            # BASELINE VALUES
-            # -------------------------------
-
-            # We have enough history to calculate baseline buckets values
-            if first_baseline_date in base_tl_data_datetimes:
-                logger.debug("Baseline SLA: Calculating SLA and Proportions")
-
-                # Baseline set
-                baseline_set = (
-                    base_tl_data
-                    .loc[
-                        (base_tl_data.index.normalize() >= pd.Timestamp(first_baseline_date)) & (base_tl_data.index.normalize() <= pd.Timestamp(last_baseline_date)), 
-                        [sub_config.AGG_VARIABLE, sub_config.AGG_VARIABLE+" minute", "Duration [h]"]]
-                    .sort_index(ascending=False)
-                    .assign(date = lambda x: x.index.normalize())
-                    .reset_index(drop=True)
-                    )
-                
-                # Match weights to baseline set
-                baseline_set_weights = (
-                    pd.DataFrame({
-                        "date": pd.date_range(start=first_baseline_date, end=last_baseline_date, freq="D"),
-                        "weight": baseline_weights
-                    })
-                    .reset_index(drop=True)
-                    .merge(baseline_set[["date"]], on="date", how="right")
-                    .sort_values("date", ascending=True)
-                    .reset_index(drop=True)
-                    ["weight"]
-                    )
-                
-                # Buckets sets & Weights
-                quantile_hard = rtl_hf.get_weighted_quantile_value(
-                    quantile=quantile_tl_minute_hard, 
-                    values=baseline_set[sub_config.AGG_VARIABLE+" minute"].to_numpy(), 
-                    weights=baseline_set_weights.to_numpy()
-                    )
-                hard_baseline_mask = baseline_set[sub_config.AGG_VARIABLE+" minute"] > quantile_hard
-                hard_baseline_set = baseline_set.loc[hard_baseline_mask, sub_config.AGG_VARIABLE]
-                hard_baseline_set_weights = baseline_set_weights[hard_baseline_mask]
-                
-                easy_long_baseline_set = baseline_set[~hard_baseline_mask]
-                easy_long_baseline_set_weights = baseline_set_weights[~hard_baseline_mask]
-                quantile_long = rtl_hf.get_weighted_quantile_value(
-                    quantile=quantile_duration_long, 
-                    values=easy_long_baseline_set["Duration [h]"].to_numpy(), 
-                    weights=easy_long_baseline_set_weights.to_numpy()
-                    )
-
-                long_baseline_mask = easy_long_baseline_set["Duration [h]"] > quantile_long
-                long_baseline_set = easy_long_baseline_set.loc[long_baseline_mask, sub_config.AGG_VARIABLE]
-                long_baseline_set_weights = easy_long_baseline_set_weights[long_baseline_mask]
-
-                easy_baseline_mask = easy_long_baseline_set["Duration [h]"] <= quantile_long
-                easy_baseline_set = easy_long_baseline_set.loc[easy_baseline_mask, sub_config.AGG_VARIABLE]
-                easy_baseline_set_weights = easy_long_baseline_set_weights[easy_baseline_mask]
 
-                # Aggregate buckets values
-                baseline_easy_value = rtl_hf.get_weighted_mean(easy_baseline_set, easy_baseline_set_weights)
-                baseline_hard_value = rtl_hf.get_weighted_mean(hard_baseline_set, hard_baseline_set_weights)
-                baseline_long_value = rtl_hf.get_weighted_mean(long_baseline_set, long_baseline_set_weights)
-
-                # Proportions in each bucket
-                baseline_easy_proportion = len(easy_baseline_set)/len(baseline_set) * 100
-                baseline_hard_proportion = len(hard_baseline_set)/len(baseline_set) * 100
-                baseline_long_proportion = len(long_baseline_set)/len(baseline_set) * 100
-            
-            # We do not have enough history to calculate baseline buckets values
-            else:
-                logger.debug("Baseline SLA: Not enough data avaliable")
-
-                baseline_easy_value = np.nan
-                baseline_hard_value = np.nan
-                baseline_long_value = np.nan
-
-                baseline_easy_proportion = np.nan
-                baseline_hard_proportion = np.nan 
-                baseline_long_proportion = np.nan
-                
-            # -------------------------------
-            # RECENT VALUES
-            # -------------------------------
-
-            # We have enough history to calculate recent buckets values
-            if (first_recent_date in base_tl_data_datetimes) and (first_baseline_date in base_tl_data_datetimes):
-                logger.debug("Recent SLA: Calculating SLA and Proportions")
-
-                # Recent set
-                recent_set = (
-                    base_tl_data
-                    .loc[
-                        (base_tl_data.index.normalize() >= pd.Timestamp(first_recent_date)) & (base_tl_data.index.normalize() <= pd.Timestamp(last_recent_date)),  
-                        [sub_config.AGG_VARIABLE, sub_config.AGG_VARIABLE+" minute", "Duration [h]"]]
-                    .sort_index(ascending=False)
-                    .assign(date = lambda x: x.index.normalize())
-                    .reset_index(drop=True)
-                )
-
-                # Match weights to recemt set
-                recent_set_weights = (
-                    pd.DataFrame({
-                        "date": pd.date_range(start=first_recent_date, end=last_recent_date, freq="D"),
-                        "weight": recent_weights
-                    })
-                    .reset_index(drop=True)
-                    .merge(recent_set[["date"]], on="date", how="right")
-                    .sort_values("date", ascending=True)
-                    .reset_index(drop=True)
-                    ["weight"]
-                    )
-
-                # Recent session classification 
-                recent_session = recent_set.iloc[0]
-                recent_session_overall_percentile_rank = rtl_hf.get_weighted_percentile_rank(
-                    value=recent_session[sub_config.AGG_VARIABLE], 
-                    values=baseline_set[sub_config.AGG_VARIABLE].to_numpy(), 
-                    weights=baseline_set_weights.to_numpy()
-                    )
-                
-                if recent_session[sub_config.AGG_VARIABLE+" minute"] > quantile_hard:
-                    recent_session_class = "Hard"
-                    recent_session_class_percentile_rank = rtl_hf.get_weighted_percentile_rank(
-                        value=recent_session[sub_config.AGG_VARIABLE], 
-                        values=hard_baseline_set.to_numpy(), 
-                        weights=hard_baseline_set_weights.to_numpy()
-                    )
-                elif recent_session["Duration [h]"] > quantile_long:
-                    recent_session_class = "Long"
-                    recent_session_class_percentile_rank = rtl_hf.get_weighted_percentile_rank(
-                        value=recent_session[sub_config.AGG_VARIABLE], 
-                        values=long_baseline_set.to_numpy(), 
-                        weights=long_baseline_set_weights.to_numpy()
-                    )
-                else:
-                    recent_session_class = "Easy" 
-                    recent_session_class_percentile_rank = rtl_hf.get_weighted_percentile_rank(
-                        value=recent_session[sub_config.AGG_VARIABLE], 
-                        values=easy_baseline_set.to_numpy(), 
-                        weights=easy_baseline_set_weights.to_numpy()
-                    )
-
-                # Aggregate variable values & Weights for each bucket
-                hard_recent_mask = recent_set[sub_config.AGG_VARIABLE+" minute"] > quantile_hard
-                hard_recent_set = recent_set.loc[hard_recent_mask, sub_config.AGG_VARIABLE]
-                hard_recent_set_weights = recent_set_weights[hard_recent_mask]
-
-                easy_long_recent_set = recent_set[~hard_recent_mask]
-                easy_long_recent_set_weights = recent_set_weights[~hard_recent_mask]
-
-                long_recent_mask = easy_long_recent_set["Duration [h]"] > quantile_long
-                long_recent_set = easy_long_recent_set.loc[long_recent_mask, sub_config.AGG_VARIABLE]
-                long_recent_set_weights = easy_long_recent_set_weights[long_recent_mask]
-
-                easy_recent_mask = easy_long_recent_set["Duration [h]"] <= quantile_long
-                easy_recent_set = easy_long_recent_set.loc[easy_recent_mask, sub_config.AGG_VARIABLE]
-                easy_recent_set_weights = easy_long_recent_set_weights[easy_recent_mask]
-
-                # Aggregate buckets values
-                recent_easy_value = rtl_hf.get_weighted_mean(easy_recent_set, easy_recent_set_weights)
-                recent_hard_value = rtl_hf.get_weighted_mean(hard_recent_set, hard_recent_set_weights)
-                recent_long_value = rtl_hf.get_weighted_mean(long_recent_set, long_recent_set_weights)
-
-                # Proportions in each bucket
-                recent_easy_proportion = len(easy_recent_set)/len(recent_set) * 100
-                recent_hard_proportion = len(hard_recent_set)/len(recent_set) * 100
-                recent_long_proportion = len(long_recent_set)/len(recent_set) * 100
-            
-            # We do not have enough history to calculate recent buckets values
-            else:
-                logger.debug("Recent SLA: Not enough baseline data to calculate quantiles")
-
-                recent_session_overall_percentile_rank = np.nan
-                recent_session_class = np.nan
-                recent_session_class_percentile_rank = np.nan
-
-                recent_easy_value = np.nan
-                recent_hard_value = np.nan
-                recent_long_value = np.nan
-
-                recent_easy_proportion = np.nan
-                recent_hard_proportion = np.nan
-                recent_long_proportion = np.nan
-
-            # -------------------------------
-            # BUCKET LEVEL DIAGNOSTICS 
-            # -------------------------------
-
-            logger.debug("Within Baseline SLA comparison")
-            baseline_hard_easy = baseline_hard_value / baseline_easy_value
-            baseline_long_hard = baseline_long_value / baseline_hard_value
-            baseline_long_easy = baseline_long_value / baseline_easy_value
-
-            logger.debug("Within Recent SLA comparison")
-            recent_hard_easy = recent_hard_value / recent_easy_value
-            recent_long_hard = recent_long_value / recent_hard_value
-            recent_long_easy = recent_long_value / recent_easy_value
-            
-            logger.debug("Recent vs. Baseline Bucket SLA comparison")
-            recent_baseline_b1 = recent_easy_value / baseline_easy_value
-            recent_baseline_b2 = recent_hard_value / baseline_hard_value
-            recent_baseline_b3 = recent_long_value / baseline_long_value
-
-            # -------------------------------
-            # FINAL HASR-TL 
-            # -------------------------------
+    hasr_tl_shared_parameters = {
+        "baseline_window": baseline_window,
+        "recent_window": recent_window,
+        "baseline_weights": baseline_weights,
+        "recent_weights": recent_weights,
+        "quantile_tl_minute_hard": quantile_tl_minute_hard,
+        "quantile_duration_long": quantile_duration_long,
+        "hasr_tl_weights": hasrl_tl_weights,
+    }
+
+    # Local state ~> Only sessions of the last baseline + recent window days are needed for new dates
+    base_tl_data = hasr_tl_engine.prepare_base_tl_data(activity_data, agg_variables)
+
+    hasr_tl_parameters_hashes, hasr_tl_state_paths, hasr_tl_states = {}, {}, {}
+    for agg_variable in agg_variables:
+        hasr_tl_parameters_hashes[agg_variable] = hasr_tl_state.get_hasr_tl_parameters_hash(agg_variable=agg_variable, **hasr_tl_shared_parameters)
+        hasr_tl_state_paths[agg_variable] = hasr_tl_state.get_hasr_tl_state_path(activity_log_file_name, agg_variable)
+        hasr_tl_state_dict = hasr_tl_state.load_hasr_tl_state(hasr_tl_state_paths[agg_variable], hasr_tl_parameters_hashes[agg_variable])
+        if hasr_tl_state_dict is not None and hasr_tl_state.check_hasr_tl_state(hasr_tl_state_dict, base_tl_data, last_hasr_tl_dates[agg_variable]):
+            hasr_tl_states[agg_variable] = hasr_tl_state_dict
+
+    if len(hasr_tl_states) == len(agg_variables):
+        logger.info("HASR-TL states up to {} are valid ~> Incremental calculation".format(sorted(set(state["last_date"] for state in hasr_tl_states.values()))))
+        window_base_tl_data = hasr_tl_state.get_incremental_base_tl_data(list(hasr_tl_states.values()), base_tl_data)
+    else:
+        logger.info("No valid HASR-TL state for {} (missing, parameters or history changed) ~> Missing dates calculated from the whole Activity Log, existing rows are kept".format([agg for agg in agg_variables if agg not in hasr_tl_states]))
+        if not activity_data_is_complete:
+            activity_data_raw, _ = logStorage.read_log(activity_log_file_name, config.BASIC_ACTIVITY_STATISTICS_SHEET_NAME)
+            activity_data, _ = hasr_tl_engine.prepare_activity_data(activity_data_raw)
+            base_tl_data = hasr_tl_engine.prepare_base_tl_data(activity_data, agg_variables)
+        window_base_tl_data = base_tl_data
+
+    # All aggregate variables in one pass (shared windows)
+    hasr_tl_rows = hasr_tl_engine.calculate_multi_hasr_tl_rows(
+        activity_data = activity_data,
+        last_hasr_tl_dates = last_hasr_tl_dates,
+        base_tl_data = window_base_tl_data,
+        **hasr_tl_shared_parameters
+        )
 
-            logger.debug("HASR-TL calculation")
-            hasr_tl_baseline = (
-                hasrl_tl_weights[0] * baseline_easy_value + 
-                hasrl_tl_weights[1] * baseline_hard_value +
-                hasrl_tl_weights[2] * baseline_long_value
-                )
-            
-            hasr_tl_recent = (
-                hasrl_tl_weights[0] * recent_easy_value + 
-                hasrl_tl_weights[1] * recent_hard_value +
-                hasrl_tl_weights[2] * recent_long_value
+    for agg_variable in agg_variables:
+        hasr_tl_data, hasr_tl_data_sheet, last_hasr_tl_data_datetime = hasr_tl_sheets[agg_variable]
+        logger.info("Calculated {} missing {} rows".format(len(hasr_tl_rows[agg_variable]), sub_config.get_hasr_tl_sheet_name(agg_variable)))
+
+        write_hasr_tl_rows(logStorage, hasr_tl_data, hasr_tl_data_sheet, hasr_tl_rows[agg_variable], agg_variable)
+
+        # Save state up to last HASR date (no HASR rows at all ~> No state)
+        hasr_tl_dates = [last_hasr_tl_data_datetime] if pd.notna(last_hasr_tl_data_datetime) else []
+        hasr_tl_dates += list(hasr_tl_rows[agg_variable].index.normalize()) if len(hasr_tl_rows[agg_variable]) > 0 else []
+        if len(hasr_tl_dates) == 0:
+            continue
+        last_hasr_tl_date = max(hasr_tl_dates)
+        hasr_tl_state.save_hasr_tl_state(
+            hasr_tl_state_paths[agg_variable],
+            hasr_tl_state.build_hasr_tl_state(
+                window_base_tl_data,
+                last_hasr_tl_date,
+                hasr_tl_parameters_hashes[agg_variable],
+                agg_variable=agg_variable,
+                baseline_window=baseline_window,
+                recent_window=recent_window
                 )
-            
-            hasr_tl = hasr_tl_recent / hasr_tl_baseline
-
-            # -------------------------------
-            # ADD NEW ROW
-            # -------------------------------
-
-            # Fill selected row baseline buckets values
-            logger.debug("Preparing row to add")
-            activity_help = activity_data.query("Datetime == @date_full").iloc[0]
-            new_date_hasr_tl_data_row_dict = {
-                    "Year": date_full.year,
-                    "Month": date_full.month,
-                    "Day": date_full.day,
-                    "Start time": date_full.strftime("%H:%M") if date_full.strftime("%H:%M") != "00:00" else np.nan,
-                    "Weekday": date.strftime("%A"),
-                    "Description": activity_help["Description"],
-                    "Activity type": activity_help["Activity type"],
-                    "Aggregate variable": agg_variable,
-
-                    sub_config.BASELINE_SLA_VALUE_COLUMN_NAMES[0]: round(baseline_easy_value, 2),
-                    sub_config.BASELINE_SLA_VALUE_COLUMN_NAMES[1]: round(baseline_hard_value, 2),
-                    sub_config.BASELINE_SLA_VALUE_COLUMN_NAMES[2]: round(baseline_long_value, 2),
-
-                    sub_config.BASELINE_SLA_PROPORTION_COLUMN_NAMES[0]: round(baseline_easy_proportion, 2),
-                    sub_config.BASELINE_SLA_PROPORTION_COLUMN_NAMES[1]: round(baseline_hard_proportion, 2),
-                    sub_config.BASELINE_SLA_PROPORTION_COLUMN_NAMES[2]: round(baseline_long_proportion, 2),
-                    
-                    sub_config.RECENT_SESSION_CLASS_COLUMN_NAMES[0]: round(recent_session_overall_percentile_rank, 2) if not np.isnan(recent_session_overall_percentile_rank) else np.nan,
-                    sub_config.RECENT_SESSION_CLASS_COLUMN_NAMES[1]: recent_session_class,
-                    sub_config.RECENT_SESSION_CLASS_COLUMN_NAMES[2]: round(recent_session_class_percentile_rank, 2) if not np.isnan(recent_session_class_percentile_rank) else np.nan,
-
-                    sub_config.RECENT_SLA_VALUE_COLUMN_NAMES[0]: round(recent_easy_value, 2),
-                    sub_config.RECENT_SLA_VALUE_COLUMN_NAMES[1]: round(recent_hard_value, 2),
-                    sub_config.RECENT_SLA_VALUE_COLUMN_NAMES[2]: round(recent_long_value, 2),
-
-                    sub_config.RECENT_SLA_PROPORTION_COLUMN_NAMES[0]: round(recent_easy_proportion, 2),
-                    sub_config.RECENT_SLA_PROPORTION_COLUMN_NAMES[1]: round(recent_hard_proportion, 2),
-                    sub_config.RECENT_SLA_PROPORTION_COLUMN_NAMES[2]: round(recent_long_proportion, 2),
-
-                    # Not in use
-                    # sub_config.BASELINE_WITHIN_WINDOW_SLA_COMPARISON_COLUMN_NAMES[0]: round(baseline_hard_easy, 2) if not np.isnan(baseline_hard_easy) else np.nan,
-                    # sub_config.BASELINE_WITHIN_WINDOW_SLA_COMPARISON_COLUMN_NAMES[1]: round(baseline_long_hard, 2) if not np.isnan(baseline_long_hard) else np.nan,
-                    # sub_config.BASELINE_WITHIN_WINDOW_SLA_COMPARISON_COLUMN_NAMES[2]: round(baseline_long_easy, 2) if not np.isnan(baseline_long_easy) else np.nan,
-
-                    # sub_config.RECENT_WITHIN_WINDOW_SLA_COMPARISON_COLUMN_NAMES[0]: round(recent_hard_easy, 2) if not np.isnan(recent_hard_easy) else np.nan,
-                    # sub_config.RECENT_WITHIN_WINDOW_SLA_COMPARISON_COLUMN_NAMES[1]: round(recent_long_hard, 2) if not np.isnan(recent_long_hard) else np.nan,
-                    # sub_config.RECENT_WITHIN_WINDOW_SLA_COMPARISON_COLUMN_NAMES[2]: round(recent_long_easy, 2) if not np.isnan(recent_long_easy) else np.nan,
-
-                    # sub_config.RECENT_BASELINE_BUCKET_SLA_COMPARISON_COLUMN_NAMES[0]: round(recent_baseline_easy, 2) if not np.isnan(recent_baseline_easy) else np.nan,
-                    # sub_config.RECENT_BASELINE_BUCKET_SLA_COMPARISON_COLUMN_NAMES[1]: round(recent_baseline_hard, 2) if not np.isnan(recent_baseline_hard) else np.nan,
-                    # sub_config.RECENT_BASELINE_BUCKET_SLA_COMPARISON_COLUMN_NAMES[2]: round(recent_baseline_long, 2) if not np.isnan(recent_baseline_long) else np.nan,
-
-                    sub_config.HASR_TL_COLUMN_NAMES[0]: round(hasr_tl, 2) if not np.isnan(hasr_tl) else np.nan,
-                    sub_config.HASR_TL_COLUMN_NAMES[1]: round(hasr_tl_recent, 2) if not np.isnan(hasr_tl_recent) else np.nan,
-                    sub_config.HASR_TL_COLUMN_NAMES[2]: round(hasr_tl_baseline, 2) if not np.isnan(hasr_tl_baseline) else np.nan,
-
-            }
-
-            for col in sub_config.REQUIRED_COLUMNS_ORDER:
-                if col not in new_date_hasr_tl_data_row_dict:
-                    new_date_hasr_tl_data_row_dict[col] = np.nan
-
-            # Write to sheet
-            logger.debug("Writing to HASR-TL data to sheet")
-            with contextlib.redirect_stdout(StringIO()):
-                new_date_hasr_tl_data_row_dict = hf.clean_data(new_date_hasr_tl_data_row_dict)
-                hasr_tl_data_key = hf.get_row_key(new_date_hasr_tl_data_row_dict, hasr_tl_data_keyColumns)
-                if hasr_tl_data_key not in hasr_tl_data_existingKeys:
-                    new_date_hasr_tl_data_row = pd.DataFrame([new_date_hasr_tl_data_row_dict], columns=sub_config.REQUIRED_COLUMNS_ORDER)
-                    new_date_hasr_tl_data_row_sheet_format = new_date_hasr_tl_data_row.values.tolist()
-                    hasr_tl_data_sheet.insert_rows(new_date_hasr_tl_data_row_sheet_format, row=2)
-                    hasr_tl_data_existingKeys.add(hasr_tl_data_key)
+            )
+        logger.info("{} state saved up to {}".format(sub_config.get_hasr_tl_sheet_name(agg_variable), last_hasr_tl_date.date()))
     
     logger.info("Done: Main ~ Analysis - History Aware Relative Stratified - Training Load")
-
-
-
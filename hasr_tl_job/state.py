@@ -0,0 +1,162 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import re
+import os
+
+# Import help functions
+from hasr_tl_job import config as sub_config
+from hasr_tl_job import engine as hasr_tl_engine
+
+# -----------------------------------------------------
+# Persistent HASR-TL window state between runs
+# -----------------------------------------------------
+# A local JSON file per user holds the last BASELINE_WINDOW + RECENT_WINDOW days of
+# (datetime, aggregate variable, aggregate variable per minute, duration). New dates then
+# only need these sessions plus the new ones (thresholds are recalculated from them).
+#
+# The state is only used when:
+# - it was written with the same parameters (hasr_tl_job/config.py),
+# - it ends on the last date in the HASR-TL sheet,
+# - the activity log still has exactly the same sessions in the state days.
+# Otherwise the missing dates are calculated from the whole activity log (rows already in
+# the HASR-TL sheet are kept, also when parameters changed).
+
+# Parameters hash ~> State is invalid as soon as any parameter changes
+def get_hasr_tl_parameters_hash(
+        agg_variable=sub_config.AGG_VARIABLE,
+        baseline_window=sub_config.BASELINE_WINDOW,
+        recent_window=sub_config.RECENT_WINDOW,
+        baseline_weights=sub_config.BASELINE_WINDOW_NORMALIZED_WEIGHTS,
+        recent_weights=sub_config.RECENT_WINDOW_NORMALIZED_WEIGHTS,
+        quantile_tl_minute_hard=sub_config.QUANTILE_TL_MINUTE_HARD,
+        quantile_duration_long=sub_config.QUANTILE_DURATION_LONG,
+        hasr_tl_weights=sub_config.HASR_TL_WEIGHTS
+        ):
+
+    parameters = {
+        "version": sub_config.HASR_TL_STATE_VERSION,
+        "agg_variable": agg_variable,
+        "baseline_window": int(baseline_window),
+        "recent_window": int(recent_window),
+        "baseline_weights": [float(w) for w in baseline_weights],
+        "recent_weights": [float(w) for w in recent_weights],
+        "quantile_tl_minute_hard": float(quantile_tl_minute_hard),
+        "quantile_duration_long": float(quantile_duration_long),
+        "hasr_tl_weights": [float(w) for w in hasr_tl_weights],
+    }
+
+    return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode("utf-8")).hexdigest()
+
+# State file path for user (activity log file name)
+def get_hasr_tl_state_path(activity_log_file_name, agg_variable=sub_config.AGG_VARIABLE):
+    file_key = re.sub(r"[^A-Za-z0-9]+", "_", "{}_{}".format(activity_log_file_name, sub_config.AGG_VARIABLE_NAME_DICT[agg_variable])).strip("_")
+    return sub_config.HASR_TL_STATE_DIRECTORY / "{}.json".format(file_key)
+
+# Load state (None if missing, unreadable or written with other parameters)
+def load_hasr_tl_state(state_path, parameters_hash):
+
+    if not state_path.exists():
+        return None
+
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if state.get("version") != sub_config.HASR_TL_STATE_VERSION or state.get("parameters_hash") != parameters_hash:
+        return None
+
+    return state
+
+# Save state
+def save_hasr_tl_state(state_path, state):
+
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+# State sessions as base_tl_data (Datetime index like hasr_tl_engine.prepare_base_tl_data)
+def get_hasr_tl_state_base_tl_data(state):
+
+    sessions = state["sessions"]
+    agg_variable = state["agg_variable"]
+
+    base_tl_data = pd.DataFrame({
+        "Datetime": pd.to_datetime(sessions["datetime"]),
+        "Duration [h]": np.array(sessions["duration"], dtype=float),
+        agg_variable: np.array(sessions["value"], dtype=float),
+        agg_variable+" minute": np.array(sessions["value_minute"], dtype=float),
+        })
+
+    return base_tl_data.set_index("Datetime")
+
+# Sessions of base_tl_data in state days
+def get_state_days_base_tl_data(base_tl_data, first_day, last_day):
+    days = hasr_tl_engine.get_day_ordinals(base_tl_data.index)
+    return base_tl_data.loc[base_tl_data.index.notna() & (days >= first_day) & (days <= last_day)]
+
+# Is state usable for activity log (same last date & same sessions in state days)?
+def check_hasr_tl_state(state, base_tl_data, last_hasr_tl_date):
+
+    if pd.isna(last_hasr_tl_date):
+        return False
+
+    first_day, last_day = hasr_tl_engine.get_day_ordinals([pd.Timestamp(state["first_date"]), pd.Timestamp(state["last_date"])])
+    if last_day != hasr_tl_engine.get_day_ordinals([pd.Timestamp(last_hasr_tl_date)])[0]:
+        return False
+
+    state_base_tl_data = get_hasr_tl_state_base_tl_data(state)
+    current_base_tl_data = get_state_days_base_tl_data(base_tl_data, first_day, last_day)
+
+    if len(state_base_tl_data) != len(current_base_tl_data):
+        return False
+    if not np.array_equal(state_base_tl_data.index.values, current_base_tl_data.index.values):
+        return False
+
+    return np.array_equal(
+        state_base_tl_data.to_numpy(dtype=float),
+        current_base_tl_data[state_base_tl_data.columns].to_numpy(dtype=float),
+        equal_nan=True
+        )
+
+# History for HASR-TL engine (all states valid) ~> Activity log from the earliest state first date
+# (state days were checked to hold exactly the same sessions, so this equals state sessions + new sessions)
+def get_incremental_base_tl_data(states, base_tl_data):
+
+    first_day = min(hasr_tl_engine.get_day_ordinals([pd.Timestamp(state["first_date"]) for state in states]))
+    days = hasr_tl_engine.get_day_ordinals(base_tl_data.index)
+
+    return base_tl_data.loc[base_tl_data.index.notna() & (days >= first_day)]
+
+# Build new state ~> Last baseline + recent window days up to last date
+def build_hasr_tl_state(
+        base_tl_data,
+        last_date,
+        parameters_hash,
+        agg_variable=sub_config.AGG_VARIABLE,
+        baseline_window=sub_config.BASELINE_WINDOW,
+        recent_window=sub_config.RECENT_WINDOW
+        ):
+
+    last_day = hasr_tl_engine.get_day_ordinals([pd.Timestamp(last_date)])[0]
+    first_day = last_day - (baseline_window + recent_window - 1)
+    state_base_tl_data = get_state_days_base_tl_data(base_tl_data, first_day, last_day)
+
+    return {
+        "version": sub_config.HASR_TL_STATE_VERSION,
+        "parameters_hash": parameters_hash,
+        "agg_variable": agg_variable,
+        "first_date": str(np.datetime64(int(first_day), "D")),
+        "last_date": str(np.datetime64(int(last_day), "D")),
+        "sessions": {
+            "datetime": [t.isoformat() for t in state_base_tl_data.index],
+            "value": state_base_tl_data[agg_variable].tolist(),
+            "value_minute": state_base_tl_data[agg_variable+" minute"].tolist(),
+            "duration": state_base_tl_data["Duration [h]"].tolist(),
+        },
+    }
@@ -0,0 +1,227 @@
+# -----------------------------------------------------
+# Libraries
+# -----------------------------------------------------
+
+import argparse
+import itertools
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pandas as pd
+import numpy as np
+import os
+
+from daily_jobs import config
+from hasr_tl_job import config as sub_config
+from hasr_tl_job import engine as hasr_tl_engine
+
+# -----------------------------------------------------
+# HASR-TL parameter sweep
+# -----------------------------------------------------
+# Evaluates many parameter sets (grid points) on one activity history:
+# - the activity log is prepared and sorted once (hasr_tl_engine.get_base_tl_arrays),
+# - process pool workers get these arrays once (initializer), not per grid point,
+# - window bounds depend only on (baseline window, recent window), so grid points are
+#   grouped by these two and every worker keeps the bounds it has already computed.
+#
+# Grid (JSON): either a dict of lists (every combination is a grid point) or a list of
+# dicts (one grid point each). Missing parameters are taken from hasr_tl_job/config.py.
+#   {"lambda_base": [0.97, 0.978, 0.985], "baseline_window": [60, 90], "hasr_tl_weights": [[0.15, 0.45, 0.4], [0.2, 0.4, 0.4]]}
+#
+# Result is one tidy table: parameters x date x HASR-TL columns (not rounded).
+
+SWEEP_PARAMETER_COLUMN_NAMES = {
+    "lambda_base": "Lambda base",
+    "baseline_window": "Baseline window",
+    "recent_window": "Recent window",
+    "quantile_tl_minute_hard": "Quantile TL minute hard",
+    "quantile_duration_long": "Quantile duration long",
+    }
+
+SWEEP_HASR_TL_WEIGHTS_COLUMN_NAMES = ["HASR weight Easy", "HASR weight Hard", "HASR weight Long"]
+SWEEP_RESULTS_DIRECTORY = os.path.join(config.REPO_ROOT, "hasr_tl_sweep_results")
+
+# Default parameters (hasr_tl_job/config.py)
+def get_default_sweep_parameters():
+    return {
+        "lambda_base": sub_config.LAMBDA_BASE,
+        "baseline_window": sub_config.BASELINE_WINDOW,
+        "recent_window": sub_config.RECENT_WINDOW,
+        "quantile_tl_minute_hard": sub_config.QUANTILE_TL_MINUTE_HARD,
+        "quantile_duration_long": sub_config.QUANTILE_DURATION_LONG,
+        "hasr_tl_weights": list(sub_config.HASR_TL_WEIGHTS),
+    }
+
+# Grid points from grid spec (dict of lists ~> all combinations, list of dicts ~> as given)
+def get_parameter_grid(grid_spec):
+
+    default_parameters = get_default_sweep_parameters()
+    if isinstance(grid_spec, dict):
+        names = list(grid_spec.keys())
+        grid_spec = [dict(zip(names, combination)) for combination in itertools.product(*[grid_spec[name] for name in names])]
+
+    parameter_grid = []
+    for grid_point in grid_spec:
+        unknown_parameters = set(grid_point) - set(default_parameters)
+        if unknown_parameters:
+            raise ValueError("Unknown sweep parameters: {}".format(sorted(unknown_parameters)))
+
+        parameters = {**default_parameters, **grid_point}
+        parameters["baseline_window"] = int(parameters["baseline_window"])
+        parameters["recent_window"] = int(parameters["recent_window"])
+        parameters["hasr_tl_weights"] = [float(w) for w in parameters["hasr_tl_weights"]]
+        if len(parameters["hasr_tl_weights"]) != 3:
+            raise ValueError("HASR-TL weights need 3 values (Easy, Hard, Long): {}".format(parameters["hasr_tl_weights"]))
+        parameter_grid.append(parameters)
+
+    return parameter_grid
+
+# Target days ~> Every session day (optionally limited to [start_date, end_date])
+def get_sweep_target_days(days, start_date=None, end_date=None):
+
+    target_days = np.unique(days)
+    if start_date is not None:
+        target_days = target_days[target_days >= hasr_tl_engine.get_day_ordinals([pd.Timestamp(start_date)])[0]]
+    if end_date is not None:
+        target_days = target_days[target_days <= hasr_tl_engine.get_day_ordinals([pd.Timestamp(end_date)])[0]]
+
+    return target_days
+
+# -----------------------------------------------------
+# Worker: Shared arrays & cached window bounds
+# -----------------------------------------------------
+
+sweep_worker_data = {}
+
+def init_sweep_worker(base_tl_arrays, target_days):
+    sweep_worker_data["base_tl_arrays"] = base_tl_arrays
+    sweep_worker_data["target_days"] = target_days
+    sweep_worker_data["windows"] = {}
+
+def get_sweep_windows(baseline_window, recent_window):
+
+    windows_key = (baseline_window, recent_window)
+    if windows_key not in sweep_worker_data["windows"]:
+        sweep_worker_data["windows"][windows_key] = hasr_tl_engine.get_hasr_tl_windows(
+            sweep_worker_data["base_tl_arrays"]["days"],
+            sweep_worker_data["target_days"],
+            baseline_window,
+            recent_window
+            )
+
+    return sweep_worker_data["windows"][windows_key]
+
+# HASR-TL values of one grid point (tidy: one row per target day)
+def evaluate_grid_point(grid_point_id, parameters):
+
+    windows = get_sweep_windows(parameters["baseline_window"], parameters["recent_window"])
+    day_values = hasr_tl_engine.calculate_hasr_tl_day_values(
+        sweep_worker_data["base_tl_arrays"],
+        windows,
+        baseline_weights=hasr_tl_engine.get_window_weights(parameters["baseline_window"], parameters["lambda_base"]),
+        recent_weights=hasr_tl_engine.get_window_weights(parameters["recent_window"], parameters["lambda_base"]),
+        quantile_tl_minute_hard=parameters["quantile_tl_minute_hard"],
+        quantile_duration_long=parameters["quantile_duration_long"],
+        hasr_tl_weights=parameters["hasr_tl_weights"]
+        )
+    day_frame = hasr_tl_engine.get_hasr_tl_day_frame(day_values, rounded=False).reset_index(drop=True)
+
+    grid_point_frame = pd.DataFrame({"Grid point": grid_point_id}, index=day_frame.index)
+    for name, column_name in SWEEP_PARAMETER_COLUMN_NAMES.items():
+        grid_point_frame[column_name] = parameters[name]
+    for b in [0, 1, 2]:
+        grid_point_frame[SWEEP_HASR_TL_WEIGHTS_COLUMN_NAMES[b]] = parameters["hasr_tl_weights"][b]
+    grid_point_frame["Date"] = day_values["days"].astype("datetime64[D]")
+
+    return pd.concat([grid_point_frame, day_frame], axis=1)
+
+def evaluate_grid_points(grid_points):
+    return [evaluate_grid_point(grid_point_id, parameters) for grid_point_id, parameters in grid_points]
+
+# Chunks of grid points with the same windows (window bounds are computed once per chunk at most)
+def get_grid_point_chunks(parameter_grid, nr_workers):
+
+    chunk_size = max(1, math.ceil(len(parameter_grid) / (4 * nr_workers)))
+    grid_points = sorted(enumerate(parameter_grid), key=lambda x: (x[1]["baseline_window"], x[1]["recent_window"], x[0]))
+
+    chunks = []
+    for _, window_grid_points in itertools.groupby(grid_points, key=lambda x: (x[1]["baseline_window"], x[1]["recent_window"])):
+        window_grid_points = list(window_grid_points)
+        chunks += [window_grid_points[i:i+chunk_size] for i in range(0, len(window_grid_points), chunk_size)]
+
+    return chunks
+
+# -----------------------------------------------------
+# GO: Sweep
+# -----------------------------------------------------
+def run_hasr_tl_sweep(activity_data, parameter_grid, agg_variable=sub_config.AGG_VARIABLE, start_date=None, end_date=None, max_workers=None) -> pd.DataFrame:
+
+    # Sorted activity arrays & target days (once for all grid points)
+    base_tl_data = hasr_tl_engine.prepare_base_tl_data(activity_data, agg_variable)
+    base_tl_arrays = hasr_tl_engine.get_base_tl_arrays(base_tl_data, agg_variable)
+    target_days = get_sweep_target_days(base_tl_arrays["days"], start_date, end_date)
+
+    nr_workers = max_workers or os.cpu_count() or 1
+    chunks = get_grid_point_chunks(parameter_grid, nr_workers)
+
+    # One worker ~> In this process (no pickling)
+    if nr_workers == 1:
+        init_sweep_worker(base_tl_arrays, target_days)
+        chunk_results = [evaluate_grid_points(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=nr_workers, initializer=init_sweep_worker, initargs=(base_tl_arrays, target_days)) as executor:
+            chunk_results = list(executor.map(evaluate_grid_points, chunks))
+
+    grid_point_frames = [grid_point_frame for chunk_result in chunk_results for grid_point_frame in chunk_result]
+    if len(grid_point_frames) == 0:
+        return pd.DataFrame()
+
+    sweep_results = pd.concat(grid_point_frames, ignore_index=True)
+    return sweep_results.sort_values(by=["Grid point", "Date"], kind="stable").reset_index(drop=True)
+
+# Write sweep results (CSV, local only)
+def write_sweep_results(sweep_results, output_path=None):
+
+    if output_path is None:
+        output_path = os.path.join(SWEEP_RESULTS_DIRECTORY, "hasr_tl_sweep_{}.csv".format(datetime.now().strftime("%Y%m%d_%H%M%S")))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    sweep_results.to_csv(output_path, index=False)
+
+    return output_path
+
+# -----------------------------------------------------
+# Main: Run sweep
+# -----------------------------------------------------
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="HASR-TL parameter sweep (lambda, windows, quantiles, weights)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--user", help="User key in daily_jobs/config.py (reads Activity Log from Google Sheets)")
+    source.add_argument("--activity-log-csv", help="Local CSV export of the Raw Activity Data sheet")
+    parser.add_argument("--grid", required=True, help="JSON file with parameter grid (dict of lists or list of dicts)")
+    parser.add_argument("--start-date", default=None, help="First date in results (YYYY-MM-DD)")
+    parser.add_argument("--end-date", default=None, help="Last date in results (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all CPUs)")
+    parser.add_argument("--output", default=None, help="Output CSV path (default: hasr_tl_sweep_results/)")
+    args = parser.parse_args()
+
+    with open(args.grid, "r", encoding="utf-8") as f:
+        parameter_grid = get_parameter_grid(json.load(f))
+
+    activity_data = hasr_tl_engine.load_activity_data(user=args.user, activity_log_csv=args.activity_log_csv)
+
+    start_time = time.perf_counter()
+    sweep_results = run_hasr_tl_sweep(
+        activity_data,
+        parameter_grid,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        max_workers=args.workers
+        )
+    output_path = write_sweep_results(sweep_results, args.output)
+
+    print("Grid points = {}, rows = {}, time = {:.1f} s ~> {}".format(len(parameter_grid), len(sweep_results), time.perf_counter() - start_time, output_path))
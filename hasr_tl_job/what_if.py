@@ -0,0 +1,229 @@
+# -----------------------------------------------------
+# Libraries
+# -----------------------------------------------------
+
+import argparse
+import time
+from datetime import date, timedelta
+import pandas as pd
+import numpy as np
+
+from hasr_tl_job import config as sub_config
+from hasr_tl_job import engine as hasr_tl_engine
+from hasr_tl_job import help_functions as rtl_hf
+
+# -----------------------------------------------------
+# What-if HASR-TL for a planned session
+# -----------------------------------------------------
+# "What would HASR-TL, session class and class rank be with a 90 minute session at TL 180
+# tomorrow?" The planned session is added as the newest session of its date, exactly like
+# the job would see it once it is in the Activity Log.
+#
+# The baseline window of a date ends before its recent window, so the planned session never
+# changes it. Per date the summary is calculated once with the engine (sorted baseline views,
+# thresholds, bucket values, recent window sets) and kept in memory; a query then only
+# classifies the session, ranks it against the sorted baseline views and recalculates the
+# recent buckets.
+#
+# Recent weights follow the job: the window is newest first, weights are by day ascending, so
+# the planned session (newest) gets the weight of the oldest session's day and every other
+# session moves one weight up.
+
+class HasrTlWhatIf:
+
+    def __init__(
+            self,
+            activity_data,
+            agg_variable=sub_config.AGG_VARIABLE,
+            baseline_window=sub_config.BASELINE_WINDOW,
+            recent_window=sub_config.RECENT_WINDOW,
+            baseline_weights=sub_config.BASELINE_WINDOW_NORMALIZED_WEIGHTS,
+            recent_weights=sub_config.RECENT_WINDOW_NORMALIZED_WEIGHTS,
+            quantile_tl_minute_hard=sub_config.QUANTILE_TL_MINUTE_HARD,
+            quantile_duration_long=sub_config.QUANTILE_DURATION_LONG,
+            hasr_tl_weights=sub_config.HASR_TL_WEIGHTS
+            ):
+
+        self.agg_variable = agg_variable
+        self.baseline_window = baseline_window
+        self.recent_window = recent_window
+        self.baseline_weights = baseline_weights
+        self.recent_weights = recent_weights
+        self.quantile_tl_minute_hard = quantile_tl_minute_hard
+        self.quantile_duration_long = quantile_duration_long
+        self.hasr_tl_weights = hasr_tl_weights
+        self.hasr_tl_column_names = sub_config.get_hasr_tl_column_names(agg_variable)
+
+        base_tl_data = hasr_tl_engine.prepare_base_tl_data(activity_data, agg_variable)
+        self.base_tl_arrays = hasr_tl_engine.get_base_tl_arrays(base_tl_data, agg_variable)
+        self.day_summaries = {}
+
+    # -------------------------------
+    # Day summary (once per date)
+    # -------------------------------
+    def get_day_summary(self, day):
+
+        if day in self.day_summaries:
+            return self.day_summaries[day]
+
+        # History up to date & placeholder for the planned session (newest session of the date)
+        end = np.searchsorted(self.base_tl_arrays["days"], day, side="right")
+        planned_datetime = np.datetime64(int(day) + 1, "D").astype("datetime64[ns]") - np.timedelta64(1, "ns")
+        day_base_tl_arrays = {
+            "datetimes": np.append(self.base_tl_arrays["datetimes"][:end], planned_datetime),
+            "days": np.append(self.base_tl_arrays["days"][:end], day),
+            "values": np.append(self.base_tl_arrays["values"][:end], 0.0),
+            "values_minute": np.append(self.base_tl_arrays["values_minute"][:end], 0.0),
+            "durations": np.append(self.base_tl_arrays["durations"][:end], 0.0),
+        }
+
+        windows = hasr_tl_engine.get_hasr_tl_windows(day_base_tl_arrays["days"], [day], self.baseline_window, self.recent_window)
+        window_sets = hasr_tl_engine.get_hasr_tl_window_sets(day_base_tl_arrays, windows, self.baseline_weights, self.recent_weights)
+        day_values = hasr_tl_engine.calculate_hasr_tl_day_values(
+            day_base_tl_arrays,
+            windows,
+            baseline_weights=self.baseline_weights,
+            recent_weights=self.recent_weights,
+            quantile_tl_minute_hard=self.quantile_tl_minute_hard,
+            quantile_duration_long=self.quantile_duration_long,
+            hasr_tl_weights=self.hasr_tl_weights,
+            window_sets=window_sets
+            )
+
+        day_summary = {"available": window_sets[0] is not None and window_sets[0][2] is not None}
+        if day_summary["available"]:
+            baseline_index, baseline_set_weights, recent_index, recent_set_weights = window_sets[0]
+            baseline_values = day_base_tl_arrays["values"][baseline_index]
+            quantile_hard, quantile_long = day_values["quantile_hard"][0], day_values["quantile_long"][0]
+            baseline_bucket_masks = hasr_tl_engine.get_bucket_masks(
+                day_base_tl_arrays["values_minute"][baseline_index],
+                day_base_tl_arrays["durations"][baseline_index],
+                quantile_hard,
+                quantile_long
+                )
+
+            # Sorted baseline views ~> Overall & per class
+            day_summary["baseline_view"] = rtl_hf.get_weighted_sorted_view(baseline_values, baseline_set_weights)
+            day_summary["baseline_class_views"] = [
+                rtl_hf.get_weighted_sorted_view(baseline_values[bucket_mask], baseline_set_weights[bucket_mask]) if np.any(bucket_mask) else None
+                for bucket_mask in baseline_bucket_masks
+                ]
+
+            # Recent sessions without the planned one (newest first) & weights (planned session first)
+            existing_recent_index = recent_index[1:]
+            day_summary["recent_values"] = day_base_tl_arrays["values"][existing_recent_index]
+            day_summary["recent_values_minute"] = day_base_tl_arrays["values_minute"][existing_recent_index]
+            day_summary["recent_durations"] = day_base_tl_arrays["durations"][existing_recent_index]
+            day_summary["recent_set_weights"] = recent_set_weights
+
+            day_summary["quantile_hard"] = quantile_hard
+            day_summary["quantile_long"] = quantile_long
+            day_summary["baseline_bucket_values"] = day_values["baseline_bucket_values"][0]
+            day_summary["baseline_bucket_proportions"] = day_values["baseline_bucket_proportions"][0]
+            day_summary["hasr_tl_baseline"] = day_values["hasr_tl_baseline"][0]
+
+        self.day_summaries[day] = day_summary
+        return day_summary
+
+    # Precalculate day summaries (e.g. the next days before a batch of queries)
+    def prepare_dates(self, dates):
+        for day in hasr_tl_engine.get_day_ordinals([pd.Timestamp(d) for d in dates]):
+            self.get_day_summary(int(day))
+
+    # -------------------------------
+    # Query: Planned session on date
+    # -------------------------------
+    def query(self, session_date, duration_h, value):
+
+        day = int(hasr_tl_engine.get_day_ordinals([pd.Timestamp(session_date)])[0])
+        day_summary = self.get_day_summary(day)
+
+        hasr_tl_names = self.hasr_tl_column_names
+        class_names = sub_config.RECENT_SESSION_CLASS_COLUMN_NAMES
+        result = {"Date": str(np.datetime64(day, "D")), "Duration [h]": duration_h, self.agg_variable: value}
+        if not day_summary["available"]:
+            for column_name in class_names + hasr_tl_names + sub_config.RECENT_SLA_VALUE_COLUMN_NAMES + sub_config.RECENT_SLA_PROPORTION_COLUMN_NAMES:
+                result[column_name] = np.nan
+            return result
+
+        # Planned session like a row of the Activity Log (see hasr_tl_engine.prepare_base_tl_data)
+        value = 0.0 if pd.isna(value) else float(value)
+        duration_h = 0.0 if pd.isna(duration_h) else float(duration_h)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            value_minute = np.float64(value) / (np.float64(duration_h) * 60)
+        value_minute = 0.0 if np.isnan(value_minute) else value_minute
+
+        # Class & ranks against baseline
+        quantile_hard, quantile_long = day_summary["quantile_hard"], day_summary["quantile_long"]
+        session_class_index = hasr_tl_engine.classify_session(value_minute, duration_h, quantile_hard, quantile_long)
+        session_overall_rank = rtl_hf.get_weighted_percentile_ranks([value], *day_summary["baseline_view"])[0]
+
+        session_class_rank = np.nan
+        if day_summary["baseline_class_views"][session_class_index] is not None:
+            session_class_rank = rtl_hf.get_weighted_percentile_ranks([value], *day_summary["baseline_class_views"][session_class_index])[0]
+
+        # Recent buckets with planned session as newest session
+        recent_values = np.concatenate([[value], day_summary["recent_values"]])
+        recent_set_weights = day_summary["recent_set_weights"]
+        recent_bucket_masks = hasr_tl_engine.get_bucket_masks(
+            np.concatenate([[value_minute], day_summary["recent_values_minute"]]),
+            np.concatenate([[duration_h], day_summary["recent_durations"]]),
+            quantile_hard,
+            quantile_long
+            )
+        recent_bucket_values = [
+            rtl_hf.get_weighted_mean(recent_values[bucket_mask], recent_set_weights[bucket_mask])
+            for bucket_mask in recent_bucket_masks
+            ]
+
+        hasr_tl_recent = (
+            self.hasr_tl_weights[0] * recent_bucket_values[0] +
+            self.hasr_tl_weights[1] * recent_bucket_values[1] +
+            self.hasr_tl_weights[2] * recent_bucket_values[2]
+            )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hasr_tl = np.float64(hasr_tl_recent) / day_summary["hasr_tl_baseline"]
+
+        # Rounded like the HASR-TL sheet
+        result[class_names[0]] = np.round(session_overall_rank, 2)
+        result[class_names[1]] = hasr_tl_engine.SESSION_CLASS_NAMES[session_class_index]
+        result[class_names[2]] = np.round(session_class_rank, 2)
+        result[hasr_tl_names[0]] = np.round(hasr_tl, 2)
+        result[hasr_tl_names[1]] = np.round(hasr_tl_recent, 2)
+        result[hasr_tl_names[2]] = np.round(day_summary["hasr_tl_baseline"], 2)
+        for b in [0, 1, 2]:
+            result[sub_config.RECENT_SLA_VALUE_COLUMN_NAMES[b]] = np.round(recent_bucket_values[b], 2)
+            result[sub_config.RECENT_SLA_PROPORTION_COLUMN_NAMES[b]] = round(np.count_nonzero(recent_bucket_masks[b])/len(recent_values) * 100, 2)
+
+        return result
+
+    # Batched queries: list of (date, duration [h], value)
+    def query_batch(self, sessions):
+        return pd.DataFrame([self.query(session_date, duration_h, value) for session_date, duration_h, value in sessions])
+
+# -----------------------------------------------------
+# Main: What-if query
+# -----------------------------------------------------
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="What-if HASR-TL for planned sessions")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--user", help="User key in daily_jobs/config.py (reads Activity Log from Google Sheets)")
+    source.add_argument("--activity-log-csv", help="Local CSV export of the Raw Activity Data sheet")
+    parser.add_argument("--session", nargs=2, type=float, action="append", required=True, metavar=("DURATION_MIN", "VALUE"), help="Planned session: duration in minutes and aggregate variable value (repeatable)")
+    parser.add_argument("--date", default=str(date.today() + timedelta(days=1)), help="Date of planned sessions (YYYY-MM-DD, default: tomorrow)")
+    parser.add_argument("--agg-variable", default=sub_config.AGG_VARIABLE, choices=list(sub_config.AGG_VARIABLE_NAME_DICT.keys()))
+    args = parser.parse_args()
+
+    activity_data = hasr_tl_engine.load_activity_data(user=args.user, activity_log_csv=args.activity_log_csv)
+    hasr_tl_what_if = HasrTlWhatIf(activity_data, agg_variable=args.agg_variable)
+    hasr_tl_what_if.prepare_dates([args.date])
+
+    start_time = time.perf_counter()
+    what_if_results = hasr_tl_what_if.query_batch([(args.date, duration_min / 60, value) for duration_min, value in args.session])
+    query_time = time.perf_counter() - start_time
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(what_if_results.drop(columns=sub_config.RECENT_SLA_VALUE_COLUMN_NAMES + sub_config.RECENT_SLA_PROPORTION_COLUMN_NAMES).to_string(index=False))
+    print("Queries = {}, time per query = {:.3f} ms".format(len(what_if_results), query_time / len(what_if_results) * 1000))